@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+"""IVF 近似检索 vs 暴力检索：召回率与单帧延迟（合成 512 维特征）
+
+用法: python -m benchmarks.bench_ann [人脸库规模] [目标召回率，默认 0.99]
+输出满足目标召回率的最小 nprobe（config.ANN_NPROBE 据此选取），以及 FaceMatcher 加精确复核后的实际召回率。
+"""
+import sys
+import time
+import numpy as np
+from core.matcher import FaceMatcher, IVFIndex, normalize_rows
+from config import MATCH_THRESHOLD, ANN_NPROBE
+
+def synth(n, n_query, noise, seed=0):
+    """库内每人一个随机单位向量；查询 = 库内某人 + 噪声（模拟同一人的新照片）"""
+    rng = np.random.default_rng(seed)
+    gallery = normalize_rows(rng.normal(size=(n, 512)))
+    truth = rng.integers(0, n, n_query)
+    q = normalize_rows(gallery[truth] + noise * normalize_rows(rng.normal(size=(n_query, 512))))
+    return gallery, q, truth
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    target = float(sys.argv[2]) if len(sys.argv) > 2 else 0.99
+    faces_per_frame, n_frames = 5, 100
+    gallery, q, truth = synth(n, faces_per_frame * n_frames, noise=0.6)
+
+    m = FaceMatcher()
+    m.add([f"p{i}" for i in range(n)], gallery)
+    t0 = time.perf_counter()
+    m.index = IVFIndex.train(m.matrix)
+    print(f"库规模 {n}，IVF 训练 {time.perf_counter() - t0:.2f}s，{len(m.index.centroids)} 个簇")
+
+    frames = q.reshape(n_frames, faces_per_frame, 512)
+    index = m.index
+    m.index = None
+    t0 = time.perf_counter()
+    exact = [m.match(f) for f in frames]
+    t_brute = (time.perf_counter() - t0) / n_frames
+    exact_ids = np.concatenate([e[0][:, 0] for e in exact])
+    exact_hit = np.concatenate([e[1][:, 0] for e in exact]) > MATCH_THRESHOLD
+
+    print(f"{'方法':>10} {'nprobe':>7} {'ms/帧':>8} {'recall@1':>9} {'阈值判定一致':>12}")
+    print(f"{'brute':>10} {'-':>7} {t_brute * 1e3:>8.2f} {1.0:>9.3f} {1.0:>12.3f}")
+    m.index = index
+    chosen = None
+    for nprobe in (4, 8, 16, 32, 48, 64, 96):
+        t0 = time.perf_counter()
+        approx = [(index.search(m.matrix, normalize_rows(f), 1, nprobe)) for f in frames]
+        t_ivf = (time.perf_counter() - t0) / n_frames
+        rows = np.concatenate([a[0][:, 0] for a in approx])
+        scores = np.concatenate([a[1][:, 0] for a in approx])
+        recall = np.mean(m.ids[rows] == exact_ids)
+        agree = np.mean((scores > MATCH_THRESHOLD) == exact_hit)
+        print(f"{'ivf':>10} {nprobe:>7} {t_ivf * 1e3:>8.2f} {recall:>9.3f} {agree:>12.3f}")
+        if chosen is None and recall >= target:
+            chosen = nprobe
+
+    # FaceMatcher：ANN_NPROBE 近似检索 + 低分查询精确复核
+    t0 = time.perf_counter()
+    matched = [m.match(f) for f in frames]
+    t_match = (time.perf_counter() - t0) / n_frames
+    ids = np.concatenate([r[0][:, 0] for r in matched])
+    scores = np.concatenate([r[1][:, 0] for r in matched])
+    print(f"{'matcher':>10} {ANN_NPROBE:>7} {t_match * 1e3:>8.2f} {np.mean(ids == exact_ids):>9.3f} "
+          f"{np.mean((scores > MATCH_THRESHOLD) == exact_hit):>12.3f}")
+    print(f"recall@1 >= {target} 的最小 nprobe: {chosen or '> 96'}（当前 ANN_NPROBE = {ANN_NPROBE}）")
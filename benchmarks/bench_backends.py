@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+"""FaceNet CPU 推理后端对比：吞吐量与相对 fp32 的特征余弦相似度
+
+用法: python -m benchmarks.bench_backends [--faces data/faces] [--batch 16]
+--faces 指定人脸图片目录时用真实人脸裁剪做精度校验，否则用随机图像。
+最低余弦相似度低于 config.FACENET_COS_TOLERANCE 的后端标记为 FAIL。
+"""
+import argparse
+import copy
+import glob
+import os
+import time
+import numpy as np
+import torch
+from facenet_pytorch import InceptionResnetV1
+from core.models import device, optimize_facenet, FACENET_BACKENDS
+from core.recognition import FACE_SIZE, largest_face_crop
+from config import FACENET_COS_TOLERANCE
+
+def to_tensor(batch):
+    # 与 embed_faces 相同的预处理
+    return torch.from_numpy(batch).to(device).permute(0, 3, 1, 2).float().div_(255.0).sub_(0.5).div_(0.5)
+
+def embed(model, batch, batch_size):
+    with torch.no_grad():
+        return np.concatenate([model(to_tensor(batch[s:s + batch_size])).cpu().numpy()
+                               for s in range(0, len(batch), batch_size)])
+
+def load_faces(faces_dir, limit):
+    crops = []
+    for path in sorted(glob.glob(os.path.join(faces_dir, '**', '*.jpg'), recursive=True))[:limit]:
+        crop = largest_face_crop(path)
+        if crop is not None:
+            crops.append(crop)
+    return np.stack(crops) if crops else None
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--faces', default=None)
+    ap.add_argument('--batch', type=int, default=16)
+    ap.add_argument('--repeat', type=int, default=5)
+    args = ap.parse_args()
+
+    torch.manual_seed(0)
+    base = InceptionResnetV1(pretrained='vggface2').eval().to(device)
+    faces = load_faces(args.faces, 64) if args.faces else None
+    if faces is None:
+        faces = np.random.default_rng(0).integers(0, 256, (64, FACE_SIZE, FACE_SIZE, 3), dtype=np.uint8)
+    bench = faces[np.arange(args.batch) % len(faces)]
+    ref = embed(base, faces, args.batch)
+    ref /= np.linalg.norm(ref, axis=1, keepdims=True)
+
+    print(f"设备: {device}，线程数: {torch.get_num_threads()}，精度校验样本: {len(faces)}")
+    print(f"{'后端':<14} {'faces/s':>9} {'加速比':>8} {'最低余弦':>10} {'结果':>6}")
+    base_rate = None
+    for backend in FACENET_BACKENDS:
+        model = optimize_facenet(copy.deepcopy(base), backend)
+        out = embed(model, faces, args.batch)
+        cos = ((out / np.linalg.norm(out, axis=1, keepdims=True)) * ref).sum(axis=1).min()
+        embed(model, bench, args.batch)  # 预热
+        t0 = time.perf_counter()
+        for _ in range(args.repeat):
+            embed(model, bench, args.batch)
+        rate = len(bench) * args.repeat / (time.perf_counter() - t0)
+        base_rate = base_rate or rate
+        ok = "OK" if cos >= FACENET_COS_TOLERANCE else "FAIL"
+        print(f"{backend:<14} {rate:>9.1f} {rate / base_rate:>7.2f}x {cos:>10.5f} {ok:>6}")
@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+"""检测分辨率：原图检测 vs 缩小图检测（DETECT_MAX_SIDE）在 720p/1080p/4K 输入下的耗时与框一致性
+
+用法: python -m benchmarks.bench_detect_resolution [--image 示例图片] [--max-side 640] [--repeat 10]
+不提供图片时使用随机噪声帧（只看耗时）。一致性 = 原图检测框中能在缩小图结果里找到 IoU>=0.5 对应框的比例。
+"""
+import argparse
+import time
+import cv2
+import numpy as np
+from core.geometry import box_iou
+from core.models import warmup, MODE_MODELS
+from core.pipeline import detect_persons_batch
+from core.recognition import detect_faces, read_image
+from config import DETECT_MAX_SIDE
+
+RESOLUTIONS = (('720p', 1280, 720), ('1080p', 1920, 1080), ('4K', 3840, 2160))
+
+def timeit(fn, frame, repeat):
+    result = fn(frame)  # 预热
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        fn(frame)
+    return (time.perf_counter() - t0) / repeat * 1000, result
+
+def agreement(ref, boxes):
+    if not len(ref):
+        return float('nan')
+    if not len(boxes):
+        return 0.0
+    return np.count_nonzero(box_iou(ref, boxes).max(axis=1) >= 0.5) / len(ref)
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--image', help=u"示例图片，会缩放到各分辨率")
+    ap.add_argument('--max-side', type=int, default=DETECT_MAX_SIDE or 640)
+    ap.add_argument('--repeat', type=int, default=10)
+    args = ap.parse_args()
+
+    src = read_image(args.image) if args.image else None
+    warmup(MODE_MODELS['face'] + ('yolo_person',))
+    tasks = (
+        (u"人脸", lambda side: lambda f: detect_faces(f, max_side=side)),
+        (u"行人", lambda side: lambda f: detect_persons_batch([f], side)[0]),
+    )
+    print(f"缩小图长边: {args.max_side}")
+    print(f"{'分辨率':<8} {'检测':<6} {'原图 ms':>9} {'缩小 ms':>9} {'加速比':>8} {'框数':>9} {'一致性':>8}")
+    for label, w, h in RESOLUTIONS:
+        if src is not None:
+            frame = cv2.resize(src, (w, h))
+        else:
+            frame = np.random.default_rng(0).integers(0, 256, (h, w, 3), dtype=np.uint8)
+        for name, make in tasks:
+            t_full, ref = timeit(make(0), frame, args.repeat)
+            t_small, boxes = timeit(make(args.max_side), frame, args.repeat)
+            print(f"{label:<8} {name:<6} {t_full:>9.1f} {t_small:>9.1f} {t_full / t_small:>7.2f}x "
+                  f"{len(ref):>4}/{len(boxes):<4} {agreement(ref, boxes):>8.1%}")
@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+"""界面线程显示开销：旧方式（逐帧 rgbSwapped + 平滑缩放）vs 显示信箱（工作线程预缩放，界面按刷新率取最新帧）
+
+用法: python -m benchmarks.bench_display [--width 1920 --height 1080] [--view 960 540] [--refresh 60]
+输出为每秒源视频在界面线程上花费的毫秒数；新方式另列出工作线程的额外开销。
+"""
+import argparse
+import sys
+import time
+import numpy as np
+from PyQt5.QtCore import Qt, QSize
+from PyQt5.QtGui import QGuiApplication, QImage, QPixmap
+from core.display import FrameMailbox
+
+def old_ui(frame, view):
+    qt_img = QImage(frame.data, frame.shape[1], frame.shape[0], frame.shape[1] * 3, QImage.Format_RGB888).rgbSwapped()
+    return QPixmap.fromImage(qt_img).scaled(view, Qt.KeepAspectRatio, Qt.SmoothTransformation)
+
+def new_ui(mailbox):
+    item = mailbox.take()
+    if item is None:
+        return None
+    rgb, _ = item
+    return QPixmap.fromImage(QImage(rgb.data, rgb.shape[1], rgb.shape[0], rgb.strides[0], QImage.Format_RGB888))
+
+def per_second(fn, n, repeat=3):
+    """执行 n 次 fn 的耗时（毫秒），取 repeat 次最小值"""
+    best = float('inf')
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        for _ in range(n):
+            fn()
+        best = min(best, time.perf_counter() - t0)
+    return best * 1000
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--width', type=int, default=1920)
+    ap.add_argument('--height', type=int, default=1080)
+    ap.add_argument('--view', nargs=2, type=int, default=(960, 540))
+    ap.add_argument('--refresh', type=int, default=60)
+    args = ap.parse_args()
+
+    app = QGuiApplication(sys.argv)
+    frame = np.random.default_rng(0).integers(0, 256, (args.height, args.width, 3), dtype=np.uint8)
+    view = QSize(*args.view)
+    mailbox = FrameMailbox(view_size=tuple(args.view))
+
+    def new_ui_tick():
+        mailbox.put(frame)  # 代表工作线程已发布新帧，计时时单独扣除
+        new_ui(mailbox)
+
+    print(f"源 {args.width}x{args.height} -> 视图 {args.view[0]}x{args.view[1]}，刷新率 {args.refresh}Hz")
+    print(f"{'源 fps':>7} {'旧 界面 ms/s':>13} {'新 界面 ms/s':>13} {'新 工作线程 ms/s':>17}")
+    for fps in (30, 60, 120, 240):
+        t_old = per_second(lambda: old_ui(frame, view), fps)
+        t_put = per_second(lambda: mailbox.put(frame), fps)
+        shown = min(fps, args.refresh)
+        t_new = per_second(new_ui_tick, shown) - per_second(lambda: mailbox.put(frame), shown)
+        print(f"{fps:>7} {t_old:>13.1f} {max(t_new, 0):>13.1f} {t_put:>17.1f}")
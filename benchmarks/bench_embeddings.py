@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+"""FaceNet 批量推理 vs 逐张推理吞吐对比
+
+用法: python -m benchmarks.bench_embeddings
+"""
+import time
+import numpy as np
+import torch
+from core.models import device, get_resnet
+from core.recognition import embed_faces, FACE_SIZE
+
+def embed_loop(batch):
+    """旧实现：每张人脸单独转换、拷贝、前向"""
+    out = []
+    for face_crop in batch:
+        face_tensor = torch.from_numpy(face_crop.transpose(2, 0, 1)).float() / 255.0
+        face_tensor = (face_tensor - 0.5) / 0.5
+        face_tensor = face_tensor.unsqueeze(0).to(device)
+        with torch.no_grad():
+            out.append(get_resnet()(face_tensor).cpu().numpy().flatten())
+    return out
+
+def timeit(fn, batch, repeat):
+    fn(batch)  # 预热
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        fn(batch)
+    return time.perf_counter() - t0
+
+if __name__ == "__main__":
+    rng = np.random.default_rng(0)
+    print(f"设备: {device}")
+    print(f"{'人脸数':>6} {'逐张 faces/s':>14} {'批量 faces/s':>14} {'加速比':>8} {'最大误差':>10}")
+    for n in (1, 5, 10, 20):
+        batch = rng.integers(0, 256, (n, FACE_SIZE, FACE_SIZE, 3), dtype=np.uint8)
+        repeat = max(3, 60 // n)
+        t_loop = timeit(embed_loop, batch, repeat)
+        t_batch = timeit(embed_faces, batch, repeat)
+        diff = np.abs(np.stack(embed_loop(batch)) - embed_faces(batch)).max()
+        print(f"{n:>6} {n * repeat / t_loop:>14.1f} {n * repeat / t_batch:>14.1f} "
+              f"{t_loop / t_batch:>7.2f}x {diff:>10.2e}")
@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+"""建库吞吐：串行 vs 多进程，并校验两者结果在容差内一致
+
+子进程单线程运行 torch/OpenCV，检测框和特征与串行可能有细微差异，因此不要求逐位相同，
+而是检查两者检出人脸的图片相同，且同一图片特征的余弦偏差（1 - cos）不超过容差。
+
+用法: python -m benchmarks.bench_enrol [图片目录] [进程数] [容差，默认 0.01]
+"""
+import os
+import sys
+import time
+import numpy as np
+from database.operations import embed_files
+
+if __name__ == "__main__":
+    root = sys.argv[1] if len(sys.argv) > 1 else 'data/faces'
+    workers = int(sys.argv[2]) if len(sys.argv) > 2 else (os.cpu_count() or 1)
+    tol = float(sys.argv[3]) if len(sys.argv) > 3 else 0.01
+    paths = sorted(os.path.join(d, f) for d, _, fs in os.walk(root)
+                   for f in fs if f.lower().endswith(('.jpg', '.jpeg', '.png')))
+    print(f"{len(paths)} 张图片，{workers} 进程")
+
+    timings, outputs = {}, {}
+    for name, w in (('串行', 1), ('并行', workers)):
+        t0 = time.perf_counter()
+        outputs[name] = embed_files(paths, workers=w)
+        timings[name] = time.perf_counter() - t0
+
+    for name, t in timings.items():
+        print(f"{name}: {t:.1f}s  {len(paths) / t:.1f} 张/秒")
+    pairs = list(zip(outputs['串行'], outputs['并行']))
+    mismatch = sum((a is None) != (b is None) for (a, _), (b, _) in pairs)
+    both = [(a, b) for (a, _), (b, _) in pairs if a is not None and b is not None]
+    dev = [1 - float(np.dot(a, b) / (np.linalg.norm(a) * np.linalg.norm(b))) for a, b in both]
+    max_dev = max(dev, default=0.0)
+    print(f"加速比 {timings['串行'] / timings['并行']:.2f}x")
+    print(f"检出不一致 {mismatch} 张，特征最大余弦偏差 {max_dev:.2e}（平均 {np.mean(dev) if dev else 0:.2e}），"
+          f"容差 {tol:g} 内一致: {mismatch == 0 and max_dev <= tol}")
@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+"""人脸检测级联策略对比：每帧耗时、YOLO 调用比例、检出数与召回率
+
+用法: python -m benchmarks.bench_face_cascade 图片目录 [--gt 标注.csv] [--iou 0.5]
+标注 CSV 每行一个人脸: 文件名,x1,y1,x2,y2；不提供时以 both 策略的检测结果作为参照（相对召回率）。
+"""
+import argparse
+import csv
+import os
+import time
+from collections import defaultdict
+import numpy as np
+import core.recognition as rec
+from core.geometry import box_iou
+from core.models import warmup
+
+IMG_EXTS = ('.jpg', '.jpeg', '.png', '.bmp')
+
+def load_gt(path):
+    gt = defaultdict(list)
+    with open(path, encoding='utf-8-sig') as f:
+        for row in csv.reader(f):
+            if len(row) < 5 or not row[1].strip().lstrip('-').isdigit(): continue
+            gt[row[0]].append(tuple(int(v) for v in row[1:5]))
+    return gt
+
+def count_yolo_calls(fn):
+    """包装 _yolo_faces，统计实际跑 YOLO 的帧数"""
+    calls = [0]
+    def wrapped(imgs, *args):
+        calls[0] += len(imgs)
+        return fn(imgs, *args)
+    return wrapped, calls
+
+def run(images, policy):
+    orig = rec._yolo_faces
+    rec._yolo_faces, calls = count_yolo_calls(orig)
+    try:
+        rec.detect_faces(images[0][1], policy)  # 预热
+        calls[0] = 0
+        results = {}
+        t0 = time.perf_counter()
+        for name, img in images:
+            results[name] = rec.detect_faces(img, policy)
+        elapsed = time.perf_counter() - t0
+    finally:
+        rec._yolo_faces = orig
+    return results, elapsed, calls[0]
+
+def recall(results, gt, thr):
+    hit = total = 0
+    for name, boxes in gt.items():
+        total += len(boxes)
+        dets = results.get(name, [])
+        if boxes and dets:
+            hit += int(np.count_nonzero(box_iou(boxes, dets).max(axis=1) >= thr))
+    return hit / total if total else float('nan'), total
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument('images')
+    ap.add_argument('--gt', help=u"标注 CSV: 文件名,x1,y1,x2,y2")
+    ap.add_argument('--iou', type=float, default=0.5, help=u"命中判定 IoU")
+    args = ap.parse_args()
+
+    names = sorted(f for f in os.listdir(args.images) if f.lower().endswith(IMG_EXTS))
+    images = [(n, rec.read_image(os.path.join(args.images, n))) for n in names]
+    images = [(n, img) for n, img in images if img is not None]
+    if not images:
+        raise SystemExit(u"未找到图片")
+    warmup(('face_detection', 'yolo_face'))
+
+    runs = {p: run(images, p) for p in rec.FACE_CASCADES}
+    if args.gt:
+        gt, ref = load_gt(args.gt), u"标注"
+    else:
+        gt, ref = runs['both'][0], u"both 策略"
+    print(f"{len(images)} 张图片，召回率参照: {ref}，命中 IoU >= {args.iou}")
+    print(f"{'策略':<10} {'ms/帧':>8} {'YOLO 帧占比':>12} {'检出数':>8} {'召回率':>8}")
+    for policy, (results, elapsed, yolo_calls) in runs.items():
+        r, total = recall(results, gt, args.iou)
+        found = sum(len(b) for b in results.values())
+        print(f"{policy:<10} {1000 * elapsed / len(images):>8.1f} {yolo_calls / len(images):>12.0%} "
+              f"{found:>8} {r:>8.1%}")
@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+"""启动耗时：界面模块导入、各模式首次加载模型、旧版全部预加载的对比
+
+每项在独立子进程中测量，互不共享已加载的模块和模型。
+用法: python -m benchmarks.bench_startup [--repeat 3]
+"""
+import argparse
+import subprocess
+import sys
+
+CASES = [
+    ('import core.models', "import core.models"),
+    ('import ui.main_window', "import ui.main_window"),
+    ('flow/density 模式模型', "from core.models import warmup, MODE_MODELS; warmup(MODE_MODELS['flow'])"),
+    ('face 模式模型', "from core.models import warmup, MODE_MODELS; warmup(MODE_MODELS['face'])"),
+    ('全部模型 (旧版导入即加载)', "from core.models import warmup, LOADERS; warmup(LOADERS)"),
+]
+
+def measure(code):
+    script = f"import time; t0 = time.perf_counter(); {code}; print('@', time.perf_counter() - t0)"
+    out = subprocess.run([sys.executable, '-c', script], capture_output=True, text=True)
+    for line in out.stdout.splitlines():
+        if line.startswith('@ '):
+            return float(line[2:])
+    raise RuntimeError(out.stderr.strip().splitlines()[-1] if out.stderr.strip() else '无输出')
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--repeat', type=int, default=3)
+    args = ap.parse_args()
+
+    print(f"{'项目':<28} {'最短(s)':>8} {'平均(s)':>8}")
+    for name, code in CASES:
+        try:
+            ts = [measure(code) for _ in range(args.repeat)]
+        except RuntimeError as e:
+            print(f"{name:<28} 失败: {e}")
+            continue
+        print(f"{name:<28} {min(ts):>8.2f} {sum(ts) / len(ts):>8.2f}")
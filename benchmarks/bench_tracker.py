@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+"""CentroidTracker.update 耗时：10 ~ 1000 个目标，原字典实现 vs 数组实现（贪心 / 最优匹配）
+
+用法: python -m benchmarks.bench_tracker
+"""
+import time
+import numpy as np
+from collections import OrderedDict
+from scipy.spatial import distance as dist
+from core.tracking import CentroidTracker
+
+class LegacyCentroidTracker:
+    """改造前的 OrderedDict 实现，仅作对照"""
+    def __init__(self, max_disappeared=30):
+        self.next_id = 0
+        self.objects = OrderedDict()
+        self.disappeared = OrderedDict()
+        self.max_disappeared = max_disappeared
+
+    def register(self, centroid):
+        self.objects[self.next_id] = centroid
+        self.disappeared[self.next_id] = 0
+        self.next_id += 1
+
+    def deregister(self, object_id):
+        if object_id in self.objects:
+            del self.objects[object_id]
+            del self.disappeared[object_id]
+
+    def update(self, rects):
+        if len(rects) == 0:
+            for tid in list(self.disappeared.keys()):
+                self.disappeared[tid] += 1
+                if self.disappeared[tid] > self.max_disappeared: self.deregister(tid)
+            return self.objects
+        input_centroids = np.array([(int((r[0]+r[2])/2), int((r[1]+r[3])/2)) for r in rects])
+        if len(self.objects) == 0:
+            for i in range(len(input_centroids)): self.register(input_centroids[i])
+        else:
+            oids = list(self.objects.keys()); ocs = list(self.objects.values())
+            D = dist.cdist(np.array(ocs), input_centroids)
+            rows = D.min(axis=1).argsort(); cols = D.argmin(axis=1)[D.min(axis=1).argsort()]
+            ur, uc = set(), set()
+            for (r, c) in zip(rows, cols):
+                if r in ur or c in uc: continue
+                self.objects[oids[r]] = input_centroids[c]; self.disappeared[oids[r]] = 0
+                ur.add(r); uc.add(c)
+            for r in set(range(D.shape[0])) - ur:
+                self.disappeared[oids[r]] += 1
+                if self.disappeared[oids[r]] > self.max_disappeared: self.deregister(oids[r])
+            for c in set(range(D.shape[1])) - uc: self.register(input_centroids[c])
+        return self.objects
+
+def scene(n, frames, seed=0):
+    """n 个行人随机游走，每帧约 5% 漏检"""
+    rng = np.random.default_rng(seed)
+    pos = rng.uniform(0, 4000, (n, 2))
+    vel = rng.normal(0, 3, (n, 2))
+    out = []
+    for _ in range(frames):
+        pos += vel + rng.normal(0, 0.5, (n, 2))
+        keep = rng.random(n) > 0.05
+        p = pos[keep]
+        out.append(np.hstack([p - 20, p + 20]).astype(int))
+    return out
+
+def bench(tracker, frames):
+    tracker.update(frames[0])
+    t0 = time.perf_counter()
+    for rects in frames[1:]:
+        tracker.update(rects)
+    return (time.perf_counter() - t0) / (len(frames) - 1) * 1e3
+
+if __name__ == "__main__":
+    print(f"{'目标数':>6} {'原实现 ms':>10} {'数组贪心 ms':>12} {'数组最优 ms':>12}")
+    for n in (10, 50, 100, 200, 500, 1000):
+        frames = scene(n, 60)
+        t_old = bench(LegacyCentroidTracker(), frames)
+        t_new = bench(CentroidTracker(), frames)
+        t_opt = bench(CentroidTracker(optimal=True, max_distance=50), frames)
+        print(f"{n:>6} {t_old:>10.3f} {t_new:>12.3f} {t_opt:>12.3f}")
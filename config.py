@@ -9,6 +9,80 @@ if not os.path.exists(FONT_PATH):
     FONT_PATH = None
 
 # 路径配置
-DB_PATH = 'data/db/face_db.pkl'
+DB_PATH = 'data/db/face_db.pkl'  # 旧版 pickle 人脸库，仅用于一次性迁移
+GALLERY_PATH = 'data/db/face_gallery.json'  # 人脸库索引，特征矩阵为同目录 face_gallery.<代>.npy
 FACES_DIR = 'data/faces'
-LOG_PATH = 'data/access_log.csv'
\ No newline at end of file
+LOG_PATH = 'data/access_log.csv'  # 访问日志 CSV（事件库的派生视图）
+EVENTS_DB_PATH = 'data/db/events.sqlite'  # 访问事件库（带索引，统计查询用）
+STATS_PATH = 'data/db/daily_stats.json'  # 每日统计检查点
+MANIFEST_PATH = 'data/db/manifest.json'  # 人脸图片清单（增量建库）
+
+# 访问日志后台批量写入与轮转
+LOG_FLUSH_INTERVAL = 1.0     # 最长缓冲时间（秒）
+LOG_BATCH_SIZE = 200         # 攒够多少条立即写入
+LOG_MAX_BYTES = 0            # 超过该大小轮转（字节，0 不限）
+LOG_ROTATE_DAILY = False     # 是否按天轮转
+STATS_CHECKPOINT_INTERVAL = 30  # 每日统计检查点落盘间隔（秒）
+STATS_KEEP_DAYS = 31         # 检查点保留最近多少天的统计
+
+# FaceNet 批量推理：单次前向传播的最大人脸数
+EMBED_BATCH_SIZE = 32
+
+# CPU 推理后端
+# FaceNet: fp32 / int8（动态量化）/ torchscript（冻结图，BN 折叠）/ channels_last
+FACENET_BACKEND = 'fp32'
+FACENET_COS_TOLERANCE = 0.995  # 与 fp32 特征的最低余弦相似度（benchmarks.bench_backends 校验）
+# YOLO: pt（原生）/ onnx / openvino / torchscript，非 pt 时首次使用自动导出
+YOLO_FORMAT = 'pt'
+
+# 检测分辨率：检测在长边不超过该值的缩小图上进行，框映射回原图，人脸裁剪仍取原图（0 不缩放）
+# YOLO 输入本身就是 640，缩到 640 对 YOLO 不损失信息，只省去其内部对大图的预处理
+DETECT_MAX_SIDE = 640
+
+# 人脸检测级联策略：mp（仅 MediaPipe）/ yolo（仅 YOLO）/ fallback（MediaPipe 无结果或低置信度时补跑 YOLO）/ both
+FACE_CASCADE = 'fallback'
+FACE_CASCADE_MIN_SCORE = 0.5  # fallback：MediaPipe 最高置信度低于该值时补跑 YOLO
+FACE_DEDUP_IOU = 0.4          # 两个检测器的框 IoU 超过该值视为同一张脸
+
+# 人脸比对：余弦相似度阈值
+MATCH_THRESHOLD = 0.75
+
+# ANN 近似检索：人脸库达到该规模时启用 IVF 索引（与人脸库同目录保存）
+ANN_INDEX_PATH = 'data/db/face_ivf.npz'
+ANN_MIN_GALLERY = 20000
+# 每次查询扫描的簇数：按 recall@1 >= 0.99 选取，10 万库（316 簇）实测 nprobe 16/32/48/64 的 recall@1
+# 为 0.936/0.974/0.994/0.998（python -m benchmarks.bench_ann 可复测）；库规模增大后簇数随之增加，应重新测定
+ANN_NPROBE = 48
+# 近似检索最高分低于 MATCH_THRESHOLD + 该值时改用精确检索复核，陌生人判定始终是精确结果
+ANN_RECHECK_MARGIN = 0.05
+# 录入/删除时沿用已训练的簇中心增量归簇，库规模相对训练时增减超过该比例才重新训练
+ANN_RETRAIN_RATIO = 0.5
+
+# 建库并行度：1 为串行，0 为使用全部 CPU 核
+ENROL_WORKERS = 1
+
+# 采集流水线：人脸模式下视频文件的采集策略 (latest / all / realtime)
+# 摄像头固定为 latest；流量/密度计数模式的视频文件固定为 all（不丢帧，计数可复现）
+VIDEO_POLICY = 'realtime'
+CAPTURE_BUFFER = 8
+
+# 人脸轨迹身份缓存（单位：帧）
+FACE_TRACK_MAX_MISSED = 5    # 轨迹丢失多少帧后删除
+FACE_REID_INTERVAL = 30      # 已确认身份的轨迹多久重新提取一次特征
+FACE_REID_GROWTH = 1.5       # 人脸面积变为上次提取时的多少倍时重新提取
+FACE_REID_MARGIN = 0.05      # 相似度低于 阈值+该值 视为低置信度
+FACE_ALERT_MAX_FRAMES = 3    # 低置信度/陌生人轨迹的复查间隔，即黑名单告警延迟上限
+
+# 流量统计自适应隔帧检测
+FLOW_ADAPTIVE = True
+FLOW_MAX_STRIDE = 4          # 最多隔几帧检测一次
+FLOW_MAX_STEP = 12.0         # 两次检测之间允许的最大位移（像素），据此由速度推算间隔
+
+# 行人质心跟踪：是否使用全局最优匹配（匈牙利算法），匹配距离门限（像素，None 不限）
+TRACKER_OPTIMAL = False
+TRACKER_MAX_DISTANCE = None
+
+# 告警输出（beep 仅 Windows，tts 需 pyttsx3，均不可用时只打印）
+ALERT_SINKS = ('beep', 'tts')
+ALERT_COOLDOWN = 10          # 同一身份告警冷却时间（秒）
+ALERT_MAX_PER_MIN = 12       # 每分钟最多有声告警次数
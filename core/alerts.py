@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+import time
+import threading
+from collections import OrderedDict, deque
+
+class AlertSink:
+    """告警输出接口：子类实现 emit(alert)；audible 为 True 的输出受全局频率限制"""
+    audible = False
+
+    def emit(self, alert):
+        raise NotImplementedError
+
+class BeepSink(AlertSink):
+    """蜂鸣器（仅 Windows）"""
+    audible = True
+
+    def __init__(self):
+        import winsound
+        self.winsound = winsound
+
+    def emit(self, alert):
+        if alert.get('beep'):
+            self.winsound.Beep(*alert['beep'])
+
+class TTSSink(AlertSink):
+    """语音播报：引擎在告警线程内首次使用时初始化（pyttsx3 不能跨线程使用）"""
+    audible = True
+
+    def __init__(self, rate=150):
+        import pyttsx3
+        self.pyttsx3 = pyttsx3
+        self.rate = rate
+        self.engine = None
+
+    def emit(self, alert):
+        if not alert.get('speech'):
+            return
+        if self.engine is None:
+            self.engine = self.pyttsx3.init()
+            self.engine.setProperty('rate', self.rate)
+        self.engine.say(alert['speech'])
+        self.engine.runAndWait()
+
+class LogSink(AlertSink):
+    """仅打印（无声卡 / Linux 无界面环境）"""
+    def emit(self, alert):
+        extra = f" (合并 {alert['count']} 次)" if alert['count'] > 1 else ""
+        print(f"🚨 {alert['text']}{extra}")
+
+SINKS = {'beep': BeepSink, 'tts': TTSSink, 'log': LogSink}
+
+def make_sinks(names):
+    """按名称创建告警输出，依赖不可用的自动跳过；一个可用的都没有时退化为仅打印"""
+    sinks = []
+    for name in names:
+        try:
+            sinks.append(SINKS[name]())
+        except Exception as e:
+            print(f"⚠️ 告警输出 {name} 不可用 (已自动禁用): {e}")
+    return sinks or [LogSink()]
+
+class AlertDispatcher(threading.Thread):
+    """告警线程：推理线程只投递，蜂鸣/语音在本线程执行，不阻塞视频处理
+
+    - 同一 key 尚在队列中时合并为一条（计数累加）
+    - 同一 key 在 cooldown 秒内只告警一次，冷却从至少一个输出成功送达时开始计
+    - 有声输出全局限频（每分钟最多 max_per_min 次），超出的只走静默输出，没有静默输出时打印
+    - 队列有界，满时丢弃最旧的一条并打印，被丢弃的 key 不进入冷却
+    """
+    def __init__(self, sinks, cooldown=10, max_per_min=12, max_pending=32):
+        super().__init__(daemon=True)
+        self.sinks = sinks
+        self.cooldown = cooldown
+        self.max_per_min = max_per_min
+        self.max_pending = max_pending
+        self.pending = OrderedDict()
+        self.last_fired = {}
+        self.fired = deque()
+        self.fallback = LogSink()
+        self.cond = threading.Condition()
+        self.posted = self.coalesced = self.suppressed = self.dropped = 0
+        self._active = True
+
+    def post(self, key, text, speech=None, beep=None, cooldown=None):
+        """非阻塞投递，返回是否入队"""
+        now = time.time()
+        cooldown = self.cooldown if cooldown is None else cooldown
+        with self.cond:
+            if key in self.pending:
+                self.pending[key]['count'] += 1
+                self.coalesced += 1
+                return False
+            if now - self.last_fired.get(key, -cooldown) < cooldown:
+                self.coalesced += 1
+                return False
+            dropped = None
+            if len(self.pending) >= self.max_pending:
+                _, dropped = self.pending.popitem(last=False)
+                self.dropped += 1
+            self.pending[key] = {'key': key, 'text': text, 'speech': speech, 'beep': beep, 'count': 1,
+                                 'time': now, 'cooldown': cooldown}
+            self.posted += 1
+            self.cond.notify()
+        if dropped is not None:
+            print(f"⚠️ 告警队列已满，未播报: {dropped['text']}")
+        return True
+
+    def run(self):
+        while True:
+            with self.cond:
+                while self._active and not self.pending:
+                    self.cond.wait()
+                if not self._active:
+                    return
+                _, alert = self.pending.popitem(last=False)
+                # 送达前又投递的同一 key（上一条仍在播报）
+                if time.time() - self.last_fired.get(alert['key'], -alert['cooldown']) < alert['cooldown']:
+                    self.coalesced += 1
+                    continue
+            now = time.time()
+            while self.fired and now - self.fired[0] > 60:
+                self.fired.popleft()
+            audible = len(self.fired) < self.max_per_min
+            if audible:
+                self.fired.append(now)
+            else:
+                self.suppressed += 1
+            sinks = [s for s in self.sinks if audible or not s.audible] or [self.fallback]
+            delivered = False
+            for sink in sinks:
+                try:
+                    sink.emit(alert)
+                    delivered = True
+                except Exception as e:
+                    print(f"⚠️ 告警输出失败: {e}")  # 告警失败不影响主程序
+            if not delivered and self.fallback not in sinks:
+                self.fallback.emit(alert)  # 全部输出失败时至少打印，不进入冷却，下次仍尝试正常输出
+            if delivered:
+                with self.cond:
+                    self.last_fired[alert['key']] = time.time()
+
+    def stop(self):
+        with self.cond:
+            self._active = False
+            self.cond.notify_all()
+
+    def stats(self):
+        with self.cond:
+            return {'alerts_posted': self.posted, 'alerts_coalesced': self.coalesced,
+                    'alerts_suppressed': self.suppressed, 'alerts_dropped': self.dropped,
+                    'alerts_pending': len(self.pending)}
@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+import time
+import threading
+import cv2
+from collections import deque
+from config import VIDEO_POLICY
+
+POLICIES = ('latest', 'all', 'realtime')
+
+def default_policy(source, mode):
+    """摄像头只处理最新帧；视频文件在计数模式（流量/密度）下逐帧处理，丢帧会改变轨迹关联和越线计数，
+    同一视频的结果将随 CPU 负载变化；人脸模式的视频文件按 VIDEO_POLICY"""
+    if isinstance(source, int):
+        return 'latest'
+    return 'all' if mode in ('flow', 'density') else VIDEO_POLICY
+
+class FrameGrabber(threading.Thread):
+    """采集线程：持续读取视频源，写入有界环形缓冲区，与推理解耦
+
+    policy:
+      latest   只保留最新一帧，推理跟不上就丢旧帧（实时摄像头，延迟有界）
+      all      不丢帧，缓冲区满时采集等待推理（离线文件，尽可能快）
+      realtime 按源帧率节奏读取，缓冲区满时丢最旧的帧（视频回放）
+    """
+    def __init__(self, source, policy='latest', buffer_size=8, notify=None):
+        super().__init__(daemon=True)
+        if policy not in POLICIES:
+            raise ValueError(f"未知采集策略: {policy}")
+        self.cap = cv2.VideoCapture(source)
+        self.policy = policy
+        self.buffer_size = 1 if policy == 'latest' else buffer_size
+        self.buf = deque()
+        self.cond = threading.Condition()
+        fps = self.cap.get(cv2.CAP_PROP_FPS)
+        self.fps = fps if 0 < fps <= 240 else 25.0
+        self.grabbed = 0
+        self.dropped = 0
+        self.finished = False
+        self._active = True
+        self.notify = notify  # 多路共享的 threading.Event，有新帧或结束时置位
+
+    def run(self):
+        period, next_t = 1.0 / self.fps, time.perf_counter()
+        while self._active:
+            ret, frame = self.cap.read()
+            if not ret: break
+            with self.cond:
+                if self.policy == 'all':
+                    while len(self.buf) >= self.buffer_size and self._active:
+                        self.cond.wait(0.1)
+                elif len(self.buf) >= self.buffer_size:
+                    self.buf.popleft()
+                    self.dropped += 1
+                self.buf.append((self.grabbed, frame))
+                self.grabbed += 1
+                self.cond.notify_all()
+            if self.notify: self.notify.set()
+            if self.policy == 'realtime':
+                next_t += period
+                delay = next_t - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                else:
+                    next_t = time.perf_counter()  # 落后时不补帧
+        self.cap.release()
+        with self.cond:
+            self.finished = True
+            self.cond.notify_all()
+        if self.notify: self.notify.set()
+
+    def read(self):
+        """取下一帧 (帧序号, 帧)；源结束或已停止且缓冲区为空时返回 None"""
+        with self.cond:
+            while not self.buf and not self.finished and self._active:
+                self.cond.wait(0.1)
+            if not self.buf:
+                return None
+            item = self.buf.popleft()
+            self.cond.notify_all()
+            return item
+
+    def poll(self):
+        """非阻塞取帧：有帧返回 (帧序号, 帧)，否则返回 None（配合 exhausted 判断是否已结束）"""
+        with self.cond:
+            if not self.buf:
+                return None
+            item = self.buf.popleft()
+            self.cond.notify_all()
+            return item
+
+    @property
+    def exhausted(self):
+        """源已结束（或已停止）且缓冲区已取空"""
+        return (self.finished or not self._active) and not self.buf
+
+    def stop(self):
+        self._active = False
+        with self.cond:
+            self.cond.notify_all()
+        if self.is_alive():
+            self.join()
+        else:
+            self.cap.release()
+
+    def stats(self):
+        return {'grabbed': self.grabbed, 'dropped': self.dropped, 'buffered': len(self.buf), 'fps': self.fps}
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+import threading
+import cv2
+import numpy as np
+
+MOSAIC_ASPECT = (16, 9)  # 多路宫格每格的宽高比
+
+def fit_size(w, h, view_w, view_h):
+    """保持宽高比缩放到 view 内的尺寸（至少 1x1）"""
+    scale = min(view_w / w, view_h / h)
+    return max(1, int(w * scale)), max(1, int(h * scale))
+
+def to_display(frame, view_size, out=None, scratch=None):
+    """BGR 帧缩放到视图大小并转成 RGB；out/scratch 尺寸匹配时直接复用，返回 (rgb, scratch)"""
+    h, w = frame.shape[:2]
+    tw, th = fit_size(w, h, *view_size)
+    if out is None or out.shape[:2] != (th, tw):
+        out = np.empty((th, tw, 3), dtype=np.uint8)
+    if (tw, th) != (w, h):
+        if scratch is None or scratch.shape[:2] != (th, tw):
+            scratch = np.empty((th, tw, 3), dtype=np.uint8)
+        cv2.resize(frame, (tw, th), dst=scratch, interpolation=cv2.INTER_LINEAR)
+        frame = scratch
+    cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, dst=out)
+    return out, scratch
+
+def compose_mosaic(tiles, view_size, canvas=None):
+    """各路最新帧拼成宫格（BGR），整体按视图大小生成，canvas 尺寸匹配时复用"""
+    n = len(tiles)
+    cols = int(np.ceil(np.sqrt(n)))
+    rows = int(np.ceil(n / cols))
+    cw, ch = fit_size(cols * MOSAIC_ASPECT[0], rows * MOSAIC_ASPECT[1], *view_size)
+    tw, th = max(1, cw // cols), max(1, ch // rows)
+    if canvas is None or canvas.shape[:2] != (rows * th, cols * tw):
+        canvas = np.zeros((rows * th, cols * tw, 3), dtype=np.uint8)
+    for k, tile in enumerate(tiles):
+        r, c = divmod(k, cols)
+        cell = canvas[r * th:(r + 1) * th, c * tw:(c + 1) * tw]
+        if tile is None:
+            cell[:] = 0
+            continue
+        cell[:] = cv2.resize(tile, (tw, th), interpolation=cv2.INTER_LINEAR)
+        cv2.putText(cell, f"CH{k + 1}", (10, 30), 0, 0.9, (0, 255, 255), 2)
+    return canvas
+
+class FrameMailbox:
+    """工作线程 -> 界面线程的最新帧信箱
+
+    工作线程 put() 把帧缩放到界面告知的视图大小、转成 RGB，写入固定几个缓冲区之一（循环复用）；
+    界面按刷新率 take() 只取最新一帧，中间来不及显示的帧直接被覆盖，不排队。
+    写入时避开"最新帧"和"界面正在显示的帧"两个缓冲区，3 个缓冲区即可保证读写不冲突。
+    """
+    def __init__(self, pool_size=3, view_size=(640, 480)):
+        self.pool = [None] * max(3, pool_size)
+        self.scratch = None  # 缩放中间结果，仅工作线程使用
+        self.view_size = view_size
+        self.lock = threading.Lock()
+        self.latest, self.reading = None, None
+        self.src_dims = None
+        self.seq, self.taken_seq = 0, 0
+        self.shown = 0
+
+    def set_view_size(self, w, h):
+        """界面线程告知视图大小，下一帧起按新尺寸生成"""
+        self.view_size = (max(1, w), max(1, h))
+
+    @property
+    def pending(self):
+        """最新帧还没被界面取走"""
+        return self.seq != self.taken_seq
+
+    def put(self, frame):
+        """工作线程：生成显示用帧并发布为最新帧"""
+        with self.lock:
+            k = next(i for i in range(len(self.pool)) if i != self.latest and i != self.reading)
+        self.pool[k], self.scratch = to_display(frame, self.view_size, self.pool[k], self.scratch)
+        with self.lock:
+            self.latest = k
+            self.src_dims = (frame.shape[1], frame.shape[0])
+            self.seq += 1
+
+    def take(self):
+        """界面线程：有新帧时返回 (RGB 帧, 原始帧尺寸 (w, h))，否则 None；返回的缓冲区在下次 take 前不会被改写"""
+        with self.lock:
+            if self.latest is None or self.seq == self.taken_seq:
+                return None
+            self.reading, self.taken_seq = self.latest, self.seq
+            self.shown += 1
+            return self.pool[self.reading], self.src_dims
+
+    def stats(self):
+        return {'published': self.seq, 'displayed': self.shown}
@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+
+def box_iou(a, b):
+    """(N,4) 与 (M,4) 的 x1y1x2y2 框两两 IoU，返回 (N,M)"""
+    a = np.asarray(a, dtype=np.float32).reshape(-1, 4)
+    b = np.asarray(b, dtype=np.float32).reshape(-1, 4)
+    lt = np.maximum(a[:, None, :2], b[None, :, :2])
+    rb = np.minimum(a[:, None, 2:], b[None, :, 2:])
+    inter = np.prod(np.clip(rb - lt, 0, None), axis=2)
+    area_a = np.prod(a[:, 2:] - a[:, :2], axis=1)
+    area_b = np.prod(b[:, 2:] - b[:, :2], axis=1)
+    return inter / (area_a[:, None] + area_b[None, :] - inter + 1e-5)
+
+def side_of_lines(lines, pts):
+    """lines (L,2,2)，pts (N,2)：每个点相对每条有向线段的叉积，返回 (L,N)，>0 为左侧"""
+    lines = np.asarray(lines, dtype=np.float64).reshape(-1, 2, 2)
+    pts = np.asarray(pts, dtype=np.float64).reshape(-1, 2)
+    p1, d = lines[:, 0], lines[:, 1] - lines[:, 0]
+    return d[:, 0:1] * (pts[None, :, 1] - p1[:, 1:2]) - d[:, 1:2] * (pts[None, :, 0] - p1[:, 0:1])
+
+def points_in_polygon(poly, pts):
+    """射线法：pts (N,2) 是否在多边形 poly (E,2) 内，返回 (N,) bool"""
+    poly = np.asarray(poly, dtype=np.float64).reshape(-1, 2)
+    pts = np.asarray(pts, dtype=np.float64).reshape(-1, 2)
+    xi, yi = poly[:, 0:1], poly[:, 1:2]
+    xj, yj = np.roll(poly[:, 0], 1)[:, None], np.roll(poly[:, 1], 1)[:, None]
+    x, y = pts[None, :, 0], pts[None, :, 1]
+    straddle = (yi > y) != (yj > y)
+    dy = np.where(yj == yi, 1.0, yj - yi)
+    cross = straddle & (x < (xj - xi) * (y - yi) / dy + xi)
+    return np.count_nonzero(cross, axis=0) % 2 == 1
@@ -0,0 +1,224 @@
+# -*- coding: utf-8 -*-
+import os
+import numpy as np
+from config import ANN_INDEX_PATH, ANN_MIN_GALLERY, ANN_NPROBE, ANN_RECHECK_MARGIN, MATCH_THRESHOLD
+
+EMB_DIM = 512
+
+def normalize_rows(x):
+    """按行 L2 归一化为 float32"""
+    x = np.asarray(x, dtype=np.float32)
+    return x / (np.linalg.norm(x, axis=-1, keepdims=True) + 1e-8)
+
+class FaceMatcher:
+    """人脸库比对器：预归一化的连续 float32 矩阵 + id 数组，整帧人脸一次矩阵乘法
+
+    (ids, matrix, index) 作为一个整体保存在 self.state 中，更新时在调用线程构建新的一份再整体替换，
+    推理线程在 match() 中只取一次快照，库更新与比对并发时不会出现行与 id 错位。
+    """
+    def __init__(self, face_db=None, dim=EMB_DIM, index_path=ANN_INDEX_PATH):
+        self.dim = dim
+        self.index_path = index_path
+        # index：大库时的 IVFIndex，行顺序与 matrix 对齐
+        self.state = (np.empty(0, dtype=object), np.empty((0, dim), dtype=np.float32), None)
+        if face_db:
+            self.update(face_db)
+
+    @property
+    def ids(self):
+        return self.state[0]
+
+    @property
+    def matrix(self):
+        return self.state[1]
+
+    @property
+    def index(self):
+        return self.state[2]
+
+    @index.setter
+    def index(self, index):
+        self.state = self.state[:2] + (index,)
+
+    def __len__(self):
+        return len(self.ids)
+
+    @staticmethod
+    def _removed(state, pids):
+        ids, matrix, index = state
+        pids = set(pids)
+        if not pids: return state
+        keep = np.array([p not in pids for p in ids], dtype=bool)
+        return ids[keep], np.ascontiguousarray(matrix[keep]), None if index is None else index.without(keep)
+
+    def _added(self, state, pids, embs):
+        ids, matrix, index = state
+        if not len(pids): return state
+        rows = normalize_rows(embs).reshape(-1, self.dim)
+        return (np.concatenate([ids, np.array(list(pids), dtype=object)]),
+                np.ascontiguousarray(np.concatenate([matrix, rows])), None if index is None else index.extended(rows))
+
+    def remove(self, pids):
+        self.state = self._removed(self.state, pids)
+
+    def add(self, pids, embs):
+        self.state = self._added(self.state, pids, embs)
+
+    def update(self, face_db):
+        """增量同步：删除已移除的人，追加新增的人，特征变化的人替换；最后一次性替换 state"""
+        face_db = face_db or {}
+        ids, matrix, index = self.state
+        if hasattr(face_db, 'matrix'):
+            # FaceGallery：矩阵已归一化，直接引用（内存映射，零拷贝）
+            new_ids = np.array(face_db.ids, dtype=object)
+            if index is not None and not np.array_equal(new_ids, ids):
+                index = None
+            self.state = self._with_index(new_ids, face_db.matrix, index)
+            return
+        present = np.array([p in face_db for p in ids], dtype=bool)
+        stale = set(ids[~present])
+        if present.any():
+            kept = ids[present]
+            fresh = normalize_rows(np.stack([face_db[p] for p in kept]))
+            stale.update(kept[np.any(fresh != matrix[present], axis=1)])
+        state = self._removed(self.state, stale)
+        known = set(state[0])
+        added = [p for p in face_db if p not in known]
+        if added:
+            state = self._added(state, added, np.stack([face_db[p] for p in added]))
+        self.state = self._with_index(*state)
+
+    def _with_index(self, ids, matrix, index):
+        """库规模达到 ANN_MIN_GALLERY 时加载磁盘上的 IVF 索引，规模回落则退回暴力检索"""
+        if len(ids) < ANN_MIN_GALLERY:
+            index = None
+        elif index is None and self.index_path and os.path.exists(self.index_path):
+            try:
+                index = IVFIndex.load(self.index_path, ids, matrix)
+            except Exception as e:
+                print(f"⚠️ ANN 索引加载失败，使用暴力检索: {e}")
+        return ids, matrix, index
+
+    @staticmethod
+    def _exact(matrix, q, k):
+        """暴力检索，返回 (rows, scores)，形状 (N, k)；库中不足 k 条时 rows 为 -1、scores 为 -inf"""
+        rows = np.full((len(q), k), -1, dtype=np.intp)
+        scores = np.full((len(q), k), -np.inf, dtype=np.float32)
+        sims = q @ matrix.T
+        kk = min(k, len(matrix))
+        if kk == 1:
+            idx = sims.argmax(axis=1)[:, None]
+        else:
+            idx = np.argpartition(-sims, kk - 1, axis=1)[:, :kk]
+            order = np.argsort(-np.take_along_axis(sims, idx, axis=1), axis=1)
+            idx = np.take_along_axis(idx, order, axis=1)
+        rows[:, :kk], scores[:, :kk] = idx, np.take_along_axis(sims, idx, axis=1)
+        return rows, scores
+
+    def match(self, embs, k=1):
+        """返回 (ids, scores)，形状恒为 (N, k)，按相似度降序；库中不足 k 条（或库为空）时不足的位置 id 为 None、分数为 -inf"""
+        q = normalize_rows(embs).reshape(-1, self.dim)
+        gallery_ids, matrix, index = self.state  # 只取一次快照
+        ids = np.full((len(q), k), None, dtype=object)
+        if len(gallery_ids) == 0:
+            return ids, np.full((len(q), k), -np.inf, dtype=np.float32)
+        if index is not None:
+            rows, scores = index.search(matrix, q, k, ANN_NPROBE)
+            # 近似检索可能漏掉真正的最近邻：最高分低于 阈值+余量（将判为陌生人或低置信度）的查询用精确检索复核，
+            # 保证库内人员（包括黑名单）不会因为漏检被静默判为陌生人
+            recheck = scores[:, 0] < MATCH_THRESHOLD + ANN_RECHECK_MARGIN
+            if recheck.any():
+                rows[recheck], scores[recheck] = self._exact(matrix, q[recheck], k)
+        else:
+            rows, scores = self._exact(matrix, q, k)
+        found = rows >= 0
+        ids[found] = gallery_ids[rows[found]]
+        return ids, scores
+
+
+class IVFIndex:
+    """IVF 倒排索引：球面 k-means 粗聚类，查询只扫描最近的 nprobe 个簇，候选用原始向量精确重排
+
+    trained_size 为训练时的库规模，增删只就近归簇，规模偏离过多时由调用方重新训练。
+    """
+    def __init__(self, centroids, assign, trained_size=None):
+        self.centroids = np.ascontiguousarray(centroids, dtype=np.float32)
+        self.assign = np.asarray(assign, dtype=np.int32)
+        self.trained_size = len(self.assign) if trained_size is None else int(trained_size)
+        self._reindex()
+
+    def __len__(self):
+        return len(self.assign)
+
+    def _reindex(self):
+        # 按簇排序后的行号 + 每个簇的起止偏移
+        self.order = np.argsort(self.assign, kind='stable')
+        self.offsets = np.searchsorted(self.assign[self.order], np.arange(len(self.centroids) + 1))
+
+    @staticmethod
+    def _nearest(matrix, centroids, chunk=8192):
+        out = np.empty(len(matrix), dtype=np.int32)
+        for s in range(0, len(matrix), chunk):
+            out[s:s + chunk] = (matrix[s:s + chunk] @ centroids.T).argmax(axis=1)
+        return out
+
+    @classmethod
+    def train(cls, matrix, nlist=None, iters=10, max_train=64, seed=0):
+        """matrix 需已按行归一化；训练集按每簇 max_train 个样本抽样"""
+        n = len(matrix)
+        nlist = min(n, nlist or max(1, int(np.sqrt(n))))
+        rng = np.random.default_rng(seed)
+        train = matrix if n <= nlist * max_train else matrix[rng.choice(n, nlist * max_train, replace=False)]
+        centroids = train[rng.choice(len(train), nlist, replace=False)].copy()
+        for _ in range(iters):
+            assign = cls._nearest(train, centroids)
+            order = np.argsort(assign, kind='stable')
+            counts = np.bincount(assign, minlength=nlist)
+            nz = counts > 0
+            starts = np.concatenate([[0], np.cumsum(counts)[:-1]])[nz]
+            # 空簇保留原中心
+            centroids[nz] = normalize_rows(np.add.reduceat(train[order], starts, axis=0))
+        return cls(centroids, cls._nearest(matrix, centroids), n)
+
+    def without(self, keep):
+        """删除 keep 为 False 的行，返回新索引（原索引不变，可被并发查询继续使用）"""
+        return IVFIndex(self.centroids, self.assign[keep], self.trained_size)
+
+    def extended(self, matrix):
+        """追加行并就近归簇，返回新索引"""
+        return IVFIndex(self.centroids, np.concatenate([self.assign, self._nearest(matrix, self.centroids)]),
+                        self.trained_size)
+
+    def search(self, matrix, q, k=1, nprobe=8):
+        """返回 (rows, scores)，形状 (N, k)；候选不足时 rows 为 -1、scores 为 -inf"""
+        nprobe = min(nprobe, len(self.centroids))
+        probes = np.argpartition(-(q @ self.centroids.T), nprobe - 1, axis=1)[:, :nprobe]
+        rows = np.full((len(q), k), -1, dtype=np.intp)
+        scores = np.full((len(q), k), -np.inf, dtype=np.float32)
+        for i, qi in enumerate(q):
+            cand = np.concatenate([self.order[self.offsets[c]:self.offsets[c + 1]] for c in probes[i]])
+            if not len(cand): continue
+            sims = matrix[cand] @ qi
+            kk = min(k, len(cand))
+            top = np.argpartition(-sims, kk - 1)[:kk]
+            top = top[np.argsort(-sims[top])]
+            rows[i, :kk], scores[i, :kk] = cand[top], sims[top]
+        return rows, scores
+
+    def save(self, path, ids):
+        np.savez(path, centroids=self.centroids, assign=self.assign, ids=np.array(list(ids), dtype=str),
+                 trained_size=self.trained_size)
+
+    @classmethod
+    def load(cls, path, ids, matrix, stale=()):
+        """按 id 对齐到当前矩阵的行顺序；索引中没有的行和 stale 中（特征已变化）的行就近归簇"""
+        data = np.load(path)
+        centroids = data['centroids']
+        saved = dict(zip(data['ids'].tolist(), data['assign'].tolist()))
+        stale = set(stale)
+        assign = np.array([-1 if p in stale else saved.get(p, -1) for p in ids], dtype=np.int32)
+        missing = assign < 0
+        if missing.any():
+            assign[missing] = cls._nearest(matrix[missing], centroids)
+        trained_size = data['trained_size'] if 'trained_size' in data else len(data['assign'])
+        return cls(centroids, assign, trained_size)
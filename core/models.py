@@ -1,20 +1,122 @@
 # -*- coding: utf-8 -*-
+import os
+import time
+import threading
 import torch
-import mediapipe as mp
-from facenet_pytorch import InceptionResnetV1
-from ultralytics import YOLO
+from config import FACENET_BACKEND, YOLO_FORMAT, FACE_CASCADE
 
 # 设备配置
 device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
 
-# 1. MediaPipe 人脸检测
-mp_face = mp.solutions.face_detection
-face_detection = mp_face.FaceDetection(model_selection=1, min_detection_confidence=0.15)
+FACENET_BACKENDS = ('fp32', 'int8', 'torchscript', 'channels_last')
 
-# 2. FaceNet 特征提取
-resnet = InceptionResnetV1(pretrained='vggface2').eval().to(device)
+def optimize_facenet(model, backend=FACENET_BACKEND):
+    """按配置的推理后端包装 FaceNet；这些优化只针对 CPU，GPU 上保持 fp32"""
+    if backend not in FACENET_BACKENDS:
+        raise ValueError(f"未知 FaceNet 推理后端: {backend}")
+    if backend == 'fp32' or device.type != 'cpu':
+        return model
+    if backend == 'int8':
+        # 动态量化：全连接层权重 int8，激活运行时量化
+        return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    if backend == 'channels_last':
+        return model.to(memory_format=torch.channels_last)
+    # torchscript：追踪后冻结，BN 折叠进卷积并做推理图优化
+    example = torch.zeros(2, 3, 160, 160).contiguous(memory_format=torch.channels_last)
+    with torch.no_grad():
+        traced = torch.jit.trace(model, example)
+        return torch.jit.optimize_for_inference(torch.jit.freeze(traced))
 
-# 3. YOLO 模型（只是辅助作用，帮助我们找到mp没找到的人脸）
+# YOLO 导出格式对应的导出文件名（与权重同目录）
+YOLO_EXPORTS = {'onnx': '{}.onnx', 'openvino': '{}_openvino_model', 'torchscript': '{}.torchscript'}
 
-yolo_person = YOLO('yolov8n.pt')      # 行人检测
-yolo_face = YOLO('yolov8n-face.pt')   # 辅助人脸检测
\ No newline at end of file
+def load_yolo(weights, fmt=YOLO_FORMAT):
+    """加载 YOLO；fmt 非 pt 时首次使用导出一次，之后直接加载导出文件"""
+    from ultralytics import YOLO
+    if fmt == 'pt':
+        return YOLO(weights)
+    if fmt not in YOLO_EXPORTS:
+        raise ValueError(f"未知 YOLO 导出格式: {fmt}")
+    exported = YOLO_EXPORTS[fmt].format(os.path.splitext(weights)[0])
+    if not os.path.exists(exported):
+        print(f"🔄 正在导出 {weights} -> {fmt} ...")
+        exported = YOLO(weights).export(format=fmt)
+    return YOLO(exported, task='detect')
+
+# 模型按需加载：首次使用时才构建，各模式只加载自己用到的模型
+def _load_face_detection():
+    # 1. MediaPipe 人脸检测
+    import mediapipe as mp
+    return mp.solutions.face_detection.FaceDetection(model_selection=1, min_detection_confidence=0.15)
+
+def _load_resnet():
+    # 2. FaceNet 特征提取
+    from facenet_pytorch import InceptionResnetV1
+    return optimize_facenet(InceptionResnetV1(pretrained='vggface2').eval().to(device))
+
+def _load_yolo_person():
+    # 3. YOLO 行人检测
+    return load_yolo('yolov8n.pt')
+
+def _load_yolo_face():
+    # 4. YOLO 辅助人脸检测（帮助我们找到mp没找到的人脸）
+    return load_yolo('yolov8n-face.pt')
+
+LOADERS = {
+    'face_detection': _load_face_detection,
+    'resnet': _load_resnet,
+    'yolo_person': _load_yolo_person,
+    'yolo_face': _load_yolo_face,
+}
+
+# 人脸检测级联策略用到的检测模型
+CASCADE_MODELS = {
+    'mp': ('face_detection',),
+    'yolo': ('yolo_face',),
+    'fallback': ('face_detection', 'yolo_face'),
+    'both': ('face_detection', 'yolo_face'),
+}
+
+# 各识别模式用到的模型
+MODE_MODELS = {
+    'face': CASCADE_MODELS.get(FACE_CASCADE, ('face_detection', 'yolo_face')) + ('resnet',),
+    'flow': ('yolo_person',),
+    'density': ('yolo_person',),
+}
+
+_models = {}
+_locks = {name: threading.Lock() for name in LOADERS}
+
+def get_model(name):
+    """取模型，未加载时在当前线程加载（同一模型并发请求只加载一次）"""
+    model = _models.get(name)
+    if model is None:
+        with _locks[name]:
+            model = _models.get(name)
+            if model is None:
+                t0 = time.perf_counter()
+                model = _models[name] = LOADERS[name]()
+                print(f"✅ 模型 {name} 加载完成 ({time.perf_counter() - t0:.1f}s)")
+    return model
+
+def get_face_detection(): return get_model('face_detection')
+def get_resnet(): return get_model('resnet')
+def get_yolo_person(): return get_model('yolo_person')
+def get_yolo_face(): return get_model('yolo_face')
+
+def is_loaded(name):
+    return name in _models
+
+def warmup(names, progress=None):
+    """依次加载 names 中的模型；progress(已完成数, 总数, 当前模型名) 在每个模型开始加载前回调"""
+    todo = [n for n in names if not is_loaded(n)]
+    for i, name in enumerate(todo):
+        if progress: progress(i, len(todo), name)
+        get_model(name)
+    if progress and todo: progress(len(todo), len(todo), '')
+
+def __getattr__(name):
+    # 兼容旧写法 from core.models import resnet：访问时才加载
+    if name in LOADERS:
+        return get_model(name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
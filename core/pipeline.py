@@ -0,0 +1,402 @@
+# -*- coding: utf-8 -*-
+import time
+import threading
+import cv2
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+from core.models import get_yolo_person
+from core.recognition import (detect_faces, detect_faces_batch, expand_box, crop_faces, embed_faces,
+                              shrink_for_detection, scale_boxes)
+from core.matcher import FaceMatcher
+from core.capture import FrameGrabber, default_policy
+from core.tracking import CentroidTracker, PedestrianFlowManager, IoUTracker, MotionPredictor
+from core.zones import ZoneCounter
+from database.logger import log_unified
+from config import (MATCH_THRESHOLD, FONT_PATH, FACE_TRACK_MAX_MISSED, FACE_REID_INTERVAL, FACE_REID_GROWTH,
+                    FACE_REID_MARGIN, FACE_ALERT_MAX_FRAMES, FLOW_ADAPTIVE, FLOW_MAX_STRIDE, FLOW_MAX_STEP,
+                    TRACKER_OPTIMAL, TRACKER_MAX_DISTANCE, DETECT_MAX_SIDE)
+
+def detect_persons_batch(frames, max_side=DETECT_MAX_SIDE):
+    """多帧行人检测，在缩小图上 YOLO 整批一次前向，返回每帧原图坐标的 (N,4) int 框"""
+    if not frames:
+        return []
+    small, scales = zip(*(shrink_for_detection(f, max_side) for f in frames))
+    results = get_yolo_person()(list(small), classes=[0], verbose=False, conf=0.3)
+    return [scale_boxes(r.boxes.xyxy.cpu().numpy(), scale, f.shape) for r, scale, f in zip(results, scales, frames)]
+
+class FrameProcessor:
+    """单路视频的逐帧处理（不依赖 Qt）：检测、跟踪、计数、识别并把叠加层画在帧上
+
+    结果通过 emit(kind, *args) 回调输出：
+      'log'   (来源, 姓名/ID, 信息)
+      'flow'  流量状态 dict
+      'count' 密度模式区域内总人数
+      'zones' 密度模式各区域 [(名称, 人数, 阈值), ...]
+    多路调度时按 begin() -> [批量 FaceNet] -> finish() 两阶段调用，检测结果也可由外部整批传入。
+    """
+    def __init__(self, mode='face', src=u"视频分析", face_db=None, bl=None, wl=None, flow_config=None,
+                 density_config=None, emit=None, alerts=None, matcher=None, log=log_unified, clock=time.time, render=True):
+        self.mode = mode
+        self.src = src
+        self.emit = emit or (lambda *args: None)
+        self.log = log  # 事件落盘 log(来源, 姓名, 状态, 详情)，默认写访问日志
+        self.clock = clock  # 去抖/告警间隔/日志冷却用的时钟，离线分析时传入视频时间
+        self.render = render  # 是否在帧上绘制叠加层（离线分析可关闭）
+        self.alerts = alerts
+        self.face_db, self.bl, self.wl = face_db, bl or set(), wl or set()
+        self.matcher = matcher if matcher is not None else FaceMatcher(face_db)
+        self.tracker = CentroidTracker(max_distance=TRACKER_MAX_DISTANCE, optimal=TRACKER_OPTIMAL)
+        self.face_tracker = IoUTracker(max_missed=FACE_TRACK_MAX_MISSED)
+        self.motion = MotionPredictor(FLOW_MAX_STRIDE, FLOW_MAX_STEP)
+        self.next_detect = 0
+        self.last_detect = 0
+        self.track_boxes = {}  # 流量模式：轨迹 id -> 最近一次检测框的半宽高
+        self.person_detections = 0
+        self.frame_idx = 0
+        self.faces_embedded = 0
+        self.flow_mgr = PedestrianFlowManager()
+        self.log_cd = {}
+        # density_config: {'zones': [{'name', 'polygon', 'threshold'}, ...], 'alert_interval'}
+        # 也兼容旧的单矩形格式 {'roi', 'threshold', 'alert_interval'}
+        self.density_config = density_config or {}
+        self.zones = ZoneCounter.from_config(self.density_config)
+        self.font = None
+        self._pending = None
+        self._db_lock = threading.Lock()
+        self._db_update = None  # 界面线程登记的人脸库更新 (face_db, bl, wl, update_matcher)
+
+        # 流量线设置
+        # flow_config: {'lines': [{'p1', 'p2', 'sign'}, ...], 'polygons': [[(x, y), ...], ...]}
+        # 也兼容旧的单线格式 {'p1', 'p2', 'sign'}
+        if flow_config:
+            lines = flow_config.get('lines', [flow_config] if 'p1' in flow_config else [])
+            self.flow_mgr.clear_gates()
+            for ln in lines:
+                self.flow_mgr.add_line(ln['p1'], ln['p2'], ln['sign'])
+            for poly in flow_config.get('polygons', []):
+                self.flow_mgr.add_polygon(poly)
+
+    def set_face_db(self, face_db, bl, wl, update_matcher=True):
+        """人脸库更新（可在界面线程调用）：只登记，由推理线程在下一帧 begin() 开始时统一生效"""
+        with self._db_lock:
+            self._db_update = (face_db, bl, wl, update_matcher)
+
+    def _apply_face_db(self):
+        """推理线程：比对矩阵增量重建、名单替换，轨迹上缓存的身份全部作废"""
+        with self._db_lock:
+            update, self._db_update = self._db_update, None
+        if update is None:
+            return
+        face_db, bl, wl, update_matcher = update
+        if update_matcher:
+            self.matcher.update(face_db)
+        self.face_db, self.bl, self.wl = face_db, bl, wl
+        for tr in self.face_tracker.tracks.values():
+            tr['ident'] = None
+
+    def _needs_embed(self, track, box):
+        """新轨迹、人脸明显变大、间隔到期时重算；低置信度/陌生人轨迹按告警延迟上限频繁复查"""
+        if track.get('ident') is None:
+            return True
+        age = self.frame_idx - track['last_embed']
+        if (box[2] - box[0]) * (box[3] - box[1]) > track['embed_area'] * FACE_REID_GROWTH:
+            return True
+        if track['score'] < MATCH_THRESHOLD + FACE_REID_MARGIN:
+            return age >= FACE_ALERT_MAX_FRAMES
+        return age >= FACE_REID_INTERVAL
+
+    def _get_identity(self, mid, score):
+        """统一处理身份比对逻辑，返回 (name, color, status)"""
+        name, color, status = "Stranger", (0, 165, 255), "Stranger"
+        if mid is not None and score > MATCH_THRESHOLD:
+            name = mid
+            color = (0, 255, 0) if mid in self.wl else (0, 0, 255)
+            status = u"白名单" if mid in self.wl else u"黑名单"
+            current_time = self.clock()
+            if mid not in self.log_cd or (current_time - self.log_cd[mid] > 10):
+                self.emit('log', self.src, mid, status)
+                self.log(self.src, mid, status, f"Sim:{score:.2f}")
+
+                # 触发警报（非阻塞）
+                if status == u"黑名单" and self.alerts:
+                    self.alerts.post(mid, f"发现黑名单 {name}", speech=f"发现黑名单 {name}", beep=(1000, 500))
+
+                self.log_cd[mid] = current_time
+        return name, color, status
+
+    def wants_persons(self):
+        """下一帧是否需要行人检测（流量模式自适应隔帧，密度模式每帧）"""
+        if self.mode == 'density':
+            return True
+        if self.mode == 'flow':
+            return not FLOW_ADAPTIVE or self.frame_idx + 1 >= self.next_detect
+        return False
+
+    def _detect_persons(self, frame):
+        return detect_persons_batch([frame])[0]
+
+    def process_frame(self, frame):
+        """单路处理一帧（检测和 FaceNet 都在本路内完成）"""
+        batch = self.begin(frame)
+        self.finish(frame, embed_faces(batch) if batch is not None and len(batch) else None)
+
+    def begin(self, frame, persons=None, faces=None):
+        """第一阶段：检测 + 跟踪 + 计数。persons/faces 为外部整批检测的结果，None 时本路自行检测
+
+        人脸模式返回需要提取特征的人脸裁剪 (N,160,160,3)，其余模式返回 None 且本帧已处理完毕。
+        """
+        self._apply_face_db()
+        self.frame_idx += 1
+        if self.mode == 'flow':
+            self._flow(frame, persons)
+        elif self.mode == 'density':
+            self._density(frame, persons)
+        else:
+            return self._face_begin(frame, faces)
+        return None
+
+    def finish(self, frame, embs=None):
+        """第二阶段（人脸模式）：用 begin() 所需裁剪的特征完成比对与绘制"""
+        if self.mode == 'face':
+            self._face_finish(frame, embs)
+
+    def _flow(self, frame, persons):
+        # 自适应隔帧检测：非检测帧用匀速模型外推轨迹
+        if persons is not None or not FLOW_ADAPTIVE or self.frame_idx >= self.next_detect:
+            if persons is None:
+                persons = self._detect_persons(frame)
+            self.person_detections += 1
+            rects = np.asarray(persons).reshape(-1, 4)
+            objs = self.tracker.update(rects, step=self.frame_idx - self.last_detect)
+            self.last_detect = self.frame_idx
+            self.next_detect = self.frame_idx + self.motion.observe(objs, self.frame_idx)
+            # 记下本次匹配到检测框的轨迹的框尺寸，非检测帧按预测质心画框，避免叠加层闪烁
+            half = {tuple(c): wh for c, wh in zip(((rects[:, :2] + rects[:, 2:4]) / 2).astype(np.int64).tolist(),
+                                                 ((rects[:, 2:4] - rects[:, :2]) // 2).astype(int).tolist())}
+            self.track_boxes = {tid: half[tuple(c)] for tid, c in objs.items() if tuple(c) in half}
+        else:
+            objs = self.motion.predict(self.frame_idx)
+        tids, cents = list(objs.keys()), list(objs.values())
+        multi = len(self.flow_mgr.gates) > 1
+        for g, tid, cross in self.flow_mgr.update(tids, cents, self.clock()):
+            msg = u"越线进入" if cross=="IN" else u"越线离开"
+            if multi: msg += f" [{self.flow_mgr.gates[g]['name']}]"
+            self.emit('log', self.src, f"ID:{tid}", msg)
+            self.log(self.src, f"ID:{tid}", "Flow", msg)
+        st = self.flow_mgr.get_status()
+        self.emit('flow', st)
+        if not self.render:
+            return
+        for tid, cent in zip(tids, cents):
+            cx, cy = int(cent[0]), int(cent[1])
+            if tid in self.track_boxes:
+                hw, hh = self.track_boxes[tid]
+                cv2.rectangle(frame, (cx - hw, cy - hh), (cx + hw, cy + hh), (255,255,0), 2)
+                cv2.putText(frame, f"ID:{tid}", (cx - hw, cy - hh - 6), 0, 0.6, (255,255,0), 2)
+            cv2.circle(frame, (cx, cy), 5, (0,255,255), -1)
+        for gate in self.flow_mgr.gates:
+            if gate['kind'] == 'line':
+                p1, p2 = gate['pts']
+                cv2.line(frame, p1, p2, (0,0,255), 3)
+                cv2.arrowedLine(frame, p1, p2, (0,255,0), 3)
+            else:
+                cv2.polylines(frame, [np.array(gate['pts'], dtype=np.int32)], True, (0,0,255), 3)
+            if multi:
+                cv2.putText(frame, gate['name'], gate['pts'][0], 0, 0.8, (0,0,255), 2)
+        cv2.putText(frame, f"IN:{st['in']} OUT:{st['out']}", (20,60), 0, 1.2, (0,255,0), 3)
+
+    def _density(self, frame, boxes):
+        if boxes is None:
+            boxes = self._detect_persons(frame)
+        self.person_detections += 1
+        centers = (boxes[:, :2] + boxes[:, 2:4]) // 2
+        counts, inside = self.zones.count(centers, frame.shape)
+        centers = centers[inside]
+        count = len(centers)
+        self.emit('count', count)
+        self.emit('zones', [(z['name'], int(c), z['threshold']) for z, c in zip(self.zones.zones, counts)])
+
+        report = self.zones.tick(counts, self.clock())
+        if report:
+            self._density_report(report)
+        if self.render:
+            self._render_density(frame, centers, count, counts)
+
+    def _density_report(self, report):
+        alarm = False
+        for z, m, over in report:
+            msg = f"间隔内最大人数: {m} (阈值: {z['threshold']})"
+            if len(report) > 1: msg = f"[{z['name']}] " + msg
+            self.emit('log', self.src, "密度统计", msg)
+            if over:
+                self.emit('log', self.src, "密度告警", f"【密度告警】{msg} - 超标！")
+                alarm = True
+        if alarm and self.alerts:
+            self.alerts.post('density', u"人群密度超标", beep=(2500, 1200), cooldown=0)
+
+    def _face_begin(self, frame, faces):
+        # 人脸识别模式：身份挂在轨迹上，FaceNet + 比对只在需要时重算
+        h, w = frame.shape[:2]
+        dets, boxes = [], []
+        for b in (detect_faces(frame) if faces is None else faces):
+            c = expand_box(b, w, h)
+            if c[2] > c[0] and c[3] > c[1]:
+                dets.append(b)
+                boxes.append(c)
+        tids = self.face_tracker.update(boxes)
+        tracks = self.face_tracker.tracks
+        need = [i for i, tid in enumerate(tids) if self._needs_embed(tracks[tid], boxes[i])]
+        self._pending = (boxes, tids, need)
+        if not need:
+            return None
+        batch, _ = crop_faces(frame, [dets[i] for i in need])
+        return batch
+
+    def _face_finish(self, frame, embs):
+        boxes, tids, need = self._pending
+        self._pending = None
+        tracks = self.face_tracker.tracks
+        if need:
+            ids, scores = self.matcher.match(embs)
+            self.faces_embedded += len(need)
+            for i, mid, score in zip(need, ids[:, 0], scores[:, 0]):
+                x1, y1, x2, y2 = boxes[i]
+                tracks[tids[i]].update(ident=self._get_identity(mid, score), score=score,
+                                       last_embed=self.frame_idx, embed_area=(x2 - x1) * (y2 - y1))
+
+        for (x1, y1, x2, y2), tid in zip(boxes, tids):
+            name, color, status = tracks[tid]['ident']
+            if self.render:
+                cv2.rectangle(frame, (x1, y1), (x2, y2), color, 2)
+                cv2.putText(frame, name, (x1, y1 - 10), 0, 0.8, color, 2)
+
+    def _render_density(self, frame, centers, count, counts):
+        """密度模式叠加层（区域多边形、超阈值热力图、人数文字），直接画在帧上，界面只负责显示"""
+        over_zones = counts > self.zones.thresholds
+        multi = len(self.zones.zones) > 1
+        for z, c, zone_over in zip(self.zones.zones, counts, over_zones):
+            if z['polygon'] is None: continue
+            pts = np.array(z['polygon'], dtype=np.int32)
+            color = (0, 0, 255) if zone_over else (0, 255, 0)
+            cv2.polylines(frame, [pts], True, color, 6)
+            if multi:
+                cv2.putText(frame, f"{z['name']}:{c}", tuple(pts.min(axis=0)), 0, 1.2, color, 3)
+
+        over = bool(over_zones.any())
+        if over:
+            # 热力图在 1/4 分辨率上生成再放大，模糊核随之缩小，效果一致但开销约为 1/16
+            h, w = frame.shape[:2]
+            s = 4
+            heat = np.zeros((h // s + 1, w // s + 1), dtype=np.float32)
+            for cx, cy in centers:
+                cv2.circle(heat, (int(cx) // s, int(cy) // s), 60 // s, 1.5, -1)
+            heat = cv2.GaussianBlur(heat, (0, 0), sigmaX=30 / s)
+            heat_norm = cv2.normalize(heat, None, 0, 255, cv2.NORM_MINMAX).astype(np.uint8)
+            heat_color = cv2.resize(cv2.applyColorMap(heat_norm, cv2.COLORMAP_JET)[:h // s, :w // s], (w, h))
+            cv2.addWeighted(frame, 0.6, heat_color, 0.4, 0, dst=frame)
+            cv2.rectangle(frame, (0, 0), (w, h), (0, 0, 255), 15)
+
+        # 中文文字只在文字区域内走 PIL，避免整帧来回转换
+        if self.font is None:
+            try:
+                self.font = ImageFont.truetype(FONT_PATH, 100)
+            except:
+                self.font = ImageFont.load_default()
+        text = f"实时密度: {count} 人"
+        fill_color = (255, 0, 0) if over else (0, 255, 0)
+        l, t, r, b = self.font.getbbox(text)
+        x1, y1 = 50 + l, 50 + t
+        x2, y2 = min(frame.shape[1], 50 + r), min(frame.shape[0], 50 + b)
+        if x2 > x1 and y2 > y1:
+            patch = Image.fromarray(cv2.cvtColor(frame[y1:y2, x1:x2], cv2.COLOR_BGR2RGB))
+            ImageDraw.Draw(patch).text((50 - x1, 50 - y1), text, font=self.font, fill=fill_color)
+            frame[y1:y2, x1:x2] = cv2.cvtColor(np.array(patch), cv2.COLOR_RGB2BGR)
+
+    def end_of_stream(self):
+        """视频结束：密度模式输出最后一个不完整间隔的统计"""
+        if self.mode == 'density':
+            report = self.zones.flush(self.clock())
+            if report:
+                self._density_report(report)
+
+    def stats(self):
+        return {'frames': self.frame_idx, 'faces_embedded': self.faces_embedded,
+                'person_detections': self.person_detections}
+
+class MultiStreamRunner:
+    """多路视频调度（不依赖 Qt）：所有路共享同一套模型，每轮从各路各取一帧，检测与 FaceNet 跨路整批执行
+
+    每轮的起始路轮转，max_batch 限制单轮帧数时各路机会均等。
+    policy 为 None 时各路按源类型和处理模式分别选择采集策略（见 core.capture.default_policy）。
+    step() 处理一轮，返回 [(路号, 帧), ...]；全部路结束后返回 None。
+    """
+    def __init__(self, sources, processors, policy=None, buffer_size=8, max_batch=None):
+        self.notify = threading.Event()
+        self.processors = processors
+        self.grabbers = [FrameGrabber(src, policy or default_policy(src, p.mode), buffer_size, notify=self.notify)
+                         for src, p in zip(sources, processors)]
+        self.max_batch = max_batch or len(processors)
+        self.start_at = 0
+        self.processed = [0] * len(processors)
+        self.batches = 0
+
+    def start(self):
+        for g in self.grabbers:
+            g.start()
+
+    def stop(self):
+        for g in self.grabbers:
+            g.stop()
+
+    def _collect(self, timeout=0.05):
+        """轮转起点从各路取一帧，都没有新帧时等待任一路来帧"""
+        n = len(self.grabbers)
+        while True:
+            self.notify.clear()
+            picked = []
+            for k in range(n):
+                i = (self.start_at + k) % n
+                item = self.grabbers[i].poll()
+                if item is not None:
+                    picked.append((i, item[1]))
+                    if len(picked) >= self.max_batch: break
+            if picked:
+                self.start_at = (self.start_at + 1) % n
+                return picked
+            if all(g.exhausted for g in self.grabbers):
+                return None
+            self.notify.wait(timeout)
+
+    def step(self):
+        picked = self._collect()
+        if picked is None:
+            return None
+        procs = self.processors
+
+        # 行人检测与人脸检测分别整批
+        person_idx = [k for k, (i, _) in enumerate(picked) if procs[i].wants_persons()]
+        face_idx = [k for k, (i, _) in enumerate(picked) if procs[i].mode == 'face']
+        persons = dict(zip(person_idx, detect_persons_batch([picked[k][1] for k in person_idx])))
+        faces = dict(zip(face_idx, detect_faces_batch([picked[k][1] for k in face_idx])))
+
+        # 各路跟踪后汇总需要提取特征的人脸，FaceNet 一次前向
+        crops = [procs[i].begin(frame, persons.get(k), faces.get(k)) for k, (i, frame) in enumerate(picked)]
+        sizes = [0 if c is None else len(c) for c in crops]
+        embs = embed_faces(np.concatenate([c for c in crops if c is not None and len(c)])) if sum(sizes) else None
+        off = 0
+        for (i, frame), n in zip(picked, sizes):
+            procs[i].finish(frame, embs[off:off + n] if n else None)
+            off += n
+            self.processed[i] += 1
+        self.batches += 1
+        return picked
+
+    def stats(self):
+        """各路采集/处理计数"""
+        streams = []
+        for g, p, n in zip(self.grabbers, self.processors, self.processed):
+            st = g.stats()
+            st.update(p.stats(), processed=n)
+            streams.append(st)
+        return {'streams': streams, 'processed': sum(self.processed), 'batches': self.batches}
@@ -2,34 +2,38 @@
 import cv2
 import numpy as np
 import torch
-from core.models import device, face_detection, resnet, yolo_face
-
-def compute_iou(boxA, boxB):
-    xA = max(boxA[0], boxB[0])
-    yA = max(boxA[1], boxB[1])
-    xB = min(boxA[2], boxB[2])
-    yB = min(boxA[3], boxB[3])
-    interArea = max(0, xB - xA) * max(0, yB - yA)
-    boxAArea = (boxA[2] - boxA[0]) * (boxA[3] - boxA[1])
-    boxBArea = (boxB[2] - boxB[0]) * (boxB[3] - boxB[1])
-    return interArea / float(boxAArea + boxBArea - interArea + 1e-5)
+from core.geometry import box_iou
+from core.models import device, get_face_detection, get_resnet, get_yolo_face
+from config import EMBED_BATCH_SIZE, FACE_CASCADE, FACE_CASCADE_MIN_SCORE, FACE_DEDUP_IOU, DETECT_MAX_SIDE
 
-def extract_embeddings(image):
-    """级联检测 + 特征提取"""
-    if isinstance(image, str):
-        img_array = np.fromfile(image, dtype=np.uint8)
-        img = cv2.imdecode(img_array, cv2.IMREAD_COLOR)
-        if img is None:
-            return []
-    else:
-        img = image.copy()
+FACE_SIZE = 160
+EMB_DIM = 512
+FACE_CASCADES = ('mp', 'yolo', 'fallback', 'both')
 
-    img_rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+def shrink_for_detection(img, max_side=DETECT_MAX_SIDE):
+    """长边超过 max_side 时缩小一份供检测用，返回 (图像, 缩放比例)；max_side 为 0 不缩放"""
     h, w = img.shape[:2]
+    if not max_side or max(h, w) <= max_side:
+        return img, 1.0
+    scale = max_side / max(h, w)
+    return cv2.resize(img, (round(w * scale), round(h * scale)), interpolation=cv2.INTER_LINEAR), scale
+
+def scale_boxes(boxes, scale, shape):
+    """检测图上的 (N,4) 框映射回原图坐标并裁剪到原图范围，返回 int 数组"""
+    boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+    if scale != 1.0:
+        boxes = boxes / scale
+    h, w = shape[:2]
+    boxes[:, 0::2] = boxes[:, 0::2].clip(0, w)
+    boxes[:, 1::2] = boxes[:, 1::2].clip(0, h)
+    return boxes.astype(int)
 
-    # MediaPipe 检测
-    mp_results = face_detection.process(img_rgb)
-    mp_bboxes = []
+def _mediapipe_faces(img, shape):
+    """MediaPipe 检测，返回 (框列表, 置信度列表)；相对坐标直接按原图尺寸 shape 换算"""
+    img_rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+    h, w = shape[:2]
+    mp_results = get_face_detection().process(img_rgb)
+    mp_bboxes, mp_scores = [], []
     if mp_results.detections:
         for detection in mp_results.detections:
             if detection.score[0] < 0.15: continue
@@ -39,43 +43,123 @@ def extract_embeddings(image):
             x2 = min(w, int((bbox.xmin + bbox.width) * w))
             y2 = min(h, int((bbox.ymin + bbox.height) * h))
             mp_bboxes.append((x1, y1, x2, y2))
+            mp_scores.append(detection.score[0])
+    return mp_bboxes, mp_scores
 
-    # YOLO 检测
-    yolo_results = yolo_face(img, conf=0.3, verbose=False)[0]
-    yolo_bboxes = [tuple(box.astype(int)) for box in yolo_results.boxes.xyxy.cpu().numpy()]
+def _yolo_faces(imgs, scales, shapes):
+    """YOLO 人脸检测，整批一次前向，框映射回原图后返回每帧的框列表"""
+    results = get_yolo_face()(list(imgs), conf=0.3, verbose=False)
+    return [[tuple(box) for box in scale_boxes(r.boxes.xyxy.cpu().numpy(), scale, shape)]
+            for r, scale, shape in zip(results, scales, shapes)]
 
-    # 融合去重
-    final_bboxes = list(mp_bboxes)
-    for y_box in yolo_bboxes:
-        is_duplicate = any(compute_iou(y_box, m_box) > 0.4 for m_box in mp_bboxes)
-        if not is_duplicate:
-            final_bboxes.append(y_box)
+def _fuse(mp_bboxes, yolo_bboxes):
+    """MediaPipe 结果为主，补充与之不重叠的 YOLO 框（IoU 矩阵一次算完）"""
+    if not mp_bboxes or not yolo_bboxes:
+        return list(mp_bboxes) + list(yolo_bboxes)
+    keep = box_iou(yolo_bboxes, mp_bboxes).max(axis=1) <= FACE_DEDUP_IOU
+    return list(mp_bboxes) + [b for b, k in zip(yolo_bboxes, keep) if k]
 
-    if not final_bboxes:
+def _needs_yolo(scores, policy):
+    if policy == 'both':
+        return True
+    # fallback：MediaPipe 没找到人脸，或最高置信度偏低时才补跑 YOLO
+    return not scores or max(scores) < FACE_CASCADE_MIN_SCORE
+
+def detect_faces(img, policy=FACE_CASCADE, max_side=DETECT_MAX_SIDE):
+    """按级联策略检测，返回融合去重后的人脸框（原图坐标）"""
+    return detect_faces_batch([img], policy, max_side)[0]
+
+def detect_faces_batch(imgs, policy=FACE_CASCADE, max_side=DETECT_MAX_SIDE):
+    """多帧人脸检测，返回每帧的人脸框列表（原图坐标）
+
+    policy: mp（仅 MediaPipe）/ yolo（仅 YOLO）/ fallback（MediaPipe 无结果或低置信度时补跑 YOLO）/ both（都跑再融合）
+    检测在长边不超过 max_side 的缩小图上进行，YOLO 对需要的帧整批一次前向（多路视频共享），MediaPipe 逐帧。
+    """
+    if policy not in FACE_CASCADES:
+        raise ValueError(f"未知人脸检测级联策略: {policy}")
+    if not imgs:
         return []
+    shapes = [img.shape for img in imgs]
+    small, scales = zip(*(shrink_for_detection(img, max_side) for img in imgs))
+    if policy == 'yolo':
+        return _yolo_faces(small, scales, shapes)
+    mp_all = [_mediapipe_faces(img, shape) for img, shape in zip(small, shapes)]
+    if policy == 'mp':
+        return [boxes for boxes, _ in mp_all]
+    todo = [k for k, (_, scores) in enumerate(mp_all) if _needs_yolo(scores, policy)]
+    yolo_all = dict(zip(todo, _yolo_faces([small[k] for k in todo], [scales[k] for k in todo],
+                                          [shapes[k] for k in todo]))) if todo else {}
+    return [_fuse(boxes, yolo_all.get(k, [])) for k, (boxes, _) in enumerate(mp_all)]
 
-    # 提取特征
-    embeddings = []
-    for bbox in final_bboxes:
-        x1, y1, x2, y2 = bbox
-        expand_w = int((x2 - x1) * 0.1)
-        expand_h = int((y2 - y1) * 0.1)
-        cx1 = max(0, x1 - expand_w)
-        cy1 = max(0, y1 - expand_h)
-        cx2 = min(w, x2 + expand_w)
-        cy2 = min(h, y2 + expand_h)
+def expand_box(bbox, w, h):
+    """人脸框四周外扩 10% 并裁剪到图像范围内"""
+    x1, y1, x2, y2 = bbox
+    expand_w = int((x2 - x1) * 0.1)
+    expand_h = int((y2 - y1) * 0.1)
+    return max(0, x1 - expand_w), max(0, y1 - expand_h), min(w, x2 + expand_w), min(h, y2 + expand_h)
+
+def crop_faces(img, bboxes):
+    """外扩 10% 裁剪并缩放到 160x160，写入预分配的 (N,160,160,3) 缓冲区"""
+    h, w = img.shape[:2]
+    batch = np.empty((len(bboxes), FACE_SIZE, FACE_SIZE, 3), dtype=np.uint8)
+    crop_boxes = []
+    for bbox in bboxes:
+        cx1, cy1, cx2, cy2 = expand_box(bbox, w, h)
 
         face_crop = img[cy1:cy2, cx1:cx2]
         if face_crop.size == 0: continue
 
-        face_crop = cv2.resize(face_crop, (160, 160))
-        face_tensor = torch.from_numpy(face_crop.transpose(2, 0, 1)).float() / 255.0
-        face_tensor = (face_tensor - 0.5) / 0.5
-        face_tensor = face_tensor.unsqueeze(0).to(device)
+        batch[len(crop_boxes)] = cv2.resize(face_crop, (FACE_SIZE, FACE_SIZE))
+        crop_boxes.append((cx1, cy1, cx2, cy2))
+    return batch[:len(crop_boxes)], crop_boxes
+
+def embed_faces(batch, batch_size=EMBED_BATCH_SIZE):
+    """整批人脸一次前向传播，超过 batch_size 时分块，返回 (N,512) float32"""
+    n = len(batch)
+    embs = np.empty((n, EMB_DIM), dtype=np.float32)
+    if n == 0:
+        return embs
+    resnet = get_resnet()
+    with torch.no_grad():
+        for s in range(0, n, batch_size):
+            # uint8 整块拷贝到设备后再做归一化，避免逐张转换
+            t = torch.from_numpy(batch[s:s + batch_size]).to(device)
+            t = t.permute(0, 3, 1, 2).float().div_(255.0).sub_(0.5).div_(0.5)
+            embs[s:s + batch_size] = resnet(t).cpu().numpy()
+    return embs
+
+def read_image(image):
+    """路径（支持中文）解码为 BGR 图像，ndarray 原样返回，解码失败返回 None"""
+    if isinstance(image, str):
+        img_array = np.fromfile(image, dtype=np.uint8)
+        return cv2.imdecode(img_array, cv2.IMREAD_COLOR)
+    return image
 
-        with torch.no_grad():
-            emb = resnet(face_tensor).cpu().numpy().flatten()
+def largest_face_crop(image):
+    """检测并返回面积最大的人脸裁剪 (160,160,3)，未检测到返回 None（建库/录入用）"""
+    img = read_image(image)
+    if img is None:
+        return None
+    bboxes = detect_faces(img)
+    if not bboxes:
+        return None
+    batch, crop_boxes = crop_faces(img, bboxes)
+    if not crop_boxes:
+        return None
+    areas = [(b[2] - b[0]) * (b[3] - b[1]) for b in crop_boxes]
+    return batch[int(np.argmax(areas))]
 
-        embeddings.append((emb, (cx1, cy1, cx2, cy2), 1.0))
+def extract_embeddings(image):
+    """级联检测 + 特征提取"""
+    img = read_image(image)
+    if img is None:
+        return []
+
+    final_bboxes = detect_faces(img)
+    if not final_bboxes:
+        return []
 
-    return embeddings
\ No newline at end of file
+    # 提取特征（整帧人脸合并为一个批次）
+    batch, crop_boxes = crop_faces(img, final_bboxes)
+    embs = embed_faces(batch)
+    return [(emb, box, 1.0) for emb, box in zip(embs, crop_boxes)]
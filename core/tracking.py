@@ -2,112 +2,349 @@
 import numpy as np
 from collections import OrderedDict
 import time
+from scipy.optimize import linear_sum_assignment
+from scipy.spatial import cKDTree
 from scipy.spatial import distance as dist
+from core.geometry import box_iou, side_of_lines, points_in_polygon
 
 class CentroidTracker:
-    def __init__(self, max_disappeared=30):
+    """质心跟踪：id / 质心 / 消失计数保存在预分配的 NumPy 数组中，匹配全部向量化
+
+    默认匹配规则与原实现一致（仅距离完全相等时的取舍可能不同）：按最近距离从小到大，
+    每条轨迹只认领自己最近的检测；
+    optimal=True 时改用匈牙利算法全局最优匹配；max_distance 为匹配距离门限（None 不限）。
+    """
+    def __init__(self, max_disappeared=30, max_distance=None, optimal=False, capacity=64):
         self.next_id = 0
-        self.objects = OrderedDict()
-        self.disappeared = OrderedDict()
         self.max_disappeared = max_disappeared
+        self.max_distance = max_distance
+        self.optimal = optimal
+        self.n = 0
+        self.ids = np.empty(capacity, dtype=np.int64)
+        self.centroids = np.empty((capacity, 2), dtype=np.int64)
+        self.disappeared = np.empty(capacity, dtype=np.int32)
+
+    @property
+    def objects(self):
+        return dict(zip(self.ids[:self.n].tolist(), self.centroids[:self.n].copy()))
+
+    def _register(self, cents):
+        k = len(cents)
+        if self.n + k > len(self.ids):
+            cap = max(2 * len(self.ids), self.n + k)
+            for name in ('ids', 'centroids', 'disappeared'):
+                old = getattr(self, name)
+                new = np.empty((cap,) + old.shape[1:], dtype=old.dtype)
+                new[:self.n] = old[:self.n]
+                setattr(self, name, new)
+        self.ids[self.n:self.n + k] = np.arange(self.next_id, self.next_id + k)
+        self.centroids[self.n:self.n + k] = cents
+        self.disappeared[self.n:self.n + k] = 0
+        self.n += k
+        self.next_id += k
+
+    def _keep(self, mask):
+        k = int(mask.sum())
+        if k == self.n: return
+        self.ids[:k] = self.ids[:self.n][mask]
+        self.centroids[:k] = self.centroids[:self.n][mask]
+        self.disappeared[:k] = self.disappeared[:self.n][mask]
+        self.n = k
 
     def register(self, centroid):
-        self.objects[self.next_id] = centroid
-        self.disappeared[self.next_id] = 0
-        self.next_id += 1
+        self._register(np.asarray(centroid).reshape(1, 2))
 
     def deregister(self, object_id):
-        if object_id in self.objects:
-            del self.objects[object_id]
-            del self.disappeared[object_id]
+        self._keep(self.ids[:self.n] != object_id)
 
-    def update(self, rects):
+    def _match(self, tracks, inputs):
+        """返回匹配上的 (轨迹行, 检测列) 下标数组"""
+        gate = np.inf if self.max_distance is None else self.max_distance
+        if self.optimal:
+            D = dist.cdist(tracks, inputs)
+            rows, cols = linear_sum_assignment(D)
+            ok = D[rows, cols] <= gate
+            return rows[ok], cols[ok]
+        # 贪心：每条轨迹只认领自己最近的检测（KD 树查询，无需完整距离矩阵）
+        row_min, row_arg = cKDTree(inputs).query(tracks, distance_upper_bound=gate)
+        order = np.argsort(row_min, kind='stable')
+        order = order[np.isfinite(row_min[order])]
+        # 同一检测被多条轨迹认领时，距离最近（排序最靠前）的那条胜出
+        cols, first = np.unique(row_arg[order], return_index=True)
+        return order[first], cols
+
+    def update(self, rects, step=1):
+        """step：距上次 update 经过的帧数（隔帧检测时 > 1），消失计数按帧累计，轨迹过期时间与检测间隔无关"""
+        n = self.n
+        rects = np.asarray(rects).reshape(-1, 4)
         if len(rects) == 0:
-            for tid in list(self.disappeared.keys()):
-                self.disappeared[tid] += 1
-                if self.disappeared[tid] > self.max_disappeared: self.deregister(tid)
+            self.disappeared[:n] += step
+            self._keep(self.disappeared[:n] <= self.max_disappeared)
+            return self.objects
+        input_centroids = ((rects[:, :2] + rects[:, 2:4]) / 2).astype(np.int64)
+        if n == 0:
+            self._register(input_centroids)
             return self.objects
-        input_centroids = np.array([(int((r[0]+r[2])/2), int((r[1]+r[3])/2)) for r in rects])
-        if len(self.objects) == 0:
-            for i in range(len(input_centroids)): self.register(input_centroids[i])
-        else:
-            oids = list(self.objects.keys()); ocs = list(self.objects.values())
-            D = dist.cdist(np.array(ocs), input_centroids)
-            rows = D.min(axis=1).argsort(); cols = D.argmin(axis=1)[D.min(axis=1).argsort()]
-            ur, uc = set(), set()
-            for (r, c) in zip(rows, cols):
-                if r in ur or c in uc: continue
-                self.objects[oids[r]] = input_centroids[c]; self.disappeared[oids[r]] = 0
-                ur.add(r); uc.add(c)
-            for r in set(range(D.shape[0])) - ur:
-                self.disappeared[oids[r]] += 1
-                if self.disappeared[oids[r]] > self.max_disappeared: self.deregister(oids[r])
-            for c in set(range(D.shape[1])) - uc: self.register(input_centroids[c])
+
+        rows, cols = self._match(self.centroids[:n], input_centroids)
+
+        self.centroids[rows] = input_centroids[cols]
+        self.disappeared[rows] = 0
+        lost = np.ones(n, dtype=bool)
+        lost[rows] = False
+        self.disappeared[:n][lost] += step
+        new = np.ones(len(input_centroids), dtype=bool)
+        new[cols] = False
+        self._keep(self.disappeared[:n] <= self.max_disappeared)
+        self._register(input_centroids[new])
         return self.objects
 
+class IoUTracker:
+    """人脸框 IoU 跟踪：tracks[tid] 为 dict，调用方可在其中缓存身份等信息"""
+    def __init__(self, iou_thresh=0.3, max_missed=5):
+        self.next_id = 0
+        self.tracks = OrderedDict()
+        self.iou_thresh = iou_thresh
+        self.max_missed = max_missed
+
+    def update(self, boxes):
+        """返回与 boxes 对齐的轨迹 id 列表"""
+        tids = list(self.tracks.keys())
+        assigned = [None] * len(boxes)
+        if tids and len(boxes):
+            iou = box_iou([self.tracks[t]['bbox'] for t in tids], boxes)
+            rows, cols = np.nonzero(iou >= self.iou_thresh)
+            used = set()
+            for k in np.argsort(-iou[rows, cols], kind='stable'):
+                r, c = rows[k], cols[k]
+                if r in used or assigned[c] is not None: continue
+                used.add(r)
+                assigned[c] = tids[r]
+        for tid in tids:
+            if tid not in assigned:
+                self.tracks[tid]['missed'] += 1
+                if self.tracks[tid]['missed'] > self.max_missed:
+                    del self.tracks[tid]
+        for c, box in enumerate(boxes):
+            if assigned[c] is None:
+                assigned[c] = self.next_id
+                self.tracks[self.next_id] = {}
+                self.next_id += 1
+            self.tracks[assigned[c]].update(bbox=tuple(box), missed=0)
+        return assigned
+
+class MotionPredictor:
+    """隔帧检测时的轨迹外推：两次检测之间按匀速模型预测质心，并按运动快慢和人数自适应检测间隔"""
+    def __init__(self, max_stride=4, max_step=12.0, crowd=30):
+        self.max_stride = max_stride   # 最多隔几帧检测一次
+        self.max_step = max_step       # 两次检测间允许的最大位移（像素）
+        self.crowd = crowd             # 人数超过该值时间隔减半
+        self.pos, self.vel, self.seen = {}, {}, {}
+        self.stride = 1
+
+    def observe(self, objects, frame_idx):
+        """检测帧：用跟踪器输出更新位置和速度（像素/帧），并重新计算检测间隔"""
+        for tid in [t for t in self.pos if t not in objects]:
+            del self.pos[tid], self.vel[tid], self.seen[tid]
+        for tid, c in objects.items():
+            c = np.asarray(c, dtype=np.float32)
+            if tid in self.pos and frame_idx > self.seen[tid]:
+                v = (c - self.pos[tid]) / (frame_idx - self.seen[tid])
+                self.vel[tid] = 0.5 * v + 0.5 * self.vel[tid]
+            elif tid not in self.pos:
+                self.vel[tid] = np.zeros(2, dtype=np.float32)
+            self.pos[tid], self.seen[tid] = c, frame_idx
+        speed = max((float(np.hypot(*v)) for v in self.vel.values()), default=0.0)
+        stride = int(self.max_step / speed) if speed > 1e-3 else self.max_stride
+        if len(objects) > self.crowd:
+            stride //= 2
+        self.stride = max(1, min(self.max_stride, stride))
+        return self.stride
+
+    def predict(self, frame_idx):
+        """非检测帧：返回 {id: 预测质心}"""
+        return {tid: (self.pos[tid] + self.vel[tid] * (frame_idx - self.seen[tid])).astype(int)
+                for tid in self.pos}
+
 class PedestrianFlowManager:
-    def __init__(self, line_pts=None, interval=60):
-        self.line_pts = line_pts if line_pts else [(100, 400), (500, 400)]
-        self.in_side_sign = 1 
+    """越线计数：支持多条计数线和多边形闸口，整帧所有轨迹 x 所有闸口一次向量化判定
+
+    计数线：越到 in_sign 一侧为 IN；多边形：进入多边形为 IN、离开为 OUT。
+    去抖规则：同一轨迹 1 秒内不重复计数；OUT 必须在该轨迹 IN 之后 3 秒以上。
+    每个闸口单独计数；总数 in_total / out_total 按轨迹去重：同一轨迹与上次计入总数的方向相同、
+    但经过的是另一个闸口时不再计入（单闸口时与闸口计数相同）。
+    轨迹状态按槽位存放，超过 state_ttl 秒未出现的轨迹释放槽位供新轨迹复用。
+    """
+    def __init__(self, line_pts=None, interval=60, state_ttl=10.0):
+        self.gates = []
         self.interval, self.start_time = interval, time.time()
+        self.state_ttl = state_ttl
         self.in_total = 0
         self.out_total = 0
-        self.track_history = {}          
-        self.last_in_time = {}           
-        self.crossing_time = {}          
+        self.add_line(*(line_pts if line_pts else [(100, 400), (500, 400)]))
+
+    # ---- 闸口配置 ----
+    def add_line(self, p1, p2, in_sign=1, name=None):
+        self.gates.append({'kind': 'line', 'pts': [tuple(p1), tuple(p2)], 'sign': in_sign,
+                           'name': name or f"L{len(self.gates) + 1}", 'in': 0, 'out': 0})
+        self._compile()
+
+    def add_polygon(self, pts, name=None):
+        self.gates.append({'kind': 'polygon', 'pts': [tuple(p) for p in pts], 'sign': 1,
+                           'name': name or f"P{len(self.gates) + 1}", 'in': 0, 'out': 0})
+        self._compile()
+
+    def clear_gates(self):
+        self.gates = []
+        self._compile()
+
+    def _first_line(self):
+        return next((g for g in self.gates if g['kind'] == 'line'), None)
+
+    @property
+    def line_pts(self):
+        g = self._first_line()
+        return g['pts'] if g else None
+
+    @property
+    def in_side_sign(self):
+        g = self._first_line()
+        return g['sign'] if g else 1
+
+    @in_side_sign.setter
+    def in_side_sign(self, sign):
+        g = self._first_line()
+        if g: g['sign'] = sign
+        self._compile()
 
     def set_line(self, p1, p2):
-        self.line_pts = [p1, p2]
-        self.track_history.clear()
-        self.last_in_time.clear()
-        self.crossing_time.clear()
+        g = self._first_line()
+        if g is None:
+            self.gates.insert(0, {'kind': 'line', 'pts': None, 'sign': 1, 'name': 'L1', 'in': 0, 'out': 0})
+            g = self.gates[0]
+        g['pts'] = [tuple(p1), tuple(p2)]
+        self._compile()
 
     def set_in_side(self, click_pos):
-        (x1, y1), (x2, y2) = self.line_pts
-        self.in_side_sign = 1 if (x2 - x1) * (click_pos[1] - y1) - (y2 - y1) * (click_pos[0] - x1) > 0 else -1
-
-    def check_crossing(self, tid, pos):
-        now = time.time()
-        if tid in self.crossing_time and (now - self.crossing_time[tid] < 1.0):
-            return None
-        (x1, y1), (x2, y2) = self.line_pts
-        side = (x2 - x1) * (pos[1] - y1) - (y2 - y1) * (pos[0] - x1)
-        curr_sign = 1 if side > 0 else -1
-        if tid not in self.track_history:
-            self.track_history[tid] = curr_sign
-            return None
-        prev_sign = self.track_history[tid]
-        if prev_sign == curr_sign:
-            self.track_history[tid] = curr_sign
-            return None
-        direction = "IN" if curr_sign == self.in_side_sign else "OUT"
-        if direction == "OUT":
-            if tid not in self.last_in_time:
-                self.track_history[tid] = curr_sign
-                return None
-            if now - self.last_in_time[tid] < 3.0:
-                self.track_history[tid] = curr_sign
-                return None
-        if direction == "IN":
-            self.in_total += 1
-            self.last_in_time[tid] = now  
-        else:  
-            self.out_total += 1
-        self.crossing_time[tid] = now
-        self.track_history[tid] = curr_sign
-        return direction
+        side = side_of_lines([self.line_pts], [click_pos])[0, 0]
+        self.in_side_sign = 1 if side > 0 else -1
+
+    def _compile(self):
+        """闸口变化后重建向量化所需的数组，并清空轨迹状态"""
+        self.line_idx = [i for i, g in enumerate(self.gates) if g['kind'] == 'line']
+        self.poly_idx = [i for i, g in enumerate(self.gates) if g['kind'] == 'polygon']
+        self.line_arr = np.array([self.gates[i]['pts'] for i in self.line_idx], dtype=np.float64).reshape(-1, 2, 2)
+        self.in_signs = np.array([g['sign'] for g in self.gates], dtype=np.int8)
+        # 按槽位索引的轨迹状态，形状 (闸口数, 容量) / (容量,)
+        self.slot, self.free = {}, []
+        self._alloc(len(self.gates), 0)
+        self._grow(64)
+
+    def _alloc(self, n_gates, cap):
+        self.prev_sign = np.zeros((n_gates, cap), dtype=np.int8)          # 0 表示尚无历史
+        self.crossing_time = np.full((n_gates, cap), -np.inf)
+        self.last_in_time = np.full((n_gates, cap), -np.inf)
+        self.last_seen = np.full(cap, -np.inf)
+        self.last_dir = np.zeros(cap, dtype=np.int8)                     # 上次计入总数的方向：1 IN，-1 OUT
+        self.last_gate = np.full(cap, -1, dtype=np.int32)
+
+    def _grow(self, cap):
+        names = ('prev_sign', 'crossing_time', 'last_in_time', 'last_seen', 'last_dir', 'last_gate')
+        old = [getattr(self, k) for k in names]
+        n = len(self.last_seen)
+        self._alloc(len(self.gates), cap)
+        for k, a in zip(names, old):
+            getattr(self, k)[..., :n] = a
+        self.free.extend(range(cap - 1, n - 1, -1))
+
+    def _slots(self, tids, now):
+        """轨迹 id -> 槽位；新轨迹优先复用空闲槽位，不够时先回收长时间未出现的轨迹"""
+        cur = dict.fromkeys(tids.tolist())
+        new = [t for t in cur if t not in self.slot]
+        if len(new) > len(self.free):
+            # 本帧仍在的轨迹即使超时也不回收
+            stale = [t for t, k in self.slot.items() if t not in cur and now - self.last_seen[k] > self.state_ttl]
+            self.free.extend(self.slot.pop(t) for t in stale)
+        if len(new) > len(self.free):
+            cap = len(self.last_seen)
+            self._grow(max(2 * cap, cap + len(new) - len(self.free)))
+        fresh = [self.free.pop() for _ in new]
+        self.slot.update(zip(new, fresh))
+        self.prev_sign[:, fresh] = 0
+        self.crossing_time[:, fresh] = -np.inf
+        self.last_in_time[:, fresh] = -np.inf
+        self.last_dir[fresh], self.last_gate[fresh] = 0, -1
+        slots = np.array([self.slot[t] for t in tids.tolist()], dtype=np.int64)
+        self.last_seen[slots] = now
+        return slots
+
+    def _signs(self, pts):
+        """(闸口数, N) 的 ±1，与闸口顺序一致"""
+        signs = np.empty((len(self.gates), len(pts)), dtype=np.int8)
+        if self.line_idx:
+            signs[self.line_idx] = np.where(side_of_lines(self.line_arr, pts) > 0, 1, -1)
+        for i in self.poly_idx:
+            signs[i] = np.where(points_in_polygon(self.gates[i]['pts'], pts), 1, -1)
+        return signs
+
+    # ---- 判定 ----
+    def update(self, tids, centroids, now=None):
+        """整帧批量判定，整帧共用一个时间戳；返回 [(闸口下标, 轨迹id, 'IN'/'OUT'), ...]"""
+        now = time.time() if now is None else now
+        tids = np.asarray(tids, dtype=np.int64).reshape(-1)
+        if not len(tids) or not self.gates:
+            return []
+        slots = self._slots(tids, now)
+        curr = self._signs(np.asarray(centroids).reshape(-1, 2))
+        prev = self.prev_sign[:, slots]
+        last_in = self.last_in_time[:, slots]
+
+        active = now - self.crossing_time[:, slots] >= 1.0          # 1 秒内刚计过数的跳过，状态也不更新
+        flip = active & (prev != 0) & (prev != curr)
+        is_in = curr == self.in_signs[:, None]
+        out_ok = (last_in > -np.inf) & (now - last_in >= 3.0)       # OUT 需先有 IN 且间隔 3 秒
+        in_ev = flip & is_in
+        out_ev = flip & ~is_in & out_ok
+        event = in_ev | out_ev
+
+        self.prev_sign[:, slots] = np.where(active, curr, prev)
+        self.last_in_time[:, slots] = np.where(in_ev, now, last_in)
+        self.crossing_time[:, slots] = np.where(event, now, self.crossing_time[:, slots])
+
+        for g, a, b in zip(self.gates, in_ev.sum(axis=1), out_ev.sum(axis=1)):
+            g['in'] += int(a)
+            g['out'] += int(b)
+        # 事件稀疏，逐个按轨迹去重后计入总数
+        events = []
+        for g, t in zip(*np.nonzero(event)):
+            k, d = slots[t], 1 if in_ev[g, t] else -1
+            if not (self.last_dir[k] == d and self.last_gate[k] != g):
+                if d > 0: self.in_total += 1
+                else: self.out_total += 1
+            self.last_dir[k], self.last_gate[k] = d, g
+            events.append((int(g), int(tids[t]), "IN" if d > 0 else "OUT"))
+        return events
+
+    def check_crossing(self, tid, pos, now=None):
+        """单条轨迹判定（兼容旧接口），返回第一个闸口事件的方向或 None"""
+        events = self.update([tid], [pos], now)
+        return events[0][2] if events else None
 
     def get_status(self):
         elapsed = time.time() - self.start_time
         reset = elapsed >= self.interval
         data = {
+            # 总数按轨迹去重，各闸口计数见 gates
             "in": self.in_total,
             "out": self.out_total,
+            "gates": [{'name': g['name'], 'in': g['in'], 'out': g['out']} for g in self.gates],
             "reset": reset,
             "elapsed": int(elapsed)
         }
         if reset:
             self.in_total = 0
             self.out_total = 0
+            for g in self.gates:
+                g['in'] = g['out'] = 0
             self.start_time = time.time()
         return data
\ No newline at end of file
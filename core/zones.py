@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+import time
+import numpy as np
+from core.geometry import points_in_polygon
+
+class ZoneCounter:
+    """人群密度多区域统计：每个区域一个多边形 + 独立阈值，按间隔内最大人数告警
+
+    每帧对全部人员中心点逐区域做一次向量化的点在多边形内判定，得到 (区域数, 人数) 的归属矩阵，
+    不需要按帧尺寸栅格化，内存与分辨率无关。
+    """
+
+    def __init__(self, zones=None, alert_interval=5):
+        """zones: [{'name', 'polygon': [(x, y), ...], 'threshold'}, ...]；为空时整幅画面视为一个区域"""
+        zones = zones or [{'name': 'ALL', 'polygon': None, 'threshold': 10}]
+        self.zones = [{'name': z.get('name') or f"Z{i + 1}", 'polygon': z.get('polygon'),
+                       'threshold': z.get('threshold', 10)} for i, z in enumerate(zones)]
+        self.thresholds = np.array([z['threshold'] for z in self.zones])
+        self.alert_interval = alert_interval
+        self.interval_start = None  # 首帧开始计时
+        self.max_counts = np.zeros(len(self.zones), dtype=np.int64)
+        self.frames = 0  # 当前间隔内已记录的帧数
+
+    @classmethod
+    def from_config(cls, config):
+        """兼容旧的单矩形 ROI 配置 {'roi': (x1, y1, x2, y2), 'threshold', 'alert_interval'}"""
+        zones = config.get('zones')
+        if zones is None:
+            roi = config.get('roi')
+            polygon = [(roi[0], roi[1]), (roi[2], roi[1]), (roi[2], roi[3]), (roi[0], roi[3])] if roi else None
+            zones = [{'name': 'ROI' if roi else 'ALL', 'polygon': polygon, 'threshold': config.get('threshold', 10)}]
+        return cls(zones, config.get('alert_interval', 5))
+
+    def count(self, centers, shape):
+        """centers (N,2)：返回 (各区域人数 (Z,), 落在任一区域内的布尔掩码 (N,))；中心点先截到画面 shape 内"""
+        centers = np.asarray(centers, dtype=np.int64).reshape(-1, 2)
+        h, w = shape[:2]
+        pts = np.stack([np.clip(centers[:, 0], 0, w - 1), np.clip(centers[:, 1], 0, h - 1)], axis=1)
+        hits = np.ones((len(self.zones), len(pts)), dtype=bool)
+        for i, z in enumerate(self.zones):
+            if z['polygon'] is not None:
+                hits[i] = points_in_polygon(z['polygon'], pts)
+        return hits.sum(axis=1), hits.any(axis=0)
+
+    def tick(self, counts, now=None):
+        """记录本帧人数；间隔到期时返回 [(区域, 间隔内最大人数, 是否超阈值), ...] 并重新计时，否则返回 None"""
+        now = time.time() if now is None else now
+        if self.interval_start is None:
+            self.interval_start = now
+        np.maximum(self.max_counts, counts, out=self.max_counts)
+        self.frames += 1
+        if now - self.interval_start < self.alert_interval:
+            return None
+        return self._report(now)
+
+    def flush(self, now=None):
+        """视频结束时结算最后一个不满 alert_interval 的间隔；该间隔没有帧时返回 None"""
+        if not self.frames:
+            return None
+        return self._report(time.time() if now is None else now)
+
+    def _report(self, now):
+        report = [(z, int(m), bool(m > z['threshold'])) for z, m in zip(self.zones, self.max_counts)]
+        self.interval_start = now
+        self.max_counts[:] = 0
+        self.frames = 0
+        return report
@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+import os
+import csv
+import sqlite3
+import threading
+from config import EVENTS_DB_PATH, LOG_PATH
+
+COLUMNS = ('ts', 'source', 'name', 'status', 'detail')
+HEADER = ['时间', '来源', '姓名', '状态', '详情']
+
+class EventStore:
+    """访问事件库（SQLite）：时间/来源/姓名/状态均建索引，统计走索引范围查询
+
+    CSV 日志仍照常追加，作为可直接打开的派生视图；首次使用时把已有 CSV 导入库中。
+    每个线程使用各自的连接。
+    """
+    def __init__(self, path=EVENTS_DB_PATH, csv_path=LOG_PATH):
+        self.path = path
+        self.local = threading.local()
+        conn = self.conn()
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS events (
+                id INTEGER PRIMARY KEY, ts TEXT NOT NULL, source TEXT, name TEXT, status TEXT, detail TEXT);
+            CREATE INDEX IF NOT EXISTS idx_events_ts ON events(ts);
+            CREATE INDEX IF NOT EXISTS idx_events_source ON events(source, ts);
+            CREATE INDEX IF NOT EXISTS idx_events_name ON events(name, ts);
+            CREATE INDEX IF NOT EXISTS idx_events_status ON events(status, ts);
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+        """)
+        if conn.execute("SELECT 1 FROM meta WHERE key = 'csv_imported'").fetchone() is None:
+            self.import_csv(csv_path)
+
+    def conn(self):
+        c = getattr(self.local, 'conn', None)
+        if c is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            c = sqlite3.connect(self.path, timeout=10)
+            c.execute("PRAGMA journal_mode=WAL")
+            c.execute("PRAGMA synchronous=NORMAL")
+            self.local.conn = c
+        return c
+
+    def import_csv(self, csv_path, chunk=5000):
+        """一次性导入旧 CSV 日志"""
+        conn = self.conn()
+        n = 0
+        if os.path.exists(csv_path):
+            print("🔄 正在将访问日志导入事件库...")
+            with open(csv_path, newline='', encoding='utf-8-sig') as f:
+                reader = csv.reader(f)
+                next(reader, None)
+                rows = []
+                for row in reader:
+                    if len(row) < 5: continue
+                    rows.append(row[:5])
+                    if len(rows) >= chunk:
+                        self._insert(conn, rows)
+                        n += len(rows)
+                        rows = []
+                self._insert(conn, rows)
+                n += len(rows)
+        conn.execute("INSERT OR REPLACE INTO meta VALUES ('csv_imported', ?)", (str(n),))
+        conn.commit()
+        if n:
+            print(f"✅ 导入完成：{n} 条记录")
+
+    def _insert(self, conn, rows):
+        conn.executemany("INSERT INTO events (ts, source, name, status, detail) VALUES (?, ?, ?, ?, ?)", rows)
+
+    def insert_many(self, rows):
+        """rows: [[时间, 来源, 姓名, 状态, 详情], ...]，返回第一条的 id（单写线程下 id 连续）"""
+        conn = self.conn()
+        self._insert(conn, rows)
+        conn.commit()
+        return conn.execute("SELECT MAX(id) FROM events").fetchone()[0] - len(rows) + 1
+
+    def rows_after(self, last_id, batch=5000):
+        """按 id 顺序逐批返回 id > last_id 的 (id, 事件行)"""
+        cur = self.conn().execute(
+            "SELECT id, ts, source, name, status, detail FROM events WHERE id > ? ORDER BY id", (last_id,))
+        while True:
+            chunk = cur.fetchmany(batch)
+            if not chunk: break
+            for r in chunk:
+                yield r[0], r[1:]
+
+    @staticmethod
+    def _range(start=None, end=None):
+        """[start, end) 时间范围条件，start/end 为 date/datetime/字符串"""
+        where, args = [], []
+        if start is not None:
+            where.append("ts >= ?")
+            args.append(str(start))
+        if end is not None:
+            where.append("ts < ?")
+            args.append(str(end))
+        return (" WHERE " + " AND ".join(where)) if where else "", args
+
+    def count(self, start=None, end=None):
+        where, args = self._range(start, end)
+        return self.conn().execute("SELECT COUNT(*) FROM events" + where, args).fetchone()[0]
+
+    def time_span(self):
+        """最早、最晚事件时间（走时间索引），无事件返回 (None, None)"""
+        return self.conn().execute("SELECT MIN(ts), MAX(ts) FROM events").fetchone()
+
+    def count_by(self, column, start=None, end=None, limit=None):
+        """按列分组计数（降序），返回 {值: 次数}"""
+        if column not in COLUMNS:
+            raise ValueError(f"未知列: {column}")
+        where, args = self._range(start, end)
+        sql = f"SELECT {column}, COUNT(*) AS n FROM events{where} GROUP BY {column} ORDER BY n DESC"
+        if limit:
+            sql += f" LIMIT {int(limit)}"
+        return dict(self.conn().execute(sql, args).fetchall())
+
+    def rows(self, start=None, end=None, batch=5000):
+        """按时间顺序逐批返回事件行"""
+        where, args = self._range(start, end)
+        cur = self.conn().execute(f"SELECT ts, source, name, status, detail FROM events{where} ORDER BY ts, id", args)
+        while True:
+            chunk = cur.fetchmany(batch)
+            if not chunk: break
+            yield from chunk
+
+    def export_csv(self, path, start=None, end=None):
+        """从事件库导出 CSV（与访问日志格式一致）"""
+        with open(path, 'w', newline='', encoding='utf-8-sig') as f:
+            writer = csv.writer(f)
+            writer.writerow(HEADER)
+            writer.writerows(self.rows(start, end))
+
+_store = None
+_store_lock = threading.Lock()
+
+def get_event_store():
+    """进程内共享的事件库（首次使用时建表并导入旧日志）"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = EventStore()
+        return _store
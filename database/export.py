@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import NamedStyle, PatternFill
+from database.events import get_event_store, HEADER
+
+def export_excel(path, start=None, end=None, progress=None, chunk=5000):
+    """从事件库流式导出 Excel：只写模式逐行写入，黑名单行使用预先注册的样式，内存占用与日志规模无关
+
+    start/end 为 [start, end) 时间范围；progress(已写行数, 总行数) 每 chunk 行回调一次，返回 False 时中止。
+    返回导出行数，中止返回 None。
+    """
+    store = get_event_store()
+    total = store.count(start, end)
+
+    wb = Workbook(write_only=True)
+    black = NamedStyle(name='blacklist', fill=PatternFill(start_color="FFCCCC", end_color="FFCCCC", fill_type="solid"))
+    wb.add_named_style(black)
+    ws = wb.create_sheet('Log')
+    ws.append(HEADER)
+
+    n = 0
+    for row in store.rows(start, end, batch=chunk):
+        if u"黑名单" in str(row[3]):
+            cells = []
+            for v in row:
+                c = WriteOnlyCell(ws, value=v)
+                c.style = 'blacklist'
+                cells.append(c)
+            ws.append(cells)
+        else:
+            ws.append(row)
+        n += 1
+        if progress and n % chunk == 0 and progress(n, total) is False:
+            ws.close()
+            return None
+    wb.save(path)
+    if progress:
+        progress(n, total)
+    return n
@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+import os
+import json
+import glob
+import numpy as np
+from collections.abc import Mapping
+from config import GALLERY_PATH
+
+class FaceGallery(Mapping):
+    """人脸库：(N,512) float32 特征矩阵（.npy，只读内存映射）+ id/类别索引
+
+    按 dict 方式访问 gallery[pid] 得到矩阵中对应行的视图，不拷贝。
+    """
+    def __init__(self, ids=(), labels=(), matrix=None):
+        self.ids = list(ids)
+        self.labels = list(labels)
+        self.matrix = matrix if matrix is not None else np.empty((0, 512), dtype=np.float32)
+        self._rows = {p: i for i, p in enumerate(self.ids)}
+
+    def __getitem__(self, pid):
+        return self.matrix[self._rows[pid]]
+
+    def __iter__(self):
+        return iter(self.ids)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, pid):
+        return pid in self._rows
+
+    def row(self, pid):
+        return self._rows.get(pid)
+
+    @property
+    def blacklist(self):
+        return {p for p, l in zip(self.ids, self.labels) if l == 'black'}
+
+    @property
+    def whitelist(self):
+        return {p for p, l in zip(self.ids, self.labels) if l == 'white'}
+
+    @classmethod
+    def from_dict(cls, face_db, blacklist, whitelist):
+        ids = [p for p in face_db if p in blacklist or p in whitelist]
+        labels = ['black' if p in blacklist else 'white' for p in ids]
+        if ids:
+            matrix = np.stack([np.asarray(face_db[p], dtype=np.float32) for p in ids])
+            # 存储前归一化，比对时可直接使用内存映射矩阵
+            matrix /= np.linalg.norm(matrix, axis=1, keepdims=True) + 1e-8
+        else:
+            matrix = None
+        return cls(ids, labels, matrix)
+
+    def save(self, path=GALLERY_PATH):
+        """原子写入：先写新一代 .npy，再用 os.replace 切换索引文件，最后清理旧矩阵"""
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        base = os.path.splitext(path)[0]
+        gen = 0
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                gen = json.load(f).get('generation', 0) + 1
+        npy_path = f"{base}.{gen}.npy"
+        with open(npy_path, 'wb') as f:
+            np.save(f, np.ascontiguousarray(self.matrix, dtype=np.float32))
+            f.flush()
+            os.fsync(f.fileno())
+        tmp = path + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump({'generation': gen, 'matrix': os.path.basename(npy_path),
+                       'ids': self.ids, 'labels': self.labels}, f, ensure_ascii=False)
+        os.replace(tmp, path)
+        for old in glob.glob(glob.escape(base) + '.*.npy'):
+            if old != npy_path:
+                try:
+                    os.remove(old)
+                except OSError:
+                    pass  # Windows 下仍被内存映射的旧文件留到下次清理
+        return npy_path
+
+    @classmethod
+    def load(cls, path=GALLERY_PATH):
+        with open(path, 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        npy_path = os.path.join(os.path.dirname(path), meta['matrix'])
+        matrix = np.load(npy_path, mmap_mode='r') if meta['ids'] else None
+        return cls(meta['ids'], meta['labels'], matrix)
@@ -1,35 +1,157 @@
 # -*- coding: utf-8 -*-
 import os
 import csv
+import time
+import queue
+import atexit
+import threading
 from datetime import datetime
-from config import LOG_PATH
+from database.events import get_event_store, HEADER
+from database.stats import get_aggregator, checkpoint_stats
+from config import LOG_PATH, LOG_FLUSH_INTERVAL, LOG_BATCH_SIZE, LOG_MAX_BYTES, LOG_ROTATE_DAILY
+
+class LogWriter(threading.Thread):
+    """后台日志写入线程：事件入队即返回，按条数/时间批量写入事件库并追加到 CSV
+
+    - 攒够 batch_size 条或距第一条未写入事件超过 flush_interval 秒时写入
+    - 文件超过 max_bytes（0 不限）或跨天（rotate_daily）时轮转为 access_log.<日期>[-n].csv
+    """
+    def __init__(self, path=LOG_PATH, flush_interval=LOG_FLUSH_INTERVAL, batch_size=LOG_BATCH_SIZE,
+                 max_bytes=LOG_MAX_BYTES, rotate_daily=LOG_ROTATE_DAILY):
+        super().__init__(daemon=True)
+        self.path = path
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.max_bytes = max_bytes
+        self.rotate_daily = rotate_daily
+        self.q = queue.Queue()
+        self.f = None
+        self.day = None
+        self.written = self.batches = self.rotations = self.max_depth = 0
+
+    def write(self, row):
+        """非阻塞入队"""
+        self.q.put(row)
+        depth = self.q.qsize()
+        if depth > self.max_depth:
+            self.max_depth = depth
+
+    def flush(self, timeout=5):
+        """等待此前入队的事件全部落盘"""
+        if not self.is_alive():
+            return False
+        done = threading.Event()
+        self.q.put(done)
+        return done.wait(timeout)
+
+    def close(self, timeout=5):
+        if self.is_alive():
+            self.q.put(None)
+            self.join(timeout)
+
+    def run(self):
+        batch, deadline = [], None
+        while True:
+            timeout = None if not batch else max(0.0, deadline - time.monotonic())
+            try:
+                item = self.q.get(timeout=timeout)
+            except queue.Empty:
+                item = ()
+            if isinstance(item, list):
+                if not batch:
+                    deadline = time.monotonic() + self.flush_interval
+                batch.append(item)
+                if len(batch) < self.batch_size:
+                    continue
+            if batch:
+                self._write_batch(batch)
+                batch = []
+            if isinstance(item, threading.Event):
+                item.set()
+            elif item is None:
+                if self.f: self.f.close()
+                try:
+                    checkpoint_stats()
+                except Exception as e:
+                    print(f"⚠️ 统计检查点保存失败: {e}")
+                return
+
+    def _write_batch(self, batch):
+        try:
+            first_id = get_event_store().insert_many(batch)
+            aggregator = get_aggregator()
+            aggregator.add(batch, first_id)
+            aggregator.maybe_checkpoint()
+        except Exception as e:
+            print(f"⚠️ 事件库写入失败: {e}")
+        try:
+            self._rotate_if_needed()
+            if self.f is None:
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                is_new = not os.path.exists(self.path)
+                self.f = open(self.path, 'a', newline='', encoding='utf-8-sig')
+                self.writer = csv.writer(self.f)
+                if is_new: self.writer.writerow(HEADER)
+                self.day = datetime.now().strftime('%Y-%m-%d') if is_new else \
+                    datetime.fromtimestamp(os.path.getmtime(self.path)).strftime('%Y-%m-%d')
+            self.writer.writerows(batch)
+            self.f.flush()
+            self.written += len(batch)
+            self.batches += 1
+        except Exception as e:
+            print(f"⚠️ 日志写入失败: {e}")
+
+    def _rotate_if_needed(self):
+        if not os.path.exists(self.path):
+            return
+        if self.day is None:
+            self.day = datetime.fromtimestamp(os.path.getmtime(self.path)).strftime('%Y-%m-%d')
+        today = datetime.now().strftime('%Y-%m-%d')
+        over_size = self.max_bytes and os.path.getsize(self.path) >= self.max_bytes
+        new_day = self.rotate_daily and self.day != today
+        if not over_size and not new_day:
+            return
+        if self.f:
+            self.f.close()
+            self.f = None
+        root, ext = os.path.splitext(self.path)
+        target, n = f"{root}.{self.day.replace('-', '')}{ext}", 1
+        while os.path.exists(target):
+            target, n = f"{root}.{self.day.replace('-', '')}-{n}{ext}", n + 1
+        os.replace(self.path, target)
+        self.rotations += 1
+        self.day = today
+
+    def stats(self):
+        return {'log_queue': self.q.qsize(), 'log_max_queue': self.max_depth,
+                'log_written': self.written, 'log_batches': self.batches, 'log_rotations': self.rotations}
+
+_writer = None
+_writer_lock = threading.Lock()
+
+def get_log_writer():
+    """进程内共享的日志写入线程（首次使用时启动，退出时自动落盘）"""
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = LogWriter()
+            _writer.start()
+            atexit.register(_writer.close)
+        return _writer
 
 def log_unified(source, name, status, detail):
-    os.makedirs(os.path.dirname(LOG_PATH), exist_ok=True)
-    is_new = not os.path.exists(LOG_PATH)
-    with open(LOG_PATH, 'a', newline='', encoding='utf-8-sig') as f:
-        writer = csv.writer(f)
-        if is_new: writer.writerow(['时间', '来源', '姓名', '状态', '详情'])
-        writer.writerow([datetime.now().strftime('%Y-%m-%d %H:%M:%S'), source, name, status, detail])
+    get_log_writer().write([datetime.now().strftime('%Y-%m-%d %H:%M:%S'), source, name, status, detail])
+
+def flush_log():
+    """将已入队的日志写入文件（读取 CSV 前调用）"""
+    if _writer is not None:
+        _writer.flush()
 
 def get_daily_statistics():
-    if not os.path.exists(LOG_PATH): 
-        return None
+    """今日 (总访问, 黑名单次数, 白名单次数, 访问最多的前 3 人)，出错返回 None"""
+    flush_log()
     try:
-        import pandas as pd
-        df = pd.read_csv(LOG_PATH, encoding='utf-8-sig')
-        today_str = datetime.now().strftime('%Y-%m-%d')
-        df['时间'] = pd.to_datetime(df['时间'])
-        today_df = df[df['时间'].dt.strftime('%Y-%m-%d') == today_str]
-
-        if today_df.empty: 
-            return 0, 0, 0, 0, []
-        
-        total_visits = len(today_df)
-        blacklist_cnt = len(today_df[today_df['状态'].str.contains('黑名单')])
-        whitelist_cnt = len(today_df[today_df['状态'].str.contains('白名单')])
-        top_visitors = today_df['姓名'].value_counts().head(3).to_dict()
-        return total_visits, blacklist_cnt, whitelist_cnt, top_visitors
+        return get_aggregator().daily()
     except Exception as e:
         print(f"统计出错: {e}")
-        return None
\ No newline at end of file
+        return None
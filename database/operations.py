@@ -1,84 +1,249 @@
 # -*- coding: utf-8 -*-
 import os
+import json
 import pickle
+import time
+import hashlib
 import cv2
-from core.recognition import extract_embeddings
-from config import DB_PATH, FACES_DIR
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from core.recognition import largest_face_crop, embed_faces
+from core.matcher import IVFIndex
+from database.gallery import FaceGallery
+from config import (DB_PATH, GALLERY_PATH, FACES_DIR, MANIFEST_PATH, ANN_INDEX_PATH, ANN_MIN_GALLERY, ANN_RETRAIN_RATIO,
+                    ENROL_WORKERS)
 
-def build_face_db(faces_dir=FACES_DIR):
-    face_db = {}
-    blacklist = set()
-    whitelist = set()
+def _init_enrol_worker():
+    # 每个进程只用单线程推理，避免多进程 x 多线程抢占 CPU；检测模型在进程内首次使用时加载一次
+    import torch
+    torch.set_num_threads(1)
+    cv2.setNumThreads(1)
 
-    for subdir, label_set in [('black', blacklist), ('white', whitelist)]:
+def _detect_job(path):
+    """子进程任务：解码 + 检测，返回 (最大人脸裁剪 或 None, 异常信息 或 None)"""
+    try:
+        return largest_face_crop(path), None
+    except Exception as e:
+        return None, str(e)
+
+def embed_files(paths, workers=ENROL_WORKERS):
+    """批量建库：解码和检测可分发到进程池，FaceNet 在主进程按批次统一推理
+
+    并行时 FaceNet 的输入顺序和批次划分与串行一致，但子进程以单线程运行 torch/OpenCV，
+    检测框和裁剪可能与串行有细微差异，因此不保证特征逐位相同（人员和对应关系一致）。
+    返回与 paths 对齐的 [(特征 或 None, 异常信息 或 None), ...]
+    """
+    workers = workers or os.cpu_count() or 1
+    total, t0 = len(paths), time.time()
+    crops, errors = [], []
+
+    def collect(results):
+        for i, (crop, err) in enumerate(results, 1):
+            crops.append(crop)
+            errors.append(err)
+            if i % 50 == 0 or i == total:
+                print(f"[检测进度] {i}/{total}  {i / (time.time() - t0 + 1e-9):.1f} 张/秒")
+
+    if workers > 1 and total > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, total), initializer=_init_enrol_worker) as pool:
+            collect(pool.map(_detect_job, paths, chunksize=max(1, total // (workers * 4))))
+    else:
+        collect(map(_detect_job, paths))
+
+    found = [i for i, c in enumerate(crops) if c is not None]
+    embs = embed_faces(np.stack([crops[i] for i in found])) if found else []
+    print(f"[特征提取] {len(found)} 张人脸，总耗时 {time.time() - t0:.1f}s")
+    results = [(None, err) for err in errors]
+    for i, emb in zip(found, embs):
+        results[i] = (emb, None)
+    return results
+
+def _scan_faces(faces_dir):
+    """扫描 black/white 目录，返回 {相对路径: (绝对路径, 类别, 人员ID, 大小, 修改时间)}"""
+    files = {}
+    for subdir in ['black', 'white']:
         path = os.path.join(faces_dir, subdir)
         if not os.path.exists(path): continue
 
-        for filename in os.listdir(path):
+        for filename in sorted(os.listdir(path)):
             if filename.lower().endswith(('.jpg', '.jpeg', '.png')):
                 full_path = os.path.join(path, filename)
-                print(f"[处理中] {filename}")
+                st = os.stat(full_path)
+                files[f"{subdir}/{filename}"] = (full_path, subdir, os.path.splitext(filename)[0],
+                                                 st.st_size, st.st_mtime_ns)
+    return files
 
-                try:
-                    embs = extract_embeddings(full_path)
-                    if embs:
-                        # 选最大脸
-                        best_face = max(embs, key=lambda x: (x[1][2]-x[1][0]) * (x[1][3]-x[1][1]))
-                        emb = best_face[0]
-                        person_id = os.path.splitext(filename)[0]
-                        face_db[person_id] = emb
-                        label_set.add(person_id)
-                        print(f"  → 成功录入: {person_id} ({subdir})")
-                    else:
-                        print(f"  → [跳过] 未检测到人脸: {filename}")
-                except Exception as e:
-                    print(f"  → [异常] {filename}: {e}")
+def _file_hash(path):
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+def load_manifest():
+    """清单：相对路径 -> {path, size, mtime, sha1, id, label, row}
+
+    id 为 None 表示未检测到人脸；row 为该人在特征矩阵中的行号
+    """
+    if os.path.exists(MANIFEST_PATH):
+        try:
+            with open(MANIFEST_PATH, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except Exception as e:
+            print(f"⚠️ 清单读取失败，将重新校验全部图片: {e}")
+    return {}
+
+def save_manifest(manifest):
+    os.makedirs(os.path.dirname(MANIFEST_PATH), exist_ok=True)
+    tmp = MANIFEST_PATH + '.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=1)
+    os.replace(tmp, MANIFEST_PATH)
 
-    os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
-    with open(DB_PATH, 'wb') as f:
-        pickle.dump({'embeddings': face_db, 'blacklist': blacklist, 'whitelist': whitelist}, f)
+def _save_db(face_db, blacklist, whitelist):
+    gallery = FaceGallery.from_dict(face_db, blacklist, whitelist)
+    gallery.save(GALLERY_PATH)
+    return FaceGallery.load(GALLERY_PATH)
 
-    print(f"人脸库保存到 {DB_PATH}，共 {len(face_db)} 条记录")
+def sync_face_db(faces_dir=FACES_DIR, rebuild=False, known=None, workers=ENROL_WORKERS):
+    """按清单增量同步：只为新增/变化的图片提取特征，删除的图片从库中移除
+
+    known: {相对路径: 特征}，调用方已算好的特征（如录入时）直接写入，不再重复提取
+    返回 (gallery, blacklist, whitelist, 变化条数)
+    """
+    files = _scan_faces(faces_dir)
+    known = known or {}
+    if rebuild:
+        gallery, old_bl, old_wl, manifest = FaceGallery(), set(), set(), {}
+    else:
+        gallery, old_bl, old_wl = load_face_db()
+        manifest = load_manifest()
+    # 行视图，不拷贝矩阵
+    face_db = dict(gallery.items())
+    old_labels = {'black': old_bl, 'white': old_wl}
+
+    new_manifest, todo = {}, []
+    for rel, (full_path, subdir, pid, size, mtime) in files.items():
+        entry = manifest.get(rel)
+        if rel not in known and entry and entry['label'] == subdir and (entry['id'] is None or entry['id'] in face_db):
+            # 大小和修改时间未变，直接沿用
+            if entry['size'] == size and entry['mtime'] == mtime:
+                new_manifest[rel] = entry
+                continue
+            digest = _file_hash(full_path)
+            if entry['sha1'] == digest:
+                new_manifest[rel] = dict(entry, size=size, mtime=mtime)
+                continue
+        else:
+            digest = _file_hash(full_path)
+            # 旧版人脸库没有清单：库中已有同名同类别的记录则直接沿用
+            if rel not in known and entry is None and pid in face_db and pid in old_labels[subdir]:
+                new_manifest[rel] = {'path': rel, 'size': size, 'mtime': mtime, 'sha1': digest, 'id': pid, 'label': subdir}
+                continue
+        new_manifest[rel] = {'path': rel, 'size': size, 'mtime': mtime, 'sha1': digest, 'id': None, 'label': subdir}
+        todo.append(rel)
+
+    pending = [rel for rel in todo if rel not in known]
+    computed = dict(zip(pending, embed_files([files[rel][0] for rel in pending], workers))) if pending else {}
+    for rel in todo:
+        subdir, pid = files[rel][1:3]
+        print(f"[处理中] {rel}")
+        emb, err = (known[rel], None) if rel in known else computed[rel]
+        if err:
+            # 异常不写入清单，下次自检重试
+            print(f"  → [异常] {rel}: {err}")
+            del new_manifest[rel]
+            continue
+        if emb is None:
+            print(f"  → [跳过] 未检测到人脸: {rel}")
+            continue
+        face_db[pid] = emb
+        new_manifest[rel]['id'] = pid
+        print(f"  → 成功录入: {pid} ({subdir})")
+
+    # 库中只保留清单里有图片支撑的人员
+    labels = {e['id']: e['label'] for e in new_manifest.values() if e['id'] is not None}
+    removed = [p for p in face_db if p not in labels]
+    for p in removed:
+        del face_db[p]
+    blacklist = {p for p, l in labels.items() if l == 'black'}
+    whitelist = {p for p, l in labels.items() if l == 'white'}
+    changed = len(todo) + len(removed)
+
+    if rebuild or changed or blacklist != old_bl or whitelist != old_wl:
+        gallery = _save_db(face_db, blacklist, whitelist)
+        print(f"人脸库保存到 {GALLERY_PATH}，共 {len(gallery)} 条记录")
+        build_ann_index(gallery, retrain=rebuild, stale={files[rel][2] for rel in todo})
+    for e in new_manifest.values():
+        e['row'] = gallery.row(e['id'])
+    if new_manifest != manifest:
+        save_manifest(new_manifest)
+    return gallery, blacklist, whitelist, changed
+
+def build_face_db(faces_dir=FACES_DIR, workers=ENROL_WORKERS):
+    """全量重建（忽略已有清单）；workers > 1 时检测阶段多进程并行，0 表示使用全部 CPU 核"""
+    face_db, blacklist, whitelist, _ = sync_face_db(faces_dir, rebuild=True, workers=workers)
     return face_db, blacklist, whitelist
 
+def build_ann_index(face_db, path=ANN_INDEX_PATH, retrain=False, stale=()):
+    """大库维护 IVF 近似检索索引并保存在人脸库旁边；小库删除旧索引（face_db 为 FaceGallery）
+
+    已有索引时沿用训练好的簇中心，新增和 stale 中（特征变化）的人员就近归簇，删除的人员直接丢弃；
+    retrain 为真、或库规模相对训练时变化超过 ANN_RETRAIN_RATIO 时才重新训练。
+    """
+    if len(face_db) < ANN_MIN_GALLERY:
+        if os.path.exists(path): os.remove(path)
+        return None
+    matrix = np.asarray(face_db.matrix)
+    index = None
+    if not retrain and os.path.exists(path):
+        try:
+            index = IVFIndex.load(path, face_db.ids, matrix, stale)
+        except Exception as e:
+            print(f"⚠️ ANN 索引读取失败，重新训练: {e}")
+        if index is not None and abs(len(face_db) - index.trained_size) > ANN_RETRAIN_RATIO * index.trained_size:
+            index = None
+    if index is None:
+        index = IVFIndex.train(matrix)
+        print(f"ANN 索引重新训练，{len(index.centroids)} 个簇")
+    index.save(path, face_db.ids)
+    print(f"ANN 索引保存到 {path}")
+    return index
+
 def load_face_db():
-    if os.path.exists(DB_PATH):
+    """加载人脸库（特征矩阵内存映射，零拷贝）；首次运行时从旧版 face_db.pkl 迁移"""
+    if not os.path.exists(GALLERY_PATH) and os.path.exists(DB_PATH):
         with open(DB_PATH, 'rb') as f:
             data = pickle.load(f)
-        print(f"加载成功：黑名单 {len(data['blacklist'])} 人，白名单 {len(data['whitelist'])} 人")
-        return data['embeddings'], data['blacklist'], data['whitelist']
-    return {}, set(), set()
+        _save_db(data['embeddings'], data['blacklist'], data['whitelist'])
+        print(f"📦 已将 {DB_PATH} 迁移为 {GALLERY_PATH}")
+    if os.path.exists(GALLERY_PATH):
+        gallery = FaceGallery.load(GALLERY_PATH)
+        blacklist, whitelist = gallery.blacklist, gallery.whitelist
+        print(f"加载成功：黑名单 {len(blacklist)} 人，白名单 {len(whitelist)} 人")
+        return gallery, blacklist, whitelist
+    return FaceGallery(), set(), set()
 
 def startup_self_check():
-    """开机自检：对比文件夹图片和数据库索引"""
+    """开机自检：按清单对比文件夹图片，只处理变化的部分"""
     print("\n" + "🔍" + " 开始开机自检...")
-    folder_ids = set()
-    for subdir in ['black', 'white']:
-        path = os.path.join(FACES_DIR, subdir)
-        if os.path.exists(path):
-            files = [os.path.splitext(f)[0] for f in os.listdir(path) 
-                     if f.lower().endswith(('.jpg', '.jpeg', '.png'))]
-            folder_ids.update(files)
-    
-    db_embeddings, blacklist, whitelist = load_face_db()
-    db_ids = set(db_embeddings.keys())
-    
-    if folder_ids == db_ids:
-        print(f"✅ 自检通过：数据库与文件夹同步 (共 {len(folder_ids)} 人)。")
-        return db_embeddings, blacklist, whitelist
+    face_db, blacklist, whitelist, changed = sync_face_db()
+    if changed:
+        print(f"⚠️ 检测到 {changed} 处变化，已增量更新索引 (共 {len(face_db)} 人)。")
     else:
-        print(f"⚠️ 检测到数据不一致！正在自动重构索引...")
-        return build_face_db()
+        print(f"✅ 自检通过：数据库与文件夹同步 (共 {len(face_db)} 人)。")
+    return face_db, blacklist, whitelist
 
 def register_face(img, pid, g_type):
-    embs = extract_embeddings(img)
-    if not embs: return False, "未检测到人脸"
-    emb, bbox, _ = max(embs, key=lambda x: (x[1][2]-x[1][0]) * (x[1][3]-x[1][1]))
+    crop = largest_face_crop(img)
+    if crop is None: return False, "未检测到人脸"
+    emb = embed_faces(crop[None])[0]
     sub = 'black' if g_type == '1' else 'white'
     os.makedirs(os.path.join(FACES_DIR, sub), exist_ok=True)
     save_path = os.path.join(FACES_DIR, sub, f"{pid}.jpg")
     cv2.imencode('.jpg', img)[1].tofile(save_path)
-    startup_self_check()
+    # 特征已算好，直接写入，不再重复检测
+    sync_face_db(known={f"{sub}/{pid}.jpg": emb})
     return True, f"成功录入至 {sub}"
 
 # 文件位置：database/operations.py
@@ -88,20 +253,7 @@ def delete_face(person_id):
     """
     同步数据库与文件
     """
-    # 1. 加载当前数据库
-    face_db, blacklist, whitelist = load_face_db()
-
-    # 2. 无论文件还在不在，先从内存数据库中移除！
-    removed_from_db = False
-    if person_id in face_db:
-        del face_db[person_id]
-        removed_from_db = True
-        print(f"🗑️ 已从内存特征库中移除: {person_id}")
-    
-    if person_id in blacklist: blacklist.remove(person_id)
-    if person_id in whitelist: whitelist.remove(person_id)
-
-    # 3. 尝试删除物理文件 
+    # 1. 删除物理文件 
     # 扫描 black 和 white 两个文件夹
     for sub_dir in ['black', 'white']:
         dir_path = os.path.join(FACES_DIR, sub_dir)
@@ -117,13 +269,13 @@ def delete_face(person_id):
                 except Exception as e:
                     print(f"⚠️ 物理文件删除出错 (不影响数据库清理): {e}")
 
-    # 4. 立即保存新的 .pkl 文件
+    # 2. 按清单同步：图片已不存在的人员会从库中移除，并立即保存
     # 这样下次重启软件时，这个人就绝对不会再出现了
     try:
-        with open(DB_PATH, 'wb') as f:
-            pickle.dump({'embeddings': face_db, 'blacklist': blacklist, 'whitelist': whitelist}, f)
-        print("💾 数据库文件(.pkl)已强制更新")
+        face_db, _, _, _ = sync_face_db()
     except Exception as e:
         return False, f"数据库保存失败: {e}"
+    if person_id in face_db:
+        return False, f"人员 [{person_id}] 的图片删除失败，仍在库中"
 
-    return True, f" 人员 [{person_id}] 已彻底移除！"
\ No newline at end of file
+    return True, f" 人员 [{person_id}] 已彻底移除！"
@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+import os
+import json
+import time
+import threading
+from collections import Counter
+from datetime import datetime, timedelta
+from config import STATS_PATH, STATS_CHECKPOINT_INTERVAL, STATS_KEEP_DAYS
+
+class DayStats:
+    """单日计数：总访问、各状态次数、各姓名次数，以及增量维护的前 k 名"""
+    def __init__(self, top_k=3, d=None):
+        d = d or {}
+        self.top_k = top_k
+        self.total = d.get('total', 0)
+        self.status = Counter(d.get('status', {}))
+        self.names = Counter(d.get('names', {}))
+        self.top = sorted(self.names, key=self.names.get, reverse=True)[:top_k]
+
+    def add(self, name, status):
+        self.total += 1
+        self.status[status] += 1
+        self.names[name] += 1
+        # 计数只增不减，只有当前名字可能挤进前 k 名
+        if name not in self.top:
+            if len(self.top) < self.top_k:
+                self.top.append(name)
+            elif self.names[name] > self.names[self.top[-1]]:
+                self.top[-1] = name
+            else:
+                return
+        self.top.sort(key=self.names.get, reverse=True)
+
+    def summary(self):
+        black = sum(n for s, n in self.status.items() if '黑名单' in s)
+        white = sum(n for s, n in self.status.items() if '白名单' in s)
+        return self.total, black, white, {p: self.names[p] for p in self.top}
+
+    def to_dict(self):
+        return {'total': self.total, 'status': dict(self.status), 'names': dict(self.names)}
+
+class DailyAggregator:
+    """按天增量统计：事件写入事件库时同步累加，读取为 O(1)
+
+    定期把计数和已统计到的事件 id 写入检查点，启动时只补读检查点之后的事件。
+    """
+    def __init__(self, path=STATS_PATH, checkpoint_interval=STATS_CHECKPOINT_INTERVAL,
+                 keep_days=STATS_KEEP_DAYS, top_k=3):
+        self.path = path
+        self.checkpoint_interval = checkpoint_interval
+        self.keep_days = keep_days
+        self.top_k = top_k
+        self.lock = threading.Lock()
+        self.days = {}
+        self.last_id = 0
+        self.dirty = False
+        self.last_checkpoint = time.monotonic()
+        if os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    state = json.load(f)
+                self.last_id = state['last_id']
+                self.days = {day: DayStats(top_k, d) for day, d in state['days'].items()}
+            except Exception as e:
+                print(f"⚠️ 统计检查点损坏，将从事件库重建: {e}")
+                self.days, self.last_id = {}, 0
+
+    def add(self, rows, first_id):
+        """rows: 事件行 [时间, 来源, 姓名, 状态, 详情]，id 从 first_id 起连续；已统计过的 id 自动跳过"""
+        with self.lock:
+            for i, row in enumerate(rows):
+                if first_id + i <= self.last_id: continue
+                day = row[0][:10]
+                stats = self.days.get(day)
+                if stats is None:
+                    stats = self.days[day] = DayStats(self.top_k)
+                stats.add(row[2], row[3])
+            if rows:
+                self.last_id = max(self.last_id, first_id + len(rows) - 1)
+                self.dirty = True
+
+    def catch_up(self, store):
+        """补读检查点之后写入事件库的事件"""
+        n = 0
+        for event_id, row in store.rows_after(self.last_id):
+            self.add([row], event_id)
+            n += 1
+        if n:
+            print(f"🔄 统计已补读 {n} 条新事件")
+            self.checkpoint()
+
+    def daily(self, day=None):
+        """某天的 (总访问, 黑名单次数, 白名单次数, 访问最多的前 k 人)"""
+        day = (day or datetime.now().date()).strftime('%Y-%m-%d')
+        with self.lock:
+            stats = self.days.get(day)
+            return stats.summary() if stats else (0, 0, 0, {})
+
+    def maybe_checkpoint(self):
+        if self.dirty and time.monotonic() - self.last_checkpoint >= self.checkpoint_interval:
+            self.checkpoint()
+
+    def checkpoint(self):
+        """原子写入检查点，只保留最近 keep_days 天"""
+        with self.lock:
+            cutoff = (datetime.now().date() - timedelta(days=self.keep_days)).strftime('%Y-%m-%d')
+            for day in [d for d in self.days if d < cutoff]:
+                del self.days[day]
+            state = {'last_id': self.last_id, 'days': {day: s.to_dict() for day, s in self.days.items()}}
+            self.dirty = False
+            self.last_checkpoint = time.monotonic()
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp = self.path + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(state, f, ensure_ascii=False)
+        os.replace(tmp, self.path)
+
+_aggregator = None
+_aggregator_lock = threading.Lock()
+
+def get_aggregator():
+    """进程内共享的统计器（首次使用时加载检查点并补读新事件）"""
+    global _aggregator
+    with _aggregator_lock:
+        if _aggregator is None:
+            from database.events import get_event_store
+            _aggregator = DailyAggregator()
+            _aggregator.catch_up(get_event_store())
+        return _aggregator
+
+def checkpoint_stats():
+    """退出时保存检查点（统计器未启用时跳过）"""
+    if _aggregator is not None and _aggregator.dirty:
+        _aggregator.checkpoint()
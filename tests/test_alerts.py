@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+"""AlertDispatcher：冷却只在送达后开始；限频或丢弃的告警至少打印"""
+import time
+from core.alerts import AlertDispatcher, AlertSink
+
+class Recorder(AlertSink):
+    def __init__(self, audible=False, fail=False):
+        self.audible, self.fail, self.got = audible, fail, []
+
+    def emit(self, alert):
+        if self.fail:
+            raise RuntimeError('no device')
+        self.got.append(alert['key'])
+
+def drain(d):
+    """等待告警线程处理完队列中的告警"""
+    for _ in range(200):
+        with d.cond:
+            if not d.pending:
+                break
+        time.sleep(0.01)
+    time.sleep(0.05)
+
+def test_rate_limited_audible_only_goes_to_log(capsys):
+    beep = Recorder(audible=True)
+    d = AlertDispatcher([beep], cooldown=10, max_per_min=1)
+    d.start()
+    d.post('a', 'A 告警')
+    drain(d)
+    d.post('b', 'B 告警')
+    drain(d)
+    d.stop()
+    assert beep.got == ['a']
+    assert 'B 告警' in capsys.readouterr().out
+    assert d.stats()['alerts_suppressed'] == 1
+    assert not d.post('b', 'B 告警')  # 已通过打印送达，进入冷却
+
+def test_dropped_alert_is_logged_and_not_cooled_down(capsys):
+    d = AlertDispatcher([Recorder()], max_pending=2)
+    for key in 'abc':
+        d.post(key, f"{key} 告警")
+    assert 'a 告警' in capsys.readouterr().out
+    assert d.stats()['alerts_dropped'] == 1
+    assert d.post('a', 'a 告警')  # 未送达，不在冷却中
+
+def test_failed_sinks_do_not_start_cooldown(capsys):
+    d = AlertDispatcher([Recorder(fail=True)])
+    d.start()
+    d.post('a', 'A 告警')
+    drain(d)
+    d.stop()
+    assert 'A 告警' in capsys.readouterr().out
+    assert d.post('a', 'A 告警')
@@ -0,0 +1,11 @@
+# -*- coding: utf-8 -*-
+"""采集策略默认值：计数模式的视频文件不丢帧"""
+from core.capture import default_policy
+from config import VIDEO_POLICY
+
+def test_default_policy():
+    assert default_policy(0, 'face') == 'latest'
+    assert default_policy(1, 'flow') == 'latest'
+    assert default_policy('a.mp4', 'flow') == 'all'
+    assert default_policy('a.mp4', 'density') == 'all'
+    assert default_policy('a.mp4', 'face') == VIDEO_POLICY
@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+"""embed_files：进程池与串行的结果都与输入路径逐一对齐（检测用假实现，仅验证分发与合并）"""
+import multiprocessing
+import numpy as np
+import pytest
+import database.operations as ops
+from core.recognition import FACE_SIZE
+
+def fake_crop(path):
+    # 文件名决定结果：no_ 开头无人脸，bad_ 开头抛异常，其余按序号生成固定裁剪
+    name = path.rsplit('/', 1)[-1]
+    if name.startswith('no_'):
+        return None
+    if name.startswith('bad_'):
+        raise ValueError(name)
+    return np.full((FACE_SIZE, FACE_SIZE, 3), int(name.split('.')[0]) % 256, dtype=np.uint8)
+
+def fake_embed(batch):
+    return batch.reshape(len(batch), -1)[:, :512].astype(np.float32)
+
+@pytest.mark.skipif(multiprocessing.get_start_method() != 'fork', reason=u"子进程需 fork 继承替换后的检测函数")
+def test_pool_and_serial_aligned(monkeypatch):
+    monkeypatch.setattr(ops, 'largest_face_crop', fake_crop)
+    monkeypatch.setattr(ops, 'embed_faces', fake_embed)
+    paths = [f"x/{'no_' if i % 7 == 0 else 'bad_' if i % 11 == 0 else ''}{i}.jpg" for i in range(60)]
+    serial = ops.embed_files(paths, workers=1)
+    parallel = ops.embed_files(paths, workers=3)
+    assert len(serial) == len(parallel) == len(paths)
+    for path, (e1, err1), (e2, err2) in zip(paths, serial, parallel):
+        assert err1 == err2
+        if e1 is None:
+            assert e2 is None
+        else:
+            assert e1[0] == e2[0] == int(path.rsplit('/', 1)[-1].split('.')[0]) % 256
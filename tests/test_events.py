@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+"""EventStore 读写与 DailyAggregator 增量统计、检查点、补读的往返一致性"""
+import csv
+import random
+from collections import Counter
+from datetime import date, datetime, timedelta
+from database.events import EventStore, HEADER
+from database.stats import DailyAggregator
+
+STATUSES = ['白名单(通过)', '黑名单(警报)', '陌生人', '越线进入']
+
+def make_rows(day, seed):
+    """前三名人数互不相同（a > b > c > 其他），便于与期望值直接比较"""
+    rng = random.Random(seed)
+    names = ['a'] * 12 + ['b'] * 8 + ['c'] * 5 + ['d', 'e', 'e', 'f', 'g', 'g']
+    rng.shuffle(names)
+    return [[f"{day} {8 + i // 60:02d}:{i % 60:02d}:00", rng.choice(['CAM0', 'CAM1']), n, rng.choice(STATUSES), '']
+            for i, n in enumerate(names)]
+
+def expected(rows, day):
+    rows = [r for r in rows if r[0].startswith(str(day))]
+    black = sum('黑名单' in r[3] for r in rows)
+    white = sum('白名单' in r[3] for r in rows)
+    return len(rows), black, white, dict(Counter(r[2] for r in rows).most_common(3))
+
+def store_at(tmp_path, csv_rows=()):
+    csv_path = tmp_path / 'log.csv'
+    if csv_rows:
+        with open(csv_path, 'w', newline='', encoding='utf-8-sig') as f:
+            csv.writer(f).writerows([HEADER] + list(csv_rows))
+    return EventStore(str(tmp_path / 'db' / 'events.db'), str(csv_path))
+
+def test_store_roundtrip(tmp_path):
+    today = date.today()
+    old = make_rows(today - timedelta(days=1), 0)
+    new = make_rows(today, 1)
+    store = store_at(tmp_path, old)
+    assert store.count() == len(old)
+
+    first = store.insert_many(new)
+    assert first == len(old) + 1
+    assert [r for _, r in store.rows_after(len(old))] == [tuple(r) for r in new]
+    assert list(store.rows()) == [tuple(r) for r in sorted(old + new, key=lambda r: r[0])]
+    assert store.count(today) == len(new)
+    assert store.count(end=today) == len(old)
+    assert store.count_by('status', start=today) == dict(Counter(r[3] for r in new))
+    assert store.time_span() == (old[0][0], new[-1][0])
+
+    # 重新打开不再重复导入 CSV
+    assert store_at(tmp_path).count() == len(old) + len(new)
+
+def test_aggregator_checkpoint_and_catch_up(tmp_path):
+    today = date.today()
+    yesterday = today - timedelta(days=1)
+    rows = make_rows(yesterday, 2) + make_rows(today, 3)
+    store = store_at(tmp_path)
+    stats_path = str(tmp_path / 'db' / 'stats.json')
+
+    # 写入事件库时同步累加；重复提交的 id 跳过
+    agg = DailyAggregator(stats_path)
+    half = len(rows) // 2
+    agg.add(rows[:half], store.insert_many(rows[:half]))
+    agg.add(rows[:half], 1)
+    agg.checkpoint()
+
+    # 检查点之后写入的事件只在库中，重启后补读
+    store.insert_many(rows[half:])
+    restarted = DailyAggregator(stats_path)
+    assert restarted.last_id == half
+    restarted.catch_up(store)
+    rebuilt = DailyAggregator(str(tmp_path / 'rebuilt.json'))
+    rebuilt.catch_up(store)
+    for day in (yesterday, today):
+        assert restarted.daily(day) == rebuilt.daily(day) == expected(rows, day)
+    assert restarted.daily(today - timedelta(days=7)) == (0, 0, 0, {})
+
+    # 检查点只保留最近 keep_days 天
+    restarted.keep_days = 0
+    restarted.checkpoint()
+    assert DailyAggregator(stats_path).daily(yesterday) == (0, 0, 0, {})
+    assert DailyAggregator(stats_path).daily(today) == expected(rows, today)
+
+def test_corrupt_checkpoint_rebuilds(tmp_path):
+    rows = make_rows(datetime.now().date(), 4)
+    store = store_at(tmp_path)
+    store.insert_many(rows)
+    path = tmp_path / 'stats.json'
+    path.write_text('{broken', encoding='utf-8')
+    agg = DailyAggregator(str(path))
+    agg.catch_up(store)
+    assert agg.daily() == expected(rows, datetime.now().date())
@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+"""人脸模式轨迹身份缓存：间隔内复用、到期重算；人脸库更新只在下一帧开始时让缓存作废"""
+import numpy as np
+from core.pipeline import FrameProcessor
+from config import FACE_REID_INTERVAL
+
+FRAME = np.zeros((480, 640, 3), dtype=np.uint8)
+BOXES = [(100, 100, 200, 220), (400, 100, 500, 220)]
+
+def make(db, bl=(), wl=()):
+    return FrameProcessor('face', face_db=db, bl=set(bl), wl=set(wl), log=lambda *a: None, render=False)
+
+def step(fp, embs, boxes=BOXES):
+    """外部传入人脸框和特征跑一帧，返回本帧重新提取特征的框下标"""
+    fp.begin(FRAME, faces=boxes)
+    need = fp._pending[2]
+    fp.finish(FRAME, np.stack([embs[i] for i in need]) if need else None)
+    return need
+
+def idents(fp):
+    return [tr['ident'][2] for tr in fp.face_tracker.tracks.values()]
+
+def db():
+    rng = np.random.default_rng(0)
+    return {'alice': rng.normal(size=512).astype(np.float32), 'bob': rng.normal(size=512).astype(np.float32)}
+
+def test_identity_reused_until_interval():
+    faces = db()
+    fp = make(faces, wl={'alice', 'bob'})
+    embs = [faces['alice'], faces['bob']]
+    assert step(fp, embs) == [0, 1]
+    for _ in range(FACE_REID_INTERVAL - 1):
+        assert step(fp, embs) == []
+    assert step(fp, embs) == [0, 1]
+    assert idents(fp) == [u"白名单", u"白名单"]
+
+def test_db_change_invalidates_on_next_frame():
+    faces = db()
+    fp = make(faces, wl={'alice', 'bob'})
+    embs = [faces['alice'], faces['bob']]
+    step(fp, embs)
+    step(fp, embs)
+
+    # 界面线程在一帧的 begin 与 finish 之间更新库：本帧不受影响（轨迹不在 need 中也不会丢身份）
+    fp.begin(FRAME, faces=BOXES)
+    assert fp._pending[2] == []
+    fp.set_face_db({'alice': faces['alice']}, {'alice'}, set())
+    fp.finish(FRAME, None)
+    assert idents(fp) == [u"白名单", u"白名单"]
+
+    # 下一帧开始时生效：全部轨迹重新比对，alice 改为黑名单，bob 已删除
+    assert step(fp, embs) == [0, 1]
+    assert idents(fp) == [u"黑名单", "Stranger"]
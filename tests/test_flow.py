@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+"""越线计数：单计数线与改造前逐轨迹算法逐帧一致；多闸口总数按轨迹去重；轨迹状态槽位复用"""
+import numpy as np
+from core.tracking import PedestrianFlowManager
+
+class LegacyFlow:
+    """改造前的单线 check_crossing，时间戳改为参数传入，仅作对照"""
+    def __init__(self, line_pts, in_side_sign=1):
+        self.line_pts, self.in_side_sign = line_pts, in_side_sign
+        self.in_total = self.out_total = 0
+        self.track_history, self.last_in_time, self.crossing_time = {}, {}, {}
+
+    def check_crossing(self, tid, pos, now):
+        if tid in self.crossing_time and (now - self.crossing_time[tid] < 1.0):
+            return None
+        (x1, y1), (x2, y2) = self.line_pts
+        side = (x2 - x1) * (pos[1] - y1) - (y2 - y1) * (pos[0] - x1)
+        curr_sign = 1 if side > 0 else -1
+        if tid not in self.track_history:
+            self.track_history[tid] = curr_sign
+            return None
+        prev_sign = self.track_history[tid]
+        self.track_history[tid] = curr_sign
+        if prev_sign == curr_sign:
+            return None
+        direction = "IN" if curr_sign == self.in_side_sign else "OUT"
+        if direction == "OUT" and (tid not in self.last_in_time or now - self.last_in_time[tid] < 3.0):
+            return None
+        if direction == "IN":
+            self.in_total += 1
+            self.last_in_time[tid] = now
+        else:
+            self.out_total += 1
+        self.crossing_time[tid] = now
+        return direction
+
+def simulate(n_tracks=300, frames=1500, fps=10.0, seed=0):
+    """轨迹在 y=400 附近来回走动，id 单调递增、同时在场约 30 条；逐帧产出 (时间, ids, 质心)"""
+    rng = np.random.default_rng(seed)
+    start = rng.integers(0, frames - 50, n_tracks)
+    life = rng.integers(20, 200, n_tracks)
+    y0 = rng.uniform(300, 500, n_tracks)
+    amp, freq = rng.uniform(20, 150, n_tracks), rng.uniform(0.02, 0.2, n_tracks)
+    x = rng.uniform(120, 480, n_tracks)
+    for f in range(frames):
+        alive = np.nonzero((start <= f) & (f < start + life))[0]
+        y = y0[alive] + amp[alive] * np.sin(freq[alive] * (f - start[alive])) + rng.normal(0, 3, len(alive))
+        yield f / fps, alive.tolist(), np.stack([x[alive], y], axis=1).astype(int)
+
+def test_single_line_equals_legacy():
+    line = [(100, 400), (500, 400)]
+    mgr, ref = PedestrianFlowManager(line_pts=line, interval=float('inf')), LegacyFlow(line)
+    n_events = 0
+    for now, tids, cents in simulate():
+        got = {(tid, d) for _, tid, d in mgr.update(tids, cents, now)}
+        exp = {(tid, d) for tid, c in zip(tids, cents) for d in [ref.check_crossing(tid, c, now)] if d}
+        assert got == exp
+        n_events += len(exp)
+    assert n_events > 100
+    st = mgr.get_status()
+    assert (st['in'], st['out']) == (ref.in_total, ref.out_total)
+    assert (st['gates'][0]['in'], st['gates'][0]['out']) == (ref.in_total, ref.out_total)
+    # 轨迹状态按同时在场的轨迹数分配，不随累计 id 数增长
+    assert len(mgr.last_seen) < 300
+
+def test_check_crossing_equals_legacy():
+    line = [(100, 400), (500, 400)]
+    mgr, ref = PedestrianFlowManager(line_pts=line, interval=float('inf')), LegacyFlow(line, -1)
+    mgr.in_side_sign = -1
+    for now, tids, cents in simulate(n_tracks=60, frames=400, seed=1):
+        for tid, c in zip(tids, cents):
+            assert mgr.check_crossing(tid, c, now) == ref.check_crossing(tid, c, now)
+    assert (mgr.in_total, mgr.out_total) == (ref.in_total, ref.out_total)
+
+def test_multi_gate_total_dedup():
+    mgr = PedestrianFlowManager(line_pts=[(0, 400), (600, 400)], interval=float('inf'))
+    mgr.add_line((0, 300), (600, 300))
+    # 一人自上而下依次越过两条线：两个闸口各计 1 次 IN，总数只计 1 次
+    for i, y in enumerate(range(250, 460, 10)):
+        mgr.update([7], [(300, y)], now=i * 0.5)
+    st = mgr.get_status()
+    assert [(g['in'], g['out']) for g in st['gates']] == [(1, 0), (1, 0)]
+    assert (st['in'], st['out']) == (1, 0)
+    # 原路返回：两个闸口各计 1 次 OUT，总数只计 1 次
+    for i, y in enumerate(range(460, 240, -10)):
+        mgr.update([7], [(300, y)], now=20 + i * 0.5)
+    st = mgr.get_status()
+    assert [(g['in'], g['out']) for g in st['gates']] == [(1, 1), (1, 1)]
+    assert (st['in'], st['out']) == (1, 1)
+
+def test_slot_reuse_resets_state():
+    mgr = PedestrianFlowManager(line_pts=[(0, 400), (600, 400)], interval=float('inf'), state_ttl=5.0)
+    cap = len(mgr.last_seen)
+    for tid in range(cap):
+        mgr.update([tid], [(300, 350)], now=0.0)
+    # 旧轨迹超时后槽位被新轨迹复用，新轨迹不继承旧状态（首帧没有历史，不计数）
+    for tid in range(cap, 2 * cap):
+        assert mgr.update([tid], [(300, 450)], now=10.0) == []
+    assert len(mgr.last_seen) == cap
+
+def test_returning_track_keeps_slot_when_pool_exhausted():
+    mgr = PedestrianFlowManager(line_pts=[(0, 400), (600, 400)], interval=float('inf'), state_ttl=5.0)
+    cap = len(mgr.last_seen)
+    mgr.update([0], [(300, 350)], now=0.0)
+    # 轨迹 0 超时后与一批新轨迹同帧出现，槽位不够：不能回收轨迹 0 自己的槽位
+    tids = [0] + list(range(1, cap + 1))
+    events = mgr.update(tids, [(300, 450)] * len(tids), now=20.0)
+    assert events == [(0, 0, 'IN')]
+    assert len(set(mgr.slot[t] for t in tids)) == len(tids)
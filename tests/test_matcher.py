@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+"""FaceMatcher 与逐条暴力比对（oracle）的一致性"""
+import numpy as np
+import pytest
+import database.operations as ops
+from core.matcher import FaceMatcher, IVFIndex, normalize_rows
+
+class Gallery:
+    """build_ann_index 只用到 ids / matrix / len"""
+    def __init__(self, ids, matrix):
+        self.ids, self.matrix = ids, matrix
+
+    def __len__(self):
+        return len(self.ids)
+
+def oracle(gallery, q, k):
+    """逐条计算余弦相似度并排序"""
+    out_ids, out_scores = [], []
+    for qi in q:
+        qi = qi / np.linalg.norm(qi)
+        sims = sorted(((float(np.dot(qi, e / np.linalg.norm(e))), p) for p, e in gallery.items()), reverse=True)[:k]
+        out_ids.append([p for _, p in sims] + [None] * (k - len(sims)))
+        out_scores.append([s for s, _ in sims] + [-np.inf] * (k - len(sims)))
+    return np.array(out_ids, dtype=object), np.array(out_scores)
+
+def random_db(n, seed=0):
+    rng = np.random.default_rng(seed)
+    return {f"p{i}": rng.normal(size=512).astype(np.float32) for i in range(n)}
+
+@pytest.mark.parametrize('n,k', [(50, 1), (50, 5), (3, 5)])
+def test_match_equals_oracle(n, k):
+    db = random_db(n)
+    q = np.random.default_rng(1).normal(size=(7, 512))
+    ids, scores = FaceMatcher(db).match(q, k)
+    exp_ids, exp_scores = oracle(db, q, k)
+    assert ids.shape == scores.shape == (7, k)
+    assert (ids == exp_ids).all()
+    np.testing.assert_allclose(scores, exp_scores, atol=1e-5)
+
+def test_empty_gallery_shape():
+    ids, scores = FaceMatcher().match(np.ones((2, 512)), 3)
+    assert ids.shape == scores.shape == (2, 3)
+    assert (ids == None).all() and np.isneginf(scores).all()  # noqa: E711
+
+def test_incremental_update_equals_fresh():
+    db = random_db(40)
+    m = FaceMatcher(db)
+    rng = np.random.default_rng(2)
+    del db['p3'], db['p17']
+    db['p5'] = rng.normal(size=512).astype(np.float32)  # 特征变化
+    db['new'] = rng.normal(size=512).astype(np.float32)
+    m.update(db)
+    q = normalize_rows(rng.normal(size=(10, 512)))
+    ids, scores = m.match(q, 3)
+    exp_ids, exp_scores = oracle(db, q, 3)
+    assert sorted(m.ids) == sorted(db)
+    assert (ids == exp_ids).all()
+    np.testing.assert_allclose(scores, exp_scores, atol=1e-5)
+
+def test_ivf_with_recheck_equals_exact():
+    rng = np.random.default_rng(3)
+    gallery = normalize_rows(rng.normal(size=(4000, 512)))
+    truth = rng.integers(0, 4000, 200)
+    # 一半是库内人员的新照片，一半是陌生人
+    q = np.concatenate([normalize_rows(gallery[truth[:100]] + 0.6 * normalize_rows(rng.normal(size=(100, 512)))),
+                        normalize_rows(rng.normal(size=(100, 512)))])
+    m = FaceMatcher()
+    m.add([f"p{i}" for i in range(4000)], gallery)
+    exact_ids, exact_scores = m.match(q)
+    m.index = IVFIndex.train(m.matrix)
+    ids, scores = m.match(q)
+    assert (ids == exact_ids).all()
+    np.testing.assert_allclose(scores, exact_scores, atol=1e-5)
+
+def test_ann_index_incremental(tmp_path, monkeypatch):
+    monkeypatch.setattr(ops, 'ANN_MIN_GALLERY', 100)
+    rng = np.random.default_rng(4)
+    path = str(tmp_path / 'ivf.npz')
+    ids = [f"p{i}" for i in range(1000)]
+    matrix = normalize_rows(rng.normal(size=(1000, 512)))
+    trained = ops.build_ann_index(Gallery(ids, matrix), path)
+
+    # 删 1 人、改 1 人、增 1 人：沿用簇中心，变化的行就近归簇
+    ids2 = ids[1:] + ['new']
+    matrix2 = np.concatenate([matrix[1:], normalize_rows(rng.normal(size=(1, 512)))])
+    matrix2[4] = normalize_rows(rng.normal(size=512))
+    index = ops.build_ann_index(Gallery(ids2, matrix2), path, stale={ids2[4]})
+    np.testing.assert_array_equal(index.centroids, trained.centroids)
+    np.testing.assert_array_equal(index.assign[:-1][np.arange(999) != 4], trained.assign[1:][np.arange(999) != 4])
+    nearest = (matrix2[[4, -1]] @ index.centroids.T).argmax(axis=1)
+    np.testing.assert_array_equal(index.assign[[4, -1]], nearest)
+
+    # 规模变化超过 ANN_RETRAIN_RATIO 时重新训练
+    index = ops.build_ann_index(Gallery(ids[:300], matrix[:300]), path)
+    assert index.trained_size == 300
+
+def test_update_while_matching_never_mixes_rows():
+    """界面线程反复增删人员的同时推理线程比对：库内人员的原特征必须匹配到本人"""
+    import threading
+    db = random_db(200, seed=5)
+    m = FaceMatcher(db)
+    q = np.stack([db[f"p{i}"] for i in range(0, 200, 10)])
+    expect = np.array([f"p{i}" for i in range(0, 200, 10)], dtype=object)
+    errors, done = [], threading.Event()
+
+    def churn():
+        rng = np.random.default_rng(6)
+        for _ in range(200):
+            sub = {p: e for p, e in db.items() if p in expect or rng.random() < 0.5}
+            m.update(sub)
+        done.set()
+
+    t = threading.Thread(target=churn)
+    t.start()
+    while not done.is_set():
+        try:
+            ids, scores = m.match(q)
+            if not (ids[:, 0] == expect).all() or not np.allclose(scores[:, 0], 1, atol=1e-4):
+                errors.append(ids[:, 0])
+        except Exception as e:
+            errors.append(e)
+    t.join()
+    assert not errors
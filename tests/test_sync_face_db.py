@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+"""sync_face_db 按清单增量同步：新增、内容变化、仅修改时间变化、删除、换类别、无人脸、异常重试"""
+import hashlib
+import os
+import numpy as np
+import pytest
+import database.operations as ops
+from core.matcher import normalize_rows
+
+NO_FACE, BROKEN = b'no-face', b'broken'
+
+def fake_emb(data):
+    seed = int(hashlib.sha1(data).hexdigest()[:8], 16)
+    return np.random.default_rng(seed).normal(size=512).astype(np.float32)
+
+@pytest.fixture
+def env(tmp_path, monkeypatch):
+    """在临时目录下运行（库、清单、索引均为相对路径），特征由文件内容确定性生成并记录调用"""
+    monkeypatch.chdir(tmp_path)
+    calls = []
+
+    def embed_files(paths, workers=1):
+        calls.append([os.path.relpath(p, 'faces').replace(os.sep, '/') for p in paths])
+        out = []
+        for p in paths:
+            data = open(p, 'rb').read()
+            out.append((None, None) if data == NO_FACE else (None, 'decode error') if data == BROKEN
+                       else (fake_emb(data), None))
+        return out
+
+    monkeypatch.setattr(ops, 'embed_files', embed_files)
+    for sub in ('black', 'white'):
+        os.makedirs(os.path.join('faces', sub))
+    return calls
+
+def write(rel, data):
+    with open(os.path.join('faces', rel), 'wb') as f:
+        f.write(data)
+
+def sync():
+    return ops.sync_face_db('faces')
+
+def assert_feature(gallery, pid, data):
+    np.testing.assert_allclose(gallery[pid], normalize_rows(fake_emb(data)), atol=1e-6)
+
+def test_initial_and_unchanged(env):
+    write('white/alice.jpg', b'a1')
+    write('white/bob.jpg', b'b1')
+    write('black/eve.jpg', b'e1')
+    gallery, bl, wl, changed = sync()
+    assert sorted(gallery) == ['alice', 'bob', 'eve']
+    assert bl == {'eve'} and wl == {'alice', 'bob'} and changed == 3
+    assert_feature(gallery, 'bob', b'b1')
+    for e in ops.load_manifest().values():
+        assert e['row'] == gallery.row(e['id'])
+
+    gallery, bl, wl, changed = sync()
+    assert changed == 0 and len(env) == 1
+    assert sorted(gallery) == ['alice', 'bob', 'eve']
+
+def test_content_change_and_touch(env):
+    write('white/alice.jpg', b'a1')
+    write('white/bob.jpg', b'b1')
+    sync()
+
+    # 只改修改时间：按 sha1 判定未变，不重新提取
+    st = os.stat('faces/white/alice.jpg')
+    os.utime('faces/white/alice.jpg', ns=(st.st_atime_ns, st.st_mtime_ns + 10 ** 9))
+    _, _, _, changed = sync()
+    assert changed == 0 and len(env) == 1
+
+    write('white/bob.jpg', b'b2')
+    gallery, _, _, changed = sync()
+    assert changed == 1 and env[-1] == ['white/bob.jpg']
+    assert_feature(gallery, 'bob', b'b2')
+    assert_feature(gallery, 'alice', b'a1')
+
+def test_delete_and_relabel(env):
+    write('white/alice.jpg', b'a1')
+    write('black/eve.jpg', b'e1')
+    sync()
+
+    os.remove('faces/black/eve.jpg')
+    gallery, bl, wl, changed = sync()
+    assert sorted(gallery) == ['alice'] and bl == set() and changed == 1
+
+    os.replace('faces/white/alice.jpg', 'faces/black/alice.jpg')
+    gallery, bl, wl, _ = sync()
+    assert bl == {'alice'} and wl == set()
+    assert_feature(gallery, 'alice', b'a1')
+
+def test_no_face_and_error(env):
+    write('white/alice.jpg', b'a1')
+    write('white/ghost.jpg', NO_FACE)
+    write('white/bad.jpg', BROKEN)
+    gallery, _, _, _ = sync()
+    assert sorted(gallery) == ['alice']
+    manifest = ops.load_manifest()
+    assert manifest['white/ghost.jpg']['id'] is None
+    assert 'white/bad.jpg' not in manifest
+
+    # 无人脸的图片不再重试，异常的图片下次重试
+    sync()
+    assert env[-1] == ['white/bad.jpg']
+
+def test_known_embedding_skips_extraction(env):
+    write('white/alice.jpg', b'a1')
+    sync()
+    write('white/carol.jpg', b'c1')
+    emb = fake_emb(b'precomputed')
+    gallery, _, wl, _ = ops.sync_face_db('faces', known={'white/carol.jpg': emb})
+    assert len(env) == 1 and 'carol' in wl
+    np.testing.assert_allclose(gallery['carol'], normalize_rows(emb), atol=1e-6)
+
+def test_rebuild_matches_incremental(env):
+    write('white/alice.jpg', b'a1')
+    write('black/eve.jpg', b'e1')
+    sync()
+    write('white/bob.jpg', b'b1')
+    os.remove('faces/black/eve.jpg')
+    inc, inc_bl, inc_wl, _ = sync()
+    full, full_bl, full_wl, _ = ops.sync_face_db('faces', rebuild=True)
+    assert sorted(inc) == sorted(full) and inc_bl == full_bl and inc_wl == full_wl
+    for pid in full:
+        np.testing.assert_allclose(inc[pid], full[pid], atol=1e-6)
@@ -0,0 +1,24 @@
+# -*- coding: utf-8 -*-
+"""ZoneCounter：按间隔结算最大人数，视频结束时结算最后一个不完整间隔"""
+import numpy as np
+from core.zones import ZoneCounter
+
+def test_interval_reports_and_flush():
+    zc = ZoneCounter([{'name': 'L', 'polygon': [(0, 0), (50, 0), (50, 100), (0, 100)], 'threshold': 1},
+                      {'name': 'ALL', 'polygon': None, 'threshold': 5}], alert_interval=5)
+    reports = []
+    for t in range(13):
+        centers = [(10, 10), (20, 20), (80, 50)][:1 + t % 3]
+        counts, inside = zc.count(centers, (100, 100))
+        assert inside.all()
+        r = zc.tick(counts, now=float(t))
+        if r: reports.append((t, [(z['name'], m, over) for z, m, over in r]))
+    assert reports == [(5, [('L', 2, True), ('ALL', 3, False)]), (10, [('L', 2, True), ('ALL', 3, False)])]
+    # 11、12 两帧不满一个间隔，结束时补一次
+    assert [(z['name'], m) for z, m, _ in zc.flush(12.0)] == [('L', 2), ('ALL', 3)]
+    assert zc.flush(12.0) is None
+
+def test_count_outside_frame_is_clipped():
+    zc = ZoneCounter([{'polygon': [(0, 0), (10, 0), (10, 10), (0, 10)]}])
+    counts, inside = zc.count(np.array([[-5, -5], [50, 50]]), (20, 20))
+    assert counts.tolist() == [1] and inside.tolist() == [True, False]
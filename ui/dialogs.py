@@ -2,8 +2,9 @@
 import cv2
 import os
 import numpy as np
-from PyQt5.QtWidgets import QDialog, QVBoxLayout, QLabel, QPushButton, QHBoxLayout, QListWidget, QListWidgetItem, QMessageBox
-from PyQt5.QtCore import QTimer, Qt
+from PyQt5.QtWidgets import (QDialog, QVBoxLayout, QLabel, QPushButton, QHBoxLayout, QListWidget, QListWidgetItem, QMessageBox,
+                             QDateEdit, QFormLayout, QDialogButtonBox)
+from PyQt5.QtCore import QTimer, Qt, QDate
 from PyQt5.QtGui import QPixmap, QImage, QFont, QColor
 from database.operations import delete_face, startup_self_check
 from config import FACES_DIR
@@ -137,4 +138,32 @@ class ManageDialog(QDialog):
             self.img.setText(u"已删除")
             self.status_label.setText(u"已删除")
             self.selected_id = None
-            QMessageBox.information(self, u"完成", u"该人员档案已彻底移除")
\ No newline at end of file
+            QMessageBox.information(self, u"完成", u"该人员档案已彻底移除")
+
+class DateRangeDialog(QDialog):
+    """选择导出的起止日期（含首尾两天）"""
+    def __init__(self, first=None, last=None, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle(u"选择导出范围")
+        today = QDate.currentDate()
+        first = QDate.fromString(first[:10], "yyyy-MM-dd") if first else today
+        last = QDate.fromString(last[:10], "yyyy-MM-dd") if last else today
+
+        form = QFormLayout(self)
+        self.start_edit = QDateEdit(first)
+        self.end_edit = QDateEdit(last)
+        for e in (self.start_edit, self.end_edit):
+            e.setCalendarPopup(True)
+            e.setDisplayFormat("yyyy-MM-dd")
+        form.addRow(u"开始日期：", self.start_edit)
+        form.addRow(u"结束日期：", self.end_edit)
+        btns = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel)
+        btns.accepted.connect(self.accept)
+        btns.rejected.connect(self.reject)
+        form.addRow(btns)
+
+    def time_range(self):
+        """返回 [start, end) 时间字符串，供事件库范围查询"""
+        start = self.start_edit.date()
+        end = self.end_edit.date().addDays(1)
+        return start.toString("yyyy-MM-dd"), end.toString("yyyy-MM-dd")
@@ -1,10 +1,8 @@
 # -*- coding: utf-8 -*-
 import time
 import cv2
-import os
 import numpy as np
 import pandas as pd
-from PIL import Image, ImageDraw, ImageFont
 
 from PyQt5.QtWidgets import *
 from PyQt5.QtCore import *
@@ -12,12 +10,13 @@ from PyQt5.QtGui import *
 from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
 import matplotlib.pyplot as plt
 
-from core.models import yolo_person
 from database.operations import startup_self_check, register_face
+from database.logger import flush_log
+from database.events import get_event_store
+from core.display import to_display
 from ui.widgets import ClickLabel
-from ui.dialogs import CaptureWindow, ManageDialog
-from ui.worker import VisionEngine
-from config import FONT_PATH, LOG_PATH
+from ui.dialogs import CaptureWindow, ManageDialog, DateRangeDialog
+from ui.worker import VisionEngine, MultiStreamEngine, ExportWorker
 
 class SmartVisionApp(QMainWindow):
     def __init__(self):
@@ -27,14 +26,23 @@ class SmartVisionApp(QMainWindow):
         
         self.f_db, self.bl, self.wl = startup_self_check()
         self.engine = None
+        self.exporter, self.export_bar = None, None
         self.line_step, self.pts, self.curr_video = 0, [], None
+        self.flow_lines = []
         self.roi_step, self.roi_pts = 0, []
+        self.zones, self.preview = [], None
         self.temp_dims = (640, 480)
-        self.current_density_count = 0
         
         self.init_ui()
         self.apply_style()
 
+        # 按屏幕刷新率从引擎取最新一帧显示，来不及显示的帧直接跳过
+        self.display_timer = QTimer(self)
+        self.display_timer.timeout.connect(self.refresh_view)
+        screen = QApplication.primaryScreen()
+        rate = (screen.refreshRate() if screen else 0) or 60
+        self.display_timer.start(max(5, int(1000 / rate)))
+
     def init_ui(self):
         c = QWidget()
         self.setCentralWidget(c)
@@ -42,7 +50,7 @@ class SmartVisionApp(QMainWindow):
         
         nav = QVBoxLayout()
         btns = [
-            (u"🎥 实时监控", self.act_face), (u"🖼️ 图片识别", self.act_img), (u"🎬 视频分析", self.act_video), 
+            (u"🎥 实时监控", self.act_face), (u"📹 多路监控", self.act_multi), (u"🖼️ 图片识别", self.act_img), (u"🎬 视频分析", self.act_video), 
             (u"🚶 视频流量统计", self.act_flow), (u"👥 人群密度统计", self.act_density), 
             (u"📸 摄像头录入", self.act_reg_cam), (u"📂 文件导入人像", self.act_reg_file),
             (u"⚙️ 人脸管理", self.act_manage), (u"📊 数据看板", self.act_dash), 
@@ -81,6 +89,20 @@ class SmartVisionApp(QMainWindow):
         self._connect_engine()
         self.engine.start()
     
+    def act_multi(self):
+        self.stop()
+        text, ok = QInputDialog.getText(self, u"多路监控", u"视频源（逗号分隔，数字为摄像头编号，也可填文件路径或 RTSP 地址）：", text="0,1")
+        if not ok or not text.strip():
+            return
+        sources = [int(s) if s.strip().isdigit() else s.strip() for s in text.split(',') if s.strip()]
+        self.engine = MultiStreamEngine(sources, self.f_db, self.bl, self.wl, 'face')
+        self._sync_view_size()
+        self.engine.log_signal.connect(self.push)
+        self.engine.stats_ready.connect(self.upd_stats)
+        self.engine.model_progress.connect(self.upd_models)
+        self.engine.start()
+        self.info.setText(f"多路监控运行中：{len(sources)} 路")
+
     def act_img(self):
         self.stop()
         p, _ = QFileDialog.getOpenFileName(self, u"选图", "", "Img (*.jpg *.png)")
@@ -113,6 +135,7 @@ class SmartVisionApp(QMainWindow):
             self.upd(frame)
             self.line_step = 1
             self.pts = []
+            self.flow_lines = []
             QMessageBox.information(self, u"配置", u"请在画面中点击【起点 A】")
             self.info.setText(u"请点击画面确定起点 A")
 
@@ -129,20 +152,31 @@ class SmartVisionApp(QMainWindow):
         if ret:
             self.temp_dims = (frame.shape[1], frame.shape[0])
             self.upd(frame)
+            self.preview = frame
             self.roi_step = 1
             self.roi_pts = []
-            QMessageBox.information(self, u"ROI配置", u"请点击画面确定ROI【左上角】，然后【右下角】。")
-            self.info.setText(u"步骤1: 点击左上角")
+            self.zones = []
+            QMessageBox.information(self, u"区域配置", u"请依次点击多边形区域的各个顶点，点回起点附近闭合区域。")
+            self.info.setText(u"区域1: 点击第一个顶点")
 
     def _connect_engine(self):
         if self.engine:
-            self.engine.frame_ready.connect(self.upd)
+            self._sync_view_size()
             self.engine.flow_ready.connect(self.upd_f)
             self.engine.log_signal.connect(self.push)
-            self.engine.count_ready.connect(self.handle_density_count)
+            self.engine.stats_ready.connect(self.upd_stats)
+            self.engine.zone_ready.connect(self.upd_zones)
+            self.engine.model_progress.connect(self.upd_models)
+
+    def upd_stats(self, st):
+        self.statusBar().showMessage(
+            f"采集 {st['grabbed']} 帧 | 处理 {st['processed']} 帧 | 丢弃 {st['dropped']} 帧 | 策略 {st['policy']}")
 
-    def handle_density_count(self, count):
-        self.current_density_count = count
+    def upd_models(self, done, total, name):
+        if done < total:
+            self.statusBar().showMessage(f"正在加载模型 {name} ({done + 1}/{total})...")
+        else:
+            self.statusBar().showMessage(u"模型加载完成")
 
     def get_real_coords(self, click_x, click_y):
         lbl_w, lbl_h = self.view.width(), self.view.height()
@@ -177,7 +211,13 @@ class SmartVisionApp(QMainWindow):
             elif self.line_step == 3:
                 (x1, y1), (x2, y2) = self.pts[0], self.pts[1]
                 sign = 1 if (x2 - x1) * (ry - y1) - (y2 - y1) * (rx - x1) > 0 else -1
-                config = {'p1': self.pts[0], 'p2': self.pts[1], 'sign': sign}
+                self.flow_lines.append({'p1': self.pts[0], 'p2': self.pts[1], 'sign': sign})
+                if QMessageBox.question(self, u"计数线", f"已添加 {len(self.flow_lines)} 条计数线，是否继续添加？") == QMessageBox.Yes:
+                    self.line_step = 1
+                    self.pts = []
+                    self.info.setText(u"请点击画面确定起点 A")
+                    return
+                config = {'lines': self.flow_lines}
                 self.engine = VisionEngine(self.curr_video, mode='flow', flow_config=config)
                 self._connect_engine()
                 self.engine.start()
@@ -185,80 +225,82 @@ class SmartVisionApp(QMainWindow):
                 self.info.setText(u"流量统计运行中...")
         elif self.roi_step > 0:
             rx, ry = self.get_real_coords(x, y)
-            if self.roi_step == 1:
+            # 点击位置距起点 15 个界面像素以内视为闭合
+            close_r = 15 * self.temp_dims[0] / max(1, self.view.width())
+            if len(self.roi_pts) < 3 or np.hypot(rx - self.roi_pts[0][0], ry - self.roi_pts[0][1]) > close_r:
                 self.roi_pts.append((rx, ry))
-                self.roi_step = 2
-                self.info.setText(u"步骤2: 点击右下角")
-            elif self.roi_step == 2:
-                self.roi_pts.append((rx, ry))
-                x1 = min(self.roi_pts[0][0], self.roi_pts[1][0])
-                y1 = min(self.roi_pts[0][1], self.roi_pts[1][1])
-                x2 = max(self.roi_pts[0][0], self.roi_pts[1][0])
-                y2 = max(self.roi_pts[0][1], self.roi_pts[1][1])
-                
-                if x2 - x1 < 50 or y2 - y1 < 50:
-                    QMessageBox.warning(self, u"无效ROI", u"ROI区域太小，请重新绘制。")
-                    self.roi_step = 0
-                    return
-
-                threshold, ok = QInputDialog.getInt(self, u"密度阈值", u"告警阈值（间隔内最大人数）：", 20, 1, 1000)
-                if not ok:
-                    self.roi_step = 0
-                    return
-                interval, ok = QInputDialog.getInt(self, u"告警间隔", u"检查间隔（秒）：", 10, 1, 600)
-                if not ok:
-                    self.roi_step = 0
-                    return
+                self._draw_zones()
+                self.info.setText(f"区域{len(self.zones) + 1}: 已选 {len(self.roi_pts)} 个顶点，点回起点闭合")
+                return
+
+            if cv2.contourArea(np.array(self.roi_pts, dtype=np.int32)) < 2500:
+                QMessageBox.warning(self, u"无效区域", u"区域太小，请重新绘制。")
+                self.roi_pts = []
+                self._draw_zones()
+                return
+
+            threshold, ok = QInputDialog.getInt(self, u"密度阈值", u"该区域告警阈值（间隔内最大人数）：", 20, 1, 1000)
+            if not ok:
+                self.roi_step = 0
+                return
+            self.zones.append({'name': f"Z{len(self.zones) + 1}", 'polygon': self.roi_pts, 'threshold': threshold})
+            self.roi_pts = []
+            self._draw_zones()
+            if QMessageBox.question(self, u"区域配置", f"已添加 {len(self.zones)} 个区域，是否继续添加？") == QMessageBox.Yes:
+                self.info.setText(f"区域{len(self.zones) + 1}: 点击第一个顶点")
+                return
 
-                config = {'roi': (x1, y1, x2, y2), 'threshold': threshold, 'alert_interval': interval}
-                self.engine = VisionEngine(self.curr_video, mode='density', density_config=config)
-                self._connect_engine()
-                self.engine.start()
+            interval, ok = QInputDialog.getInt(self, u"告警间隔", u"检查间隔（秒）：", 10, 1, 600)
+            if not ok:
                 self.roi_step = 0
-                self.info.setText(u"人群密度统计运行中...")
+                return
 
-    def upd(self, d):
-        if self.engine and self.engine.mode == 'density':
-            roi = self.engine.density_config.get('roi')
-            count = self.current_density_count
-
-            if roi:
-                rx1, ry1, rx2, ry2 = roi
-                cv2.rectangle(d, (rx1, ry1), (rx2, ry2), (0, 255, 0), 6)
-
-            if count > self.engine.density_threshold:
-                heat = np.zeros(d.shape[:2], dtype=np.float32)
-                res = yolo_person(d, classes=[0], verbose=False, conf=0.3)[0]
-                boxes = res.boxes.xyxy.cpu().numpy().astype(int)
-                for box in boxes:
-                    cx = (box[0] + box[2]) // 2
-                    cy = (box[1] + box[3]) // 2
-                    if roi and rx1 <= cx <= rx2 and ry1 <= cy <= ry2:
-                        cv2.circle(heat, (cx, cy), 60, 1.5, -1)
-
-                heat = cv2.GaussianBlur(heat, (0, 0), sigmaX=30)
-                heat_norm = cv2.normalize(heat, None, 0, 255, cv2.NORM_MINMAX).astype(np.uint8)
-                heat_color = cv2.applyColorMap(heat_norm, cv2.COLORMAP_JET)
-                d = cv2.addWeighted(d, 0.6, heat_color, 0.4, 0)
-                cv2.rectangle(d, (0, 0), (d.shape[1], d.shape[0]), (0, 0, 255), 15)
-
-            pil_img = Image.fromarray(cv2.cvtColor(d, cv2.COLOR_BGR2RGB))
-            draw = ImageDraw.Draw(pil_img)
-            try:
-                font_pil = ImageFont.truetype(FONT_PATH, 100)
-            except:
-                font_pil = ImageFont.load_default()
-
-            text = f"实时密度: {count} 人"
-            fill_color = (255, 0, 0) if count > self.engine.density_threshold else (0, 255, 0)
-            draw.text((50, 50), text, font=font_pil, fill=fill_color)
-            d = cv2.cvtColor(np.array(pil_img), cv2.COLOR_RGB2BGR)
+            config = {'zones': self.zones, 'alert_interval': interval}
+            self.engine = VisionEngine(self.curr_video, mode='density', density_config=config)
+            self._connect_engine()
+            self.engine.start()
+            self.roi_step = 0
+            self.preview = None
+            self.info.setText(u"人群密度统计运行中...")
+
+    def _draw_zones(self):
+        """在首帧预览上画出已配置的区域和正在绘制的顶点"""
+        img = self.preview.copy()
+        for z in self.zones:
+            cv2.polylines(img, [np.array(z['polygon'], dtype=np.int32)], True, (0, 255, 0), 4)
+        if self.roi_pts:
+            cv2.polylines(img, [np.array(self.roi_pts, dtype=np.int32)], False, (0, 255, 255), 3)
+            for pt in self.roi_pts:
+                cv2.circle(img, pt, 8, (0, 255, 255), -1)
+        self.upd(img)
+
+    def _sync_view_size(self):
+        rect = self.view.contentsRect()
+        self.engine.display.set_view_size(rect.width(), rect.height())
+
+    def refresh_view(self):
+        # 引擎已把帧缩放到视图大小并转成 RGB，这里只取最新一帧贴图
+        if not self.engine:
+            return
+        self._sync_view_size()
+        item = self.engine.display.take()
+        if item is None:
+            return
+        rgb, self.temp_dims = item
+        self._show(rgb)
+
+    def _show(self, rgb):
+        qt_img = QImage(rgb.data, rgb.shape[1], rgb.shape[0], rgb.strides[0], QImage.Format_RGB888)
+        self.view.setPixmap(QPixmap.fromImage(qt_img))
 
+    def upd(self, d):
+        # 配置阶段的首帧预览（BGR 原图）；temp_dims 记录原图尺寸用于点击坐标换算
         self.temp_dims = (d.shape[1], d.shape[0])
-        qt_img = QImage(d.data, d.shape[1], d.shape[0], d.shape[1]*3, QImage.Format_RGB888).rgbSwapped()
-        pix = QPixmap.fromImage(qt_img)
-        scaled_pix = pix.scaled(self.view.contentsRect().size(), Qt.KeepAspectRatio, Qt.SmoothTransformation)
-        self.view.setPixmap(scaled_pix)
+        rect = self.view.contentsRect()
+        self._show(to_display(d, (rect.width(), rect.height()))[0])
+
+    def upd_zones(self, zones):
+        self.info.setText(" | ".join(f"{name}: {c}/{t}" for name, c, t in zones))
 
     def upd_f(self, s): 
         self.info.setText(f"IN:{s['in']} | OUT:{s['out']} | {s['elapsed']}s")
@@ -290,6 +332,8 @@ class SmartVisionApp(QMainWindow):
             succ, msg = register_face(img, n, '1' if u"黑" in cat else '2')
             if succ:
                 self.f_db, self.bl, self.wl = startup_self_check()
+                if self.engine:
+                    self.engine.set_face_db(self.f_db, self.bl, self.wl)
                 self.push(u"录入", n, u"成功")
                 QMessageBox.information(self, u"成功", msg)
             else:
@@ -303,15 +347,18 @@ class SmartVisionApp(QMainWindow):
         self.f_db, self.bl, self.wl = startup_self_check()
 
         if self.engine:
-            self.engine.face_db = self.f_db
-            self.engine.bl = self.bl
-            self.engine.wl = self.wl
+            self.engine.set_face_db(self.f_db, self.bl, self.wl)
             print(f"🚀 摄像头数据已更新：当前库中剩余 {len(self.f_db)} 人")
 
     def act_dash(self):
-        if not os.path.exists(LOG_PATH):
+        flush_log()
+        # 分组计数直接走事件库索引，不再整表读入
+        store = get_event_store()
+        status_counts = pd.Series(store.count_by('status'), dtype=int)
+        if status_counts.empty:
             QMessageBox.warning(self, u"空", u"暂无记录")
             return
+        source_counts = pd.Series(store.count_by('source'), dtype=int)
 
         d = QDialog(self)
         d.setWindowTitle(u"数据分布")
@@ -321,41 +368,55 @@ class SmartVisionApp(QMainWindow):
         plt.rcParams['font.sans-serif'] = ['Microsoft YaHei', 'SimHei', 'Arial Unicode MS']
         plt.rcParams['axes.unicode_minus'] = False
 
-        df = pd.read_csv(LOG_PATH, encoding='utf-8-sig')
-
         fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(10, 5))
         canvas = FigureCanvas(fig)
         v.addWidget(canvas)
 
-        df[u'状态'].value_counts().plot(kind='pie', ax=ax1, autopct='%1.1f%%')
+        status_counts.plot(kind='pie', ax=ax1, autopct='%1.1f%%')
         ax1.set_title(u"状态分布")
 
-        df[u'来源'].value_counts().plot(kind='bar', ax=ax2)
+        source_counts.plot(kind='bar', ax=ax2)
         ax2.set_title(u"来源统计")
         plt.setp(ax2.get_xticklabels(), rotation=45, ha='right')
 
         d.exec_()
 
     def act_excel(self):
-        if not os.path.exists(LOG_PATH):
+        flush_log()
+        first, last = get_event_store().time_span()
+        if first is None:
             QMessageBox.warning(self, u"提示", u"暂无数据")
             return
+        dlg = DateRangeDialog(first, last, self)
+        if not dlg.exec_():
+            return
         p, _ = QFileDialog.getSaveFileName(self, u"保存", "Report.xlsx", "Excel (*.xlsx)")
-        if p:
-            try:
-                df = pd.read_csv(LOG_PATH, encoding='utf-8-sig')
-                with pd.ExcelWriter(p, engine='openpyxl') as writer:
-                    df.to_excel(writer, index=False, sheet_name='Log')
-                    from openpyxl.styles import PatternFill
-                    ws = writer.sheets['Log']
-                    red = PatternFill(start_color="FFCCCC", end_color="FFCCCC", fill_type="solid")
-                    for r in range(2, ws.max_row+1):
-                        if u"黑名单" in str(ws.cell(r, 4).value):
-                            for c in range(1, 6):
-                                ws.cell(r, c).fill = red
-                QMessageBox.information(self, u"成功", u"导出完成")
-            except Exception as e:
-                QMessageBox.critical(self, u"错误", str(e))
+        if not p:
+            return
+        start, end = dlg.time_range()
+
+        # 导出在后台线程中流式进行，界面只显示进度
+        self.export_bar = QProgressDialog(u"正在导出...", u"取消", 0, 100, self)
+        self.export_bar.setWindowTitle(u"导出报表")
+        self.export_bar.setWindowModality(Qt.WindowModal)
+        self.export_bar.setMinimumDuration(0)
+        self.exporter = ExportWorker(p, start, end)
+        self.exporter.progress.connect(self.upd_export)
+        self.exporter.done.connect(self.export_done)
+        self.exporter.failed.connect(self.export_failed)
+        self.export_bar.canceled.connect(self.exporter.cancel)
+        self.exporter.start()
+
+    def upd_export(self, n, total):
+        self.export_bar.setValue(int(n * 100 / max(1, total)))
+
+    def export_done(self, n):
+        self.export_bar.close()
+        QMessageBox.information(self, u"成功", f"导出完成，共 {n} 条记录")
+
+    def export_failed(self, e):
+        self.export_bar.close()
+        QMessageBox.critical(self, u"错误", e)
 
     def stop(self):
         self.line_step = 0
@@ -1,43 +1,40 @@
 # -*- coding: utf-8 -*-
-import cv2
-import time
+import threading
 import numpy as np
-import winsound
 from PyQt5.QtCore import QThread, pyqtSignal
 
-# 核心模型导入
-from core.models import yolo_person, yolo_face
-from core.recognition import extract_embeddings
-from core.tracking import CentroidTracker, PedestrianFlowManager
-from database.logger import log_unified
-
-# 尝试导入语音库，如果失败则禁用，防止报错
-try:
-    import pyttsx3
-    TTS_AVAILABLE = True
-except ImportError:
-    TTS_AVAILABLE = False
+from core.models import warmup, MODE_MODELS
+from core.matcher import FaceMatcher
+from core.capture import FrameGrabber, default_policy
+from core.pipeline import FrameProcessor, MultiStreamRunner
+from core.alerts import AlertDispatcher, make_sinks
+from core.display import FrameMailbox, compose_mosaic
+from database.logger import flush_log, get_log_writer
+from database.export import export_excel
+from config import CAPTURE_BUFFER, ALERT_SINKS, ALERT_COOLDOWN, ALERT_MAX_PER_MIN
 
 class VisionEngine(QThread):
-    frame_ready = pyqtSignal(np.ndarray)
+    """单路视频线程：逐帧处理交给 core.pipeline.FrameProcessor，这里只负责采集循环和 Qt 信号
+
+    画面不走信号：处理后的帧转成显示用 RGB 写入 self.display，由界面按刷新率取最新一帧。
+    """
     flow_ready = pyqtSignal(dict)
     log_signal = pyqtSignal(str, str, str)
     count_ready = pyqtSignal(int)
+    zone_ready = pyqtSignal(list)
+    stats_ready = pyqtSignal(dict)
+    model_progress = pyqtSignal(int, int, str)
 
-    def __init__(self, source=0, face_db=None, bl=None, wl=None, mode='face', flow_config=None, density_config=None):
+    def __init__(self, source=0, face_db=None, bl=None, wl=None, mode='face', flow_config=None, density_config=None, policy=None):
         super().__init__()
         self._active = True
         self.source = source
         self.mode = mode
-        self.face_db, self.bl, self.wl = face_db, bl, wl
-        self.tracker = CentroidTracker()
-        self.flow_mgr = PedestrianFlowManager()
-        self.log_cd = {}
-        self.density_config = density_config or {}
-        self.density_threshold = self.density_config.get('threshold', 10)
-        self.alert_interval = self.density_config.get('alert_interval', 5)
-        self.interval_start = time.time()
-        self.max_count = 0
+        # 摄像头只处理最新帧；视频文件计数模式逐帧处理，人脸模式按配置策略
+        self.policy = policy or default_policy(source, mode)
+        self.grabber = None
+        self.processed = 0
+        self.display = FrameMailbox()
 
         # 设置源名称
         if mode == 'flow': self.src = u"流量统计"
@@ -46,155 +43,176 @@ class VisionEngine(QThread):
         elif isinstance(source, str): self.src = u"视频分析"
         else: self.src = u"图片识别"
 
-        # 流量线设置
-        if flow_config:
-            self.flow_mgr.set_line(flow_config['p1'], flow_config['p2'])
-            self.flow_mgr.in_side_sign = flow_config['sign']
-        
-        # 初始化语音引擎 (懒加载 + 异常保护)
-        self.ts = None
-        if TTS_AVAILABLE:
-            try:
-                # 某些系统初始化 init 会导致 Crash，这里加保护
-                self.ts = pyttsx3.init()
-                self.ts.setProperty('rate', 150)
-            except Exception as e:
-                print(f"⚠️ 语音模块初始化失败 (已自动禁用): {e}")
-                self.ts = None
-
-    def _get_identity(self, emb):
-        """统一处理身份比对逻辑，返回 (name, color, status)"""
-        name, color, status = "Stranger", (0, 165, 255), "Stranger"
-        if self.face_db:
-            sims = {p: np.dot(emb, e) / (np.linalg.norm(emb) * np.linalg.norm(e) + 1e-8)
-                    for p, e in self.face_db.items()}
-            mid = max(sims, key=sims.get, default=None)
-            if mid is not None:
-                score = sims[mid]
-                if score > 0.75:
-                    name = mid
-                    color = (0, 255, 0) if mid in self.wl else (0, 0, 255)
-                    status = u"白名单" if mid in self.wl else u"黑名单"
-                    current_time = time.time()
-                    if mid not in self.log_cd or (current_time - self.log_cd[mid] > 10):
-                        self.log_signal.emit(self.src, mid, status)
-                        log_unified(self.src, mid, status, f"Sim:{score:.2f}")
-                        
-                        # 触发警报
-                        if status == u"黑名单":
-                            winsound.Beep(1000, 500)
-                            # 尝试语音播报 (如果引擎可用)
-                            if self.ts:
-                                try:
-                                    self.ts.say(f"发现黑名单 {name}")
-                                    self.ts.runAndWait()
-                                except:
-                                    pass # 语音失败不影响主程序
-
-                        self.log_cd[mid] = current_time
-        return name, color, status
+        # 蜂鸣/语音在独立告警线程中执行，推理线程只投递
+        self.alerts = AlertDispatcher(make_sinks(ALERT_SINKS), ALERT_COOLDOWN, ALERT_MAX_PER_MIN)
+        self.alerts.start()
+        self.proc = FrameProcessor(mode, self.src, face_db, bl, wl, flow_config, density_config,
+                                   emit=self._emit, alerts=self.alerts)
+
+    def _emit(self, kind, *args):
+        if kind == 'log': self.log_signal.emit(*args)
+        elif kind == 'flow': self.flow_ready.emit(*args)
+        elif kind == 'count': self.count_ready.emit(*args)
+        elif kind == 'zones': self.zone_ready.emit(*args)
+
+    def set_face_db(self, face_db, bl, wl):
+        """人脸库更新后同步到引擎：推理线程在下一帧开始时增量重建比对矩阵"""
+        self.proc.set_face_db(face_db, bl, wl)
 
     def run(self):
+        # 只加载当前模式用到的模型，加载进度报给界面
+        warmup(MODE_MODELS[self.mode], self.model_progress.emit)
         if isinstance(self.source, np.ndarray):
             frame = self.source.copy()
-            self.process_frame(frame)
-            self.frame_ready.emit(frame)
+            self.proc.process_frame(frame)
+            self.display.put(frame)
             return
 
-        cap = cv2.VideoCapture(self.source)
+        # 采集线程 -> 环形缓冲区 -> 推理(本线程) -> 显示信箱 / 信号投递到界面线程
+        self.grabber = FrameGrabber(self.source, self.policy, CAPTURE_BUFFER)
+        self.grabber.start()
         while self._active:
-            ret, frame = cap.read()
-            if not ret: break
-            
-            self.process_frame(frame)
-            self.frame_ready.emit(frame)
-            
-            if isinstance(self.source, str):
-                time.sleep(0.03)  # 视频文件播放控制速度
-        cap.release()
-
-    def process_frame(self, frame):
-
-        if self.mode == 'flow' or self.mode == 'density':
-            res = yolo_person(frame, classes=[0], verbose=False, conf=0.3)[0]
-            boxes = res.boxes.xyxy.cpu().numpy().astype(int)
-            
-            if self.mode == 'flow':
-                rects = [box.astype(int) for box in boxes]
-                for (x1,y1,x2,y2) in rects: cv2.rectangle(frame,(x1,y1),(x2,y2),(255,255,0),2)
-                objs = self.tracker.update(rects)
-                for tid, cent in objs.items():
-                    cross = self.flow_mgr.check_crossing(tid, cent)
-                    if cross: 
-                        msg = u"越线进入" if cross=="IN" else u"越线离开"
-                        self.log_signal.emit(self.src, f"ID:{tid}", msg)
-                        log_unified(self.src, f"ID:{tid}", "Flow", msg)
-                    cv2.circle(frame, tuple(cent), 5, (0,255,255), -1)
-                st = self.flow_mgr.get_status()
-                self.flow_ready.emit(st)
-                p1, p2 = self.flow_mgr.line_pts
-                cv2.line(frame, p1, p2, (0,0,255), 3)
-                cv2.arrowedLine(frame, p1, p2, (0,255,0), 3)
-                cv2.putText(frame, f"IN:{st['in']} OUT:{st['out']}", (20,60), 0, 1.2, (0,255,0), 3)
-            
-            elif self.mode == 'density':
-                count = 0
-                roi = self.density_config.get('roi')
-                if roi:
-                    rx1, ry1, rx2, ry2 = roi
-                    for box in boxes:
-                        x1, y1, x2, y2 = box
-                        cx, cy = (x1 + x2) // 2, (y1 + y2) // 2
-                        if rx1 <= cx <= rx2 and ry1 <= cy <= ry2:
-                            count += 1
-                else:
-                    count = len(boxes)
-                self.count_ready.emit(count)
-
-                now = time.time()
-                if count > self.max_count:
-                    self.max_count = count
-                if now - self.interval_start >= self.alert_interval:
-                    msg = f"间隔内最大人数: {self.max_count} (阈值: {self.density_threshold})"
-                    self.log_signal.emit(self.src, "密度统计", msg)
-                    if self.max_count > self.density_threshold:
-                        alert = f"【密度告警】{msg} - 超标！"
-                        self.log_signal.emit(self.src, "密度告警", alert)
-                        winsound.Beep(2500, 1200)
-                    self.interval_start = now
-                    self.max_count = 0
-        else:
-            # 人脸识别模式
-            faces_mp = extract_embeddings(frame)
-            detected_centers = set()
-
-            for emb, bbox, score in faces_mp:
-                x1, y1, x2, y2 = bbox
-                center = ((x1 + x2) // 2, (y1 + y2) // 2)
-                detected_centers.add(center)
-                name, color, status = self._get_identity(emb)
-                cv2.rectangle(frame, (x1, y1), (x2, y2), color, 2)
-                cv2.putText(frame, name, (x1, y1 - 10), 0, 0.8, color, 2)
-
-            if not faces_mp:
-                res_face = yolo_face(frame, verbose=False, conf=0.3)[0]
-                boxes_face = res_face.boxes.xyxy.cpu().numpy().astype(int)
-
-                for box in boxes_face:
-                    x1, y1, x2, y2 = box
-                    center = ((x1 + x2) // 2, (y1 + y2) // 2)
-                    if center in detected_centers: continue
-
-                    face_crop = frame[y1:y2, x1:x2]
-                    if face_crop.size == 0: continue
-                    emb_list = extract_embeddings(face_crop)
-                    if not emb_list: continue
-                    
-                    emb, bbox_yolo, conf = emb_list[0]
-                    name, color, status = self._get_identity(emb)
-                    cv2.rectangle(frame, (x1, y1), (x2, y2), color, 2)
-                    cv2.putText(frame, name, (x1, y1 - 10), 0, 0.8, color, 2)
+            item = self.grabber.read()
+            if item is None: break
+            idx, frame = item
+
+            self.proc.process_frame(frame)
+            self.display.put(frame)
+            self.processed += 1
+            if self.processed % 30 == 0:
+                self.stats_ready.emit(self.stats())
+        self.grabber.stop()
+        self.stats_ready.emit(self.stats())
+
+    def stats(self):
+        """采集/处理/丢帧计数"""
+        st = self.grabber.stats() if self.grabber else {'grabbed': 0, 'dropped': 0, 'buffered': 0, 'fps': 0}
+        st.update(processed=self.processed, policy=self.policy, faces_embedded=self.proc.faces_embedded,
+                  person_detections=self.proc.person_detections)
+        st.update(self.display.stats())
+        st.update(self.alerts.stats())
+        st.update(get_log_writer().stats())
+        return st
 
     def stop(self): 
         self._active = False 
-        self.wait()
\ No newline at end of file
+        if self.grabber:
+            self.grabber.stop()
+        self.alerts.stop()
+        self.wait()
+        flush_log()
+
+class MultiStreamEngine(QThread):
+    """多路视频线程：N 路共享一套模型和人脸库，检测与 FaceNet 跨路整批执行，信号按路号区分
+
+    各路最新帧在本线程拼成宫格写入 self.display，界面取走上一张之前不重复拼接。
+    """
+    flow_ready = pyqtSignal(int, dict)
+    log_signal = pyqtSignal(str, str, str)
+    count_ready = pyqtSignal(int, int)
+    zone_ready = pyqtSignal(int, list)
+    stats_ready = pyqtSignal(dict)
+    model_progress = pyqtSignal(int, int, str)
+
+    def __init__(self, sources, face_db=None, bl=None, wl=None, mode='face', flow_configs=None, density_configs=None, policy=None):
+        super().__init__()
+        self._active = True
+        self.mode = mode
+        self.alerts = AlertDispatcher(make_sinks(ALERT_SINKS), ALERT_COOLDOWN, ALERT_MAX_PER_MIN)
+        self.alerts.start()
+        self.matcher = FaceMatcher(face_db)
+        n = len(sources)
+        flow_configs = flow_configs or [None] * n
+        density_configs = density_configs or [None] * n
+        procs = [FrameProcessor(mode, f"通道{i + 1}", face_db, bl, wl, flow_configs[i], density_configs[i],
+                                emit=self._router(i), alerts=self.alerts, matcher=self.matcher) for i in range(n)]
+        self.runner = MultiStreamRunner(sources, procs, policy, CAPTURE_BUFFER)
+        self.policy = '/'.join(sorted({g.policy for g in self.runner.grabbers}))
+        self.display = FrameMailbox()
+        self.tiles, self.canvas = [None] * n, None
+        self._db_lock = threading.Lock()
+        self._db_update = None
+
+    def _router(self, i):
+        def emit(kind, *args):
+            if kind == 'log': self.log_signal.emit(*args)
+            elif kind == 'flow': self.flow_ready.emit(i, *args)
+            elif kind == 'count': self.count_ready.emit(i, *args)
+            elif kind == 'zones': self.zone_ready.emit(i, *args)
+        return emit
+
+    def set_face_db(self, face_db, bl, wl):
+        """人脸库更新（界面线程）：只登记，由本线程在两批之间生效"""
+        with self._db_lock:
+            self._db_update = (face_db, bl, wl)
+
+    def _apply_face_db(self):
+        """共享比对矩阵只重建一次，各路名单和身份缓存在各自下一帧开始时生效"""
+        with self._db_lock:
+            update, self._db_update = self._db_update, None
+        if update is None:
+            return
+        face_db, bl, wl = update
+        self.matcher.update(face_db)
+        for p in self.runner.processors:
+            p.set_face_db(face_db, bl, wl, update_matcher=False)
+
+    def run(self):
+        warmup(MODE_MODELS[self.mode], self.model_progress.emit)
+        self.runner.start()
+        while self._active:
+            self._apply_face_db()
+            picked = self.runner.step()
+            if picked is None: break
+            for i, frame in picked:
+                self.tiles[i] = frame
+            if not self.display.pending:
+                self.canvas = compose_mosaic(self.tiles, self.display.view_size, self.canvas)
+                self.display.put(self.canvas)
+            if self.runner.batches % 30 == 0:
+                self.stats_ready.emit(self.stats())
+        self.runner.stop()
+        self.stats_ready.emit(self.stats())
+
+    def stats(self):
+        st = self.runner.stats()
+        st.update(grabbed=sum(s['grabbed'] for s in st['streams']), dropped=sum(s['dropped'] for s in st['streams']),
+                  policy=self.policy)
+        st.update(self.display.stats())
+        st.update(self.alerts.stats())
+        st.update(get_log_writer().stats())
+        return st
+
+    def stop(self):
+        self._active = False
+        self.runner.stop()
+        self.alerts.stop()
+        self.wait()
+        flush_log()
+
+class ExportWorker(QThread):
+    """后台导出 Excel，不阻塞界面；progress(已写行数, 总行数)，done(导出行数)，failed(错误信息)"""
+    progress = pyqtSignal(int, int)
+    done = pyqtSignal(int)
+    failed = pyqtSignal(str)
+
+    def __init__(self, path, start=None, end=None):
+        super().__init__()
+        self.path, self.start_ts, self.end_ts = path, start, end
+        self._active = True
+
+    def run(self):
+        try:
+            flush_log()
+            n = export_excel(self.path, self.start_ts, self.end_ts, progress=self._report)
+            if n is not None:
+                self.done.emit(n)
+        except Exception as e:
+            self.failed.emit(str(e))
+
+    def _report(self, n, total):
+        self.progress.emit(n, total)
+        return self._active
+
+    def cancel(self):
+        self._active = False